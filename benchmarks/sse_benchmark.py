@@ -0,0 +1,119 @@
+"""
+SSE解析性能对比
+
+对比旧的sseclient + json.loads实现与pydify.sse增量解码器在相同字节流上的解析耗时。
+运行方式（需要安装sseclient-py）:
+
+    python benchmarks/sse_benchmark.py --events 20000
+"""
+
+import argparse
+import json
+import time
+
+import sseclient
+
+from pydify.sse import iter_sse_events
+
+
+class _FakeEventSource:
+    """模拟响应对象，按固定大小产出字节块"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+def build_stream(events: int) -> bytes:
+    """构造一段接近真实workflow流式响应的字节流，以text_chunk事件为主"""
+    frames = []
+    for i in range(events):
+        if i % 50 == 0:
+            payload = {
+                "event": "node_finished",
+                "task_id": "task_123",
+                "workflow_run_id": "run_456",
+                "data": {
+                    "id": f"node_{i}",
+                    "inputs": {"prompt": "你好" * 100},
+                    "outputs": {"text": "世界" * 200},
+                    "status": "succeeded",
+                    "elapsed_time": 1.23,
+                },
+            }
+        else:
+            payload = {
+                "event": "text_chunk",
+                "task_id": "task_123",
+                "workflow_run_id": "run_456",
+                "data": {"text": f"第{i}段文本", "from_variable_selector": ["llm"]},
+            }
+        frames.append(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        if i % 200 == 0:
+            frames.append(b"event: ping\n\n")
+    return b"".join(frames)
+
+
+def split(stream: bytes, size: int):
+    return [stream[i : i + size] for i in range(0, len(stream), size)]
+
+
+def bench_sseclient(chunks, decode: bool) -> int:
+    count = 0
+    for event in sseclient.SSEClient(_FakeEventSource(chunks)).events():
+        if decode:
+            json.loads(event.data)
+        count += 1
+    return count
+
+
+def bench_pydify(chunks, decode: bool) -> int:
+    count = 0
+    for event in iter_sse_events(chunks):
+        if decode:
+            json.loads(event.data)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000, help="事件数量")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最优值")
+    parser.add_argument(
+        "--no-json", action="store_true", help="只测量SSE解析，不进行JSON解码"
+    )
+    args = parser.parse_args()
+
+    stream = build_stream(args.events)
+    print(f"事件数: {args.events}, 字节数: {len(stream)}")
+
+    for chunk_size in (128, 1024, 16384):
+        chunks = split(stream, chunk_size)
+        results = {}
+        for name, func in (
+            ("sseclient", bench_sseclient),
+            ("pydify.sse", bench_pydify),
+        ):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                count = func(chunks, not args.no_json)
+                best = min(best, time.perf_counter() - start)
+            results[name] = best
+            print(
+                f"chunk={chunk_size:>5}  {name:<10}  {best * 1000:8.1f} ms  "
+                f"{count / best:10.0f} events/s"
+            )
+        print(
+            f"chunk={chunk_size:>5}  加速比: {results['sseclient'] / results['pydify.sse']:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
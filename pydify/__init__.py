@@ -6,25 +6,78 @@ Pydify - Dify API的Python客户端库
 """
 
 from .agent import AgentClient, AgentEvent
+from .aio import (
+    AsyncAgentClient,
+    AsyncChatbotClient,
+    AsyncChatflowClient,
+    AsyncDifyBaseClient,
+    AsyncTextGenerationClient,
+    AsyncWorkflowClient,
+    create_async_client,
+)
+from .batch import BatchResult, BatchStats
 from .chatbot import ChatbotClient, ChatbotEvent
 from .chatflow import ChatflowClient, ChatflowEvent
-from .common import DifyBaseClient, DifyType
+from .circuit import CircuitBreaker, CircuitState, get_circuit_breaker
+from .codec import JSONCodec, get_codec, set_default_codec
+from .common import (
+    DifyAPIError,
+    DifyBaseClient,
+    DifyCircuitOpenError,
+    DifyConnectTimeoutError,
+    DifyFirstByteTimeoutError,
+    DifyIdleTimeoutError,
+    DifyStreamDecodeError,
+    DifyTimeoutError,
+    DifyTotalTimeoutError,
+    DifyType,
+    create_session,
+    get_shared_session,
+)
 from .config import *
+from .dispatch import EventDispatcher, dispatch_stream
+from .events import StreamEvent, UnknownEvent, parse_event
+from .hooks import ClientHooks, RequestInfo
+from .metrics import MetricsCollector
+from .profiling import Profiler, ProfilingAdapter, RequestProfile
+from .ratelimit import RateLimiter, get_rate_limiter
+from .result import StreamResult
+from .retry import RetryBudget, RetryPolicy
+from .stream import (
+    BufferedStream,
+    StreamTimeouts,
+    StreamTiming,
+    atee_stream,
+    tee_stream,
+)
 from .text_generation import TextGenerationClient, TextGenerationEvent
+from .tracing import TracingHooks
 from .workflow import WorkflowClient, WorkflowEvent
 
 
-def create_client(type: str, base_url: str, api_key: str) -> DifyBaseClient:
+def create_client(type: str, base_url: str, api_key: str, **kwargs) -> DifyBaseClient:
+    """
+    根据应用类型创建对应的客户端。
+
+    Args:
+        type (str): 应用类型，如workflow、chatbot、chatflow、agent、text_generation
+        base_url (str): API基础URL
+        api_key (str): 应用的API密钥
+        **kwargs: 传递给客户端构造函数的其他参数，如session、pool_maxsize等
+
+    Returns:
+        DifyBaseClient: 对应类型的客户端实例
+    """
     if type == DifyType.Workflow:
-        return WorkflowClient(base_url=base_url, api_key=api_key)
+        return WorkflowClient(base_url=base_url, api_key=api_key, **kwargs)
     elif type == DifyType.Chatbot:
-        return ChatbotClient(base_url=base_url, api_key=api_key)
+        return ChatbotClient(base_url=base_url, api_key=api_key, **kwargs)
     elif type == "chatflow":
-        return ChatflowClient(base_url=base_url, api_key=api_key)
+        return ChatflowClient(base_url=base_url, api_key=api_key, **kwargs)
     elif type == "agent":
-        return AgentClient(base_url=base_url, api_key=api_key)
+        return AgentClient(base_url=base_url, api_key=api_key, **kwargs)
     elif type == "text_generation" or type == "text":
-        return TextGenerationClient(base_url=base_url, api_key=api_key)
+        return TextGenerationClient(base_url=base_url, api_key=api_key, **kwargs)
     else:
         raise ValueError(f"Invalid client type: {type}")
 
@@ -37,6 +90,52 @@ __all__ = [
     "AgentClient",
     "TextGenerationClient",
     "create_client",
+    "create_async_client",
+    "AsyncWorkflowClient",
+    "AsyncChatbotClient",
+    "AsyncChatflowClient",
+    "AsyncAgentClient",
+    "AsyncTextGenerationClient",
+    "create_session",
+    "get_shared_session",
+    "JSONCodec",
+    "get_codec",
+    "set_default_codec",
+    "RetryPolicy",
+    "RetryBudget",
+    "RateLimiter",
+    "get_rate_limiter",
+    "CircuitBreaker",
+    "CircuitState",
+    "get_circuit_breaker",
+    "StreamTimeouts",
+    "BufferedStream",
+    "tee_stream",
+    "atee_stream",
+    "StreamEvent",
+    "UnknownEvent",
+    "parse_event",
+    "StreamResult",
+    "BatchResult",
+    "BatchStats",
+    "EventDispatcher",
+    "dispatch_stream",
+    "ClientHooks",
+    "RequestInfo",
+    "MetricsCollector",
+    "TracingHooks",
+    "StreamTiming",
+    "Profiler",
+    "ProfilingAdapter",
+    "RequestProfile",
+    "DifyAPIError",
+    "DifyCircuitOpenError",
+    "DifyStreamDecodeError",
+    "DifyTimeoutError",
+    "DifyConnectTimeoutError",
+    "DifyFirstByteTimeoutError",
+    "DifyIdleTimeoutError",
+    "DifyTotalTimeoutError",
     "DifyType",
     "ChatbotEvent",
     "WorkflowEvent",
@@ -0,0 +1,9 @@
+"""
+Pydify - 命令行入口，支持python -m pydify
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
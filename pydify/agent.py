@@ -68,6 +68,7 @@ class AgentClient(ChatbotClient):
             files (List[Dict[str, Any]], optional): 要包含在消息中的文件列表，每个文件为一个字典。默认为None
             auto_generate_name (bool, optional): 是否自动生成会话标题。默认为True
             **kwargs: 传递给底层API请求的额外参数，如timeout, max_retries等
+                流式模式下还支持events、exclude_events、lazy和断线恢复选项recover等，详见post_stream
 
         Returns:
             Generator[Dict[str, Any], None, None]: 返回字典生成器
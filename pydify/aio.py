@@ -0,0 +1,1049 @@
+"""
+Pydify - 异步客户端
+
+此模块提供基于asyncio的Dify API客户端。每个异步客户端都与对应的同步客户端拥有相同的方法，
+区别在于普通请求需要await，流式请求返回异步生成器，需要使用async for遍历。
+
+异步客户端基于httpx实现，需要额外安装: pip install pydify[async]
+"""
+
+import asyncio
+import contextlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
+from urllib.parse import urljoin
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - httpx是可选依赖
+    httpx = None
+
+from .agent import AgentClient
+from .batch import aiter_batch
+from .chatbot import ChatbotClient
+from .chatflow import ChatflowClient
+from .circuit import CircuitBreaker
+from .codec import JSONCodec
+from .common import (
+    _RECOVERABLE_TIMEOUTS,
+    DifyAPIError,
+    DifyBaseClient,
+    DifyStreamDecodeError,
+    DifyType,
+    _attempt_timeout,
+    _call_deadline,
+    _format_http_error,
+    _format_network_error,
+    _format_recovery_timeout_error,
+    _is_transient_error,
+    _make_rewind,
+    _parse_error_response,
+    _response_retry_after,
+    _StreamState,
+)
+from .events import parse_event
+from .forking import _register_after_fork
+from .hooks import ClientHooks, RequestInfo
+from .profiling import Profiler, _get_profiler
+from .ratelimit import RateLimiter
+from .result import StreamResult
+from .retry import RetryPolicy
+from .sse import LazyEvent, aiter_sse_events, build_event_filter, peek_event_type
+from .stream import AsyncStreamGuard, StreamTimeouts, StreamTiming
+from .text_generation import TextGenerationClient
+from .workflow import WorkflowClient, _enhance_run_error
+
+logger = logging.getLogger("pydify")
+
+# 默认连接池参数
+DEFAULT_MAX_CONNECTIONS = 100  # 最大并发连接数
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20  # 最多保持的空闲长连接数
+DEFAULT_KEEPALIVE_EXPIRY = 5.0  # 空闲长连接的保持时间(秒)
+
+
+@contextlib.asynccontextmanager
+async def _unlimited():
+    """未设置限流器时使用的空异步上下文管理器"""
+    yield
+
+
+class AsyncDifyBaseClient(DifyBaseClient):
+    """Dify API 异步基础客户端类。
+
+    与DifyBaseClient提供相同的功能，但所有HTTP请求都是非阻塞的：
+    - get/post/upload_file_obj等方法返回协程，需要await
+    - post_stream返回异步生成器，逐个产出SSE事件
+
+    所有请求共用一个带连接池的httpx.AsyncClient，单个进程可以同时保持大量并发流式请求。
+
+    示例:
+        ```python
+        async with AsyncWorkflowClient(api_key="your_api_key") as client:
+            result = await client.run(inputs={...}, user="user_123", response_mode="blocking")
+
+            async for event in client.run(inputs={...}, user="user_123"):
+                print(event["event"])
+        ```
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = None,
+        http_client: "httpx.AsyncClient" = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        json_codec: Union[str, JSONCodec, None] = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+        stream_timeouts: StreamTimeouts = None,
+        hooks: Iterable[ClientHooks] = None,
+        profile: Union[bool, Profiler, None] = None,
+    ):
+        """
+        初始化Dify API异步客户端。
+
+        Args:
+            api_key (str): Dify API密钥
+            base_url (str, optional): API基础URL。如果未提供，则使用DIFY_BASE_URL环境变量或默认的Dify API地址
+            http_client (httpx.AsyncClient, optional): 自定义的httpx异步客户端，可以让多个客户端共用一个连接池。
+                                    默认为None，即为当前客户端创建独立的连接池
+            max_connections (int, optional): 最大并发连接数，仅在未提供http_client时生效。默认为100
+            max_keepalive_connections (int, optional): 最多保持的空闲长连接数，仅在未提供http_client时生效。默认为20
+            keepalive_expiry (float, optional): 空闲长连接的保持时间(秒)，仅在未提供http_client时生效。默认为5秒
+            json_codec (Union[str, JSONCodec], optional): JSON编解码器，含义与DifyBaseClient相同。默认为None
+            retry_policy (RetryPolicy, optional): 重试策略，含义与DifyBaseClient相同。默认为RetryPolicy()
+            rate_limiter (RateLimiter, optional): 客户端限流器，可以与同步客户端共享。默认为None
+            circuit_breaker (CircuitBreaker, optional): 熔断器，可以与同步客户端共享。默认为None
+            stream_timeouts (StreamTimeouts, optional): 流式请求的分段超时设置。默认为StreamTimeouts()
+            hooks (Iterable[ClientHooks], optional): 调用钩子，含义与DifyBaseClient相同。默认为None
+            profile (Union[bool, Profiler], optional): 是否记录每次请求的分阶段耗时，含义与DifyBaseClient相同。
+                                    httpx不单独报告DNS解析，DNS时间计入连接阶段。默认为None
+
+        Raises:
+            ImportError: 当未安装httpx时
+        """
+        if httpx is None:
+            raise ImportError("异步客户端需要安装httpx: pip install pydify[async]")
+
+        self.api_key = api_key
+        self.base_url = (
+            base_url or os.environ.get("DIFY_BASE_URL") or "https://api.dify.ai/v1"
+        )
+
+        # 如果base_url不以斜杠结尾，则添加斜杠
+        if not self.base_url.endswith("/"):
+            self.base_url += "/"
+
+        # 自行创建的连接池由客户端负责关闭，外部传入的由调用方管理
+        self._owns_session = http_client is None
+        self._pool_options = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+        }
+        self._after_fork()
+        self._http_client = http_client
+        self.json_codec = json_codec
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.stream_timeouts = stream_timeouts or StreamTimeouts()
+        self.hooks = tuple(hooks or ())
+        self.profiler = _get_profiler(profile)
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        """丢弃从父进程继承的连接池，自行创建的连接池在首次使用时重新创建"""
+        if self._owns_session:
+            self._http_client = None
+        self._streams = set()
+        self._streams_cond = threading.Condition()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        序列化时只保留配置，自行创建的连接池在反序列化后首次使用时重新创建。
+
+        Raises:
+            TypeError: 当使用通过http_client参数传入的连接池时，httpx.AsyncClient无法序列化
+        """
+        if not self._owns_session:
+            raise TypeError(
+                "通过http_client参数传入的连接池无法序列化，请在子进程中重新创建客户端"
+            )
+        state = {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in self._process_local
+        }
+        state["_http_client"] = None
+        return state
+
+    @property
+    def http_client(self) -> "httpx.AsyncClient":
+        """客户端使用的httpx连接池，在fork出的子进程中或反序列化后首次访问时重新创建"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(**self._pool_options), timeout=None
+            )
+        return self._http_client
+
+    @http_client.setter
+    def http_client(self, http_client: "httpx.AsyncClient"):
+        self._http_client = http_client
+
+    async def close(self):
+        """
+        关闭客户端持有的连接池。
+
+        仅关闭客户端自行创建的连接池，通过http_client参数传入的不会被关闭。
+        """
+        if self._owns_session and self._http_client is not None:
+            await self._http_client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _throttle(self):
+        """按照限流器的速率等待，直到可以发出下一个请求"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire()
+
+    def _stream_slot(self):
+        """返回占用一个并发流名额的异步上下文管理器"""
+        if self.rate_limiter is None:
+            return _unlimited()
+        return self.rate_limiter.astream_slot()
+
+    # 熔断器统计时视为超时的异常类型
+    _timeout_exceptions = (
+        (httpx.TimeoutException, TimeoutError) if httpx is not None else (TimeoutError,)
+    )
+
+    async def _send(
+        self,
+        send: Callable[..., Awaitable[Any]],
+        method: str,
+        url: str,
+        endpoint: str,
+        stream: bool = False,
+    ) -> "httpx.Response":
+        """
+        在限流器和熔断器的保护下发送一次请求，参数含义与DifyBaseClient._send相同。
+
+        开启剖析时，send会收到一个httpx请求扩展字典（extensions），用于记录各阶段耗时。
+        """
+        await self._throttle()
+        self._check_circuit(method, url, endpoint)
+        try:
+            if self.profiler is None:
+                response = await send()
+            else:
+                response = await self.profiler.ameasure(method, endpoint, send, stream)
+        except BaseException as e:
+            self._record_outcome(error=e)
+            raise
+        self._record_outcome(response)
+        return response
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> "httpx.Response":
+        """
+        发送异步HTTP请求到Dify API并处理可能的错误。
+
+        错误处理和重试逻辑与DifyBaseClient._request一致，重试等待期间不会阻塞事件循环。
+
+        Args:
+            method (str): HTTP方法 (GET, POST, PUT, DELETE)
+            endpoint (str): API端点路径，相对于base_url
+            **kwargs: 传递给httpx的其他参数，以及:
+                - timeout: 单次尝试的超时时间(秒)
+                - deadline: 整个调用的时间预算(秒)，含义与DifyBaseClient._request相同
+                - max_retries: 最大重试次数，覆盖客户端重试策略中的设置
+                - retry_delay: 退避的基础等待时间(秒)，覆盖客户端重试策略中的设置
+
+        Returns:
+            httpx.Response: 请求响应对象
+
+        Raises:
+            DifyAPIError: 当HTTP请求失败时
+        """
+        url = urljoin(self.base_url, endpoint)
+        headers = kwargs.pop("headers", {})
+        headers.update(self._get_headers())
+
+        # 单次调用传入的max_retries/retry_delay会覆盖客户端的默认重试策略
+        policy = self.retry_policy.replace(
+            max_retries=kwargs.pop("max_retries", None),
+            base_delay=kwargs.pop("retry_delay", None),
+        )
+        timeout = kwargs.pop("timeout", 30)
+        deadline = _call_deadline(kwargs.pop("deadline", None))
+        info = self._start_call(method, endpoint, url)
+
+        try:
+            response = await policy.aexecute(
+                lambda: self._send(
+                    lambda extensions=None: self.http_client.request(
+                        method,
+                        url,
+                        headers=headers,
+                        timeout=_attempt_timeout(timeout, deadline),
+                        extensions=extensions,
+                        **kwargs,
+                    ),
+                    method,
+                    url,
+                    endpoint,
+                ),
+                description=f"{method} {endpoint}",
+                retry_exceptions=(httpx.HTTPError,),
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
+            )
+        except httpx.HTTPError as e:
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    _format_network_error(
+                        method, url, endpoint, e, self.base_url, timeout
+                    )
+                ),
+            )
+        except DifyAPIError as e:
+            raise self._call_error(info, e)
+        self._call_response(info, response)
+
+        if not response.is_success:
+            error_data, error_details = _parse_error_response(response)
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    _format_http_error(
+                        method,
+                        url,
+                        endpoint,
+                        response.status_code,
+                        response.reason_phrase,
+                        error_details,
+                    ),
+                    status_code=response.status_code,
+                    error_data=error_data,
+                    retry_after=_response_retry_after(response),
+                ),
+            )
+        return response
+
+    async def _request_json(
+        self, method: str, endpoint: str, **kwargs
+    ) -> Dict[str, Any]:
+        response = await self._request(method, endpoint, **kwargs)
+        return self.codec.loads(response.content)
+
+    async def get(self, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """
+        发送异步GET请求到Dify API。
+
+        Args:
+            endpoint (str): API端点，相对于base_url的路径
+            **kwargs: 传递给_request方法的其他参数，如params、timeout、max_retries等
+
+        Returns:
+            Dict[str, Any]: 响应的JSON数据
+
+        Raises:
+            DifyAPIError: 当API请求失败时
+        """
+        response = await self._request("GET", endpoint, **kwargs)
+        return self._parse_json_response(response, endpoint)
+
+    async def post(
+        self,
+        endpoint: str,
+        data: Dict[str, Any] = None,
+        json_data: Dict[str, Any] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        发送异步POST请求到Dify API。
+
+        Args:
+            endpoint (str): API端点，相对于base_url的路径
+            data (Dict[str, Any], optional): 要发送的表单数据
+            json_data (Dict[str, Any], optional): 要发送的JSON数据
+            **kwargs: 传递给_request方法的其他参数，如timeout、max_retries等
+
+        Returns:
+            Dict[str, Any]: 响应的JSON数据
+
+        Raises:
+            DifyAPIError: 当API请求失败时
+        """
+        if json_data is not None and data is None:
+            # 请求体只序列化一次，直接以字节形式发送
+            response = await self._request(
+                "POST", endpoint, content=self.codec.dumps(json_data), **kwargs
+            )
+        else:
+            response = await self._request(
+                "POST", endpoint, data=data, json=json_data, **kwargs
+            )
+        return self._parse_json_response(response, endpoint)
+
+    async def post_stream(
+        self, endpoint: str, json_data: Dict[str, Any], **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        发送异步流式POST请求到Dify API，用于接收SSE实时响应。
+
+        Args:
+            endpoint (str): API端点，相对于base_url的路径
+            json_data (Dict[str, Any]): 要发送的JSON数据
+            **kwargs: 传递给httpx的其他参数，常用的包括:
+                - timeout / connect_timeout / first_byte_timeout / idle_timeout / total_timeout:
+                  分段超时设置，含义与DifyBaseClient.post_stream相同
+                - max_retries / retry_delay: 建立连接时的重试设置，重试规则与DifyBaseClient.post_stream相同
+                - events / exclude_events / lazy / raw / typed: 事件过滤、延迟解码、原始帧与类型化事件选项，
+                  含义与DifyBaseClient.post_stream相同
+                - recover / stop_on_close: 断线恢复与提前关闭时停止任务，含义与DifyBaseClient.post_stream相同
+                - timing (StreamTiming): 首字延迟与事件间隔记录，含义与DifyBaseClient.post_stream相同
+
+        Yields:
+            Dict[str, Any]: 每个SSE事件块解析后的JSON数据，lazy为True时为LazyEvent对象，
+                raw为True时为SSE事件帧的字节，typed为True时为StreamEvent对象
+
+        Raises:
+            DifyTimeoutError: 当任一分段超时被触发时
+            DifyAPIError: 当API请求失败或响应无法解析时
+        """
+        # 类型化事件: 在延迟解码的事件流之上构造事件对象
+        if kwargs.pop("typed", False):
+            if kwargs.get("raw"):
+                raise ValueError("typed和raw不能同时使用")
+            lazy = kwargs.pop("lazy", False)
+            events = self.post_stream(endpoint, json_data, lazy=True, **kwargs)
+            try:
+                async for event in events:
+                    yield parse_event(event, self.codec.loads, lazy)
+            finally:
+                await events.aclose()
+            return
+
+        url = urljoin(self.base_url, endpoint)
+        headers = kwargs.pop("headers", {})
+        headers.update(self._get_headers())
+
+        # 事件过滤与延迟解码
+        accept = build_event_filter(
+            kwargs.pop("events", None), kwargs.pop("exclude_events", None)
+        )
+        lazy = kwargs.pop("lazy", False)
+        raw = kwargs.pop("raw", False)
+
+        # 重试只作用于建立连接，规则与DifyBaseClient.post_stream相同
+        policy = self.retry_policy.replace(
+            max_retries=kwargs.pop("max_retries", None),
+            base_delay=kwargs.pop("retry_delay", None),
+        )
+        # 分段超时，读取期间的时限由事件循环的定时器控制
+        started = time.monotonic()
+        timeouts = self._pop_stream_timeouts(kwargs)
+
+        # 断线恢复与提前关闭时停止任务，规则与DifyBaseClient.post_stream相同
+        state = self._new_stream_state(
+            json_data,
+            kwargs.pop("recover", True),
+            kwargs.pop("stop_on_close", True),
+        )
+        recover_timeout = kwargs.pop("recover_timeout", 600)
+        recover_interval = kwargs.pop("recover_interval", 2)
+        info = self._start_call("POST", endpoint, url, stream=True)
+        timing = self._stream_timing(kwargs.pop("timing", None), info, started)
+
+        self._track_stream(state)
+        try:
+            # 并发流名额在整个流被读完之前一直被占用，恢复阶段不占用名额
+            error = None
+            async with self._stream_slot():
+                stream = self._aiter_stream(
+                    policy,
+                    url,
+                    endpoint,
+                    json_data,
+                    headers,
+                    accept,
+                    lazy,
+                    timeouts,
+                    started,
+                    state,
+                    raw,
+                    info,
+                    timing,
+                    **kwargs,
+                )
+                try:
+                    async for chunk in stream:
+                        yield chunk
+                except (httpx.HTTPError,) + _RECOVERABLE_TIMEOUTS as e:
+                    if state is None or not self._can_recover(state):
+                        if isinstance(e, DifyAPIError):
+                            raise
+                        raise DifyAPIError(
+                            _format_network_error(
+                                "POST", url, endpoint, e, self.base_url, timeouts.total
+                            )
+                        )
+                    error = e
+                finally:
+                    # async for不会关闭内层生成器，需要显式关闭以立即断开连接
+                    await stream.aclose()
+
+            if state is None or state.finished or not self._can_recover(state):
+                return
+            events = await self._recover_stream(
+                state, error, recover_timeout, recover_interval
+            )
+            state.finished = True
+            for chunk in self._filter_recovered(events, accept, lazy, raw):
+                yield chunk
+        except GeneratorExit:
+            if state is not None and state.stop_on_close:
+                await self._stop_stream_task(state)
+            raise
+        except Exception as e:
+            raise self._call_error(info, e)
+        finally:
+            self._untrack_stream(state)
+            if timing is not None:
+                timing._finish()
+            self._stream_end(info)
+
+    async def _stop_stream_task(self, state: _StreamState) -> Any:
+        """停止流式调用对应的服务端任务，规则与DifyBaseClient._stop_stream_task相同"""
+        if state.stopped or state.finished or not state.task_id:
+            return None
+        state.stopped = True
+        logger.info("停止流式任务: %s", state)
+        try:
+            return await self.stop_task(state.task_id, state.user)
+        except Exception as e:
+            logger.warning("停止任务%s失败: %s", state.task_id, e)
+            return None
+
+    async def cancel_active_tasks(self) -> Dict[str, Any]:
+        """
+        并发停止所有正在进行的流式任务，含义与DifyBaseClient.cancel_active_tasks相同。
+
+        Returns:
+            Dict[str, Any]: task_id到stop_task返回结果的映射，停止失败的任务对应None
+        """
+        states = self._running_streams()
+        results = await asyncio.gather(
+            *(self._stop_stream_task(state) for state in states)
+        )
+        return {state.task_id: result for state, result in zip(states, results)}
+
+    async def drain_active_tasks(
+        self, timeout: Optional[float] = None, interval: float = 0.05
+    ) -> bool:
+        """
+        等待所有正在进行的流式调用结束，不阻塞事件循环。
+
+        Args:
+            timeout (float, optional): 最长等待时间(秒)。默认为None，即一直等待
+            interval (float, optional): 检查间隔(秒)。默认为0.05秒
+
+        Returns:
+            bool: 所有流式调用都已结束时返回True，超时返回False
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._streams:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+        return True
+
+    async def _recover_stream(
+        self,
+        state: _StreamState,
+        error: Optional[BaseException],
+        timeout: float,
+        interval: float,
+    ) -> List[Dict[str, Any]]:
+        """轮询查询接口直到任务结束，逻辑与DifyBaseClient._recover_stream相同"""
+        logger.warning("流式连接中断(%s)，开始查询任务结果: %s", error, state)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                events = self._recovery_events(
+                    state, await self._recovery_request(state)
+                )
+            except DifyAPIError as e:
+                if not _is_transient_error(e):
+                    raise
+                events = None
+            if events is not None:
+                return events
+            if time.monotonic() + interval > deadline:
+                raise DifyAPIError(
+                    _format_recovery_timeout_error(state, error, timeout)
+                ) from error
+            await asyncio.sleep(interval)
+
+    async def _open_stream(
+        self,
+        policy: RetryPolicy,
+        url: str,
+        endpoint: str,
+        json_data: Dict[str, Any],
+        headers: Dict[str, str],
+        timeouts: StreamTimeouts,
+        started: float = None,
+        info: Optional[RequestInfo] = None,
+        **kwargs,
+    ) -> "httpx.Response":
+        """
+        建立流式连接，重试规则与DifyBaseClient._open_stream相同。
+
+        httpx只负责连接超时，等待响应头和读取数据的时限由AsyncStreamGuard控制。
+        """
+        request = self.http_client.build_request(
+            "POST",
+            url,
+            content=self.codec.dumps(json_data),
+            headers=headers,
+            timeout=httpx.Timeout(None, connect=timeouts.connect),
+            **kwargs,
+        )
+        # 重试和退避等待同样计入总时长
+        deadline = None
+        if timeouts.total:
+            deadline = (started or time.monotonic()) + timeouts.total
+
+        def send(extensions: Optional[Dict[str, Any]] = None):
+            if extensions:
+                request.extensions.update(extensions)
+            return self.http_client.send(request, stream=True)
+
+        try:
+            return await policy.aexecute(
+                lambda: self._send(send, "POST", url, endpoint, stream=True),
+                description=f"POST {endpoint} (流式)",
+                retry_exceptions=(httpx.HTTPError,),
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
+            )
+        except httpx.ConnectTimeout as e:
+            raise self._stream_timeout_error(
+                StreamTimeouts.CONNECT, timeouts, url, endpoint
+            ) from e
+        except httpx.HTTPError as e:
+            raise DifyAPIError(
+                _format_network_error(
+                    "POST", url, endpoint, e, self.base_url, timeouts.total
+                )
+            )
+
+    async def _aiter_stream(
+        self,
+        policy: RetryPolicy,
+        url: str,
+        endpoint: str,
+        json_data: Dict[str, Any],
+        headers: Dict[str, str],
+        accept: Optional[Callable[[str], bool]],
+        lazy: bool,
+        timeouts: StreamTimeouts,
+        started: float,
+        state: Optional[_StreamState] = None,
+        raw: bool = False,
+        info: Optional[RequestInfo] = None,
+        timing: Optional[StreamTiming] = None,
+        **kwargs,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """建立流式连接并逐个产出解码后的事件，参数含义见post_stream"""
+        guard = None
+        opening = self._open_stream(
+            policy,
+            url,
+            endpoint,
+            json_data,
+            headers,
+            timeouts,
+            started,
+            info,
+            **kwargs,
+        )
+        if timeouts.watched:
+            guard = AsyncStreamGuard(
+                timeouts,
+                started,
+                lambda kind: self._stream_timeout_error(kind, timeouts, url, endpoint),
+            )
+            try:
+                # 等待响应头计入首个数据块的时限
+                response = await guard.run(opening)
+            except BaseException:
+                guard.close()
+                raise
+        else:
+            response = await opening
+        if timing is not None:
+            timing._headers()
+        self._call_response(info, response)
+        try:
+            if not response.is_success:
+                await response.aread()
+                error_data, error_details = _parse_error_response(response)
+                raise DifyAPIError(
+                    _format_http_error(
+                        "POST",
+                        url,
+                        endpoint,
+                        response.status_code,
+                        response.reason_phrase,
+                        error_details,
+                        title="流式请求失败",
+                    ),
+                    status_code=response.status_code,
+                    error_data=error_data,
+                    retry_after=_response_retry_after(response),
+                )
+
+            # 处理SSE流式响应，按到达的字节块增量解码
+            chunks = response.aiter_bytes()
+            if timing is not None:
+                chunks = timing._awatch(chunks)
+            if guard is not None:
+                chunks = guard.guarded_chunks(chunks)
+            async for event in aiter_sse_events(chunks):
+                event_type = None
+                if (
+                    accept is not None
+                    or lazy
+                    or raw
+                    or state is not None
+                    or timing is not None
+                ):
+                    # 只读取事件类型，被过滤的事件不做完整解码
+                    event_type = peek_event_type(event.data)
+                    if timing is not None:
+                        timing._event(event_type)
+                    if info is not None:
+                        self._stream_event(info, event_type, len(event.data))
+                    if state is not None:
+                        state.observe(event.data, event_type)
+                    if event_type is not None and accept is not None:
+                        if not accept(event_type):
+                            continue
+                    if raw:
+                        yield event.to_bytes()
+                        continue
+                    if lazy:
+                        yield LazyEvent(event.data, self.codec.loads, event_type)
+                        continue
+
+                chunk = self._decode_stream_data(event.data, url)
+                # 无法预读事件类型时，在解码后再进行过滤
+                if event_type is None and accept is not None:
+                    if not accept(chunk.get("event")):
+                        continue
+                yield chunk
+        finally:
+            if guard is not None:
+                guard.close()
+            await response.aclose()
+
+    def _decode_stream_data(self, data: bytes, url: str) -> Dict[str, Any]:
+        """使用客户端的JSON编解码器解析单个SSE事件的data字段"""
+        try:
+            return self.codec.loads(data)
+        except ValueError as e:
+            error_msg = f"""
+PYDIFY:处理SSE流式响应时JSON解析错误:
+└─ 请求信息:
+   ├─ 方法: POST
+   └─ URL: {url}
+└─ 错误信息:
+   ├─ 类型: {type(e).__name__}
+   └─ 详情: {str(e)}
+└─ 原始数据:
+   └─ {data[:500].decode("utf-8", "replace")}
+"""
+            raise DifyStreamDecodeError(error_msg)
+
+    async def upload_file(self, file_path: str, user: str, **kwargs) -> Dict[str, Any]:
+        """
+        异步上传文件到Dify API。
+
+        Args:
+            file_path (str): 要上传的文件路径
+            user (str): 用户标识
+            **kwargs: 额外的请求参数，如timeout等
+
+        Returns:
+            Dict[str, Any]: 上传文件的响应数据
+
+        Raises:
+            FileNotFoundError: 当文件不存在时
+            DifyAPIError: 当API请求失败时
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件未找到: {file_path}")
+
+        with open(file_path, "rb") as file:
+            return await self.upload_file_obj(
+                file, os.path.basename(file_path), user, **kwargs
+            )
+
+    async def upload_file_obj(
+        self, file_obj: BinaryIO, filename: str, user: str, **kwargs
+    ) -> Dict[str, Any]:
+        """
+        使用文件对象异步上传文件到Dify API。
+
+        Args:
+            file_obj (BinaryIO): 文件对象
+            filename (str): 文件名
+            user (str): 用户标识
+            **kwargs: 额外的请求参数，如timeout等
+
+        Returns:
+            Dict[str, Any]: 上传文件的响应数据，包含文件ID等字段
+
+        Raises:
+            DifyAPIError: 当API请求失败时
+        """
+        mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        url = urljoin(self.base_url, "files/upload")
+
+        # 不设置Content-Type，让httpx自动生成multipart边界
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        timeout = kwargs.pop("timeout", 30)
+        deadline = _call_deadline(kwargs.pop("deadline", None))
+        policy = self.retry_policy.replace(
+            max_retries=kwargs.pop("max_retries", None),
+            base_delay=kwargs.pop("retry_delay", None),
+        )
+        files = {"file": (filename, file_obj, mime_type)}
+        info = self._start_call("POST", "files/upload", url)
+
+        try:
+            response = await policy.aexecute(
+                lambda: self._send(
+                    lambda extensions=None: self.http_client.post(
+                        url,
+                        headers=headers,
+                        files=files,
+                        data={"user": user},
+                        timeout=_attempt_timeout(timeout, deadline),
+                        extensions=extensions,
+                    ),
+                    "POST",
+                    url,
+                    "files/upload",
+                ),
+                description="文件上传",
+                rewind=_make_rewind(files),
+                retry_exceptions=(httpx.HTTPError,),
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
+            )
+        except httpx.HTTPError as e:
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    _format_network_error(
+                        "POST", url, "files/upload", e, self.base_url, timeout
+                    )
+                ),
+            )
+        except DifyAPIError as e:
+            raise self._call_error(info, e)
+        self._call_response(info, response)
+
+        if not response.is_success:
+            error_data, error_details = _parse_error_response(response)
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    _format_http_error(
+                        "POST",
+                        url,
+                        "files/upload",
+                        response.status_code,
+                        response.reason_phrase,
+                        error_details,
+                        title="文件上传失败",
+                    ),
+                    status_code=response.status_code,
+                    error_data=error_data,
+                    retry_after=_response_retry_after(response),
+                ),
+            )
+
+        return self.codec.loads(response.content)
+
+    def _run_batch(
+        self,
+        send: Callable[[Any], Any],
+        items: Iterable[Any],
+        streaming: bool,
+        concurrency: int,
+        ordered: bool,
+        item_retries: int,
+        on_progress: Optional[Callable] = None,
+        max_pending: Optional[int] = None,
+    ):
+        """
+        DifyBaseClient._run_batch的异步版本，在事件循环的任务中并发执行，返回异步生成器。
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        async def call(item: Any) -> Any:
+            output = send(item)
+            if streaming:
+                return await StreamResult.acollect(output)
+            return await output
+
+        return aiter_batch(
+            call,
+            items,
+            concurrency=concurrency,
+            ordered=ordered,
+            retry_policy=self.retry_policy.replace(max_retries=item_retries),
+            on_progress=on_progress,
+            max_pending=max_pending,
+        )
+
+    async def get_parameters(self, raw: bool = True, **kwargs) -> Dict[str, Any]:
+        """
+        异步获取应用参数，参数含义与DifyBaseClient.get_parameters一致。
+        """
+        params = await self.get("parameters", **kwargs)
+
+        if raw:
+            return params
+
+        return self._normalize_parameters(params)
+
+
+class AsyncWorkflowClient(AsyncDifyBaseClient, WorkflowClient):
+    """Dify Workflow应用异步客户端类，方法与WorkflowClient一致。"""
+
+    def run(
+        self,
+        inputs: Dict[str, Any],
+        user: str,
+        response_mode: str = "streaming",
+        files: List[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> Union[Awaitable[Dict[str, Any]], AsyncGenerator[Dict[str, Any], None]]:
+        """
+        异步执行工作流，参数与WorkflowClient.run相同。
+
+        Returns:
+            Union[Awaitable[Dict[str, Any]], AsyncGenerator[Dict[str, Any], None]]:
+                阻塞模式返回协程，需要await；流式模式返回异步生成器，需要使用async for遍历
+
+        Raises:
+            ValueError: 当response_mode无效时
+            DifyAPIError: 当API请求失败时，参数相关的错误会附带可能的解决方法
+        """
+        payload = self._run_payload(inputs, user, response_mode, files)
+        if response_mode == "streaming":
+            return self.post_stream("workflows/run", json_data=payload, **kwargs)
+        return self._run_blocking(payload, **kwargs)
+
+    async def _run_blocking(self, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        try:
+            return await self.post("workflows/run", json_data=payload, **kwargs)
+        except DifyAPIError as e:
+            raise _enhance_run_error(e)
+
+
+class AsyncChatbotClient(AsyncDifyBaseClient, ChatbotClient):
+    """Dify Chatbot应用异步客户端类，方法与ChatbotClient一致。"""
+
+    async def audio_to_text(self, file_path: str, user: str) -> Dict[str, Any]:
+        """
+        异步音频转文字，文件格式校验由audio_to_text_obj完成。
+
+        Args:
+            file_path (str): 要上传的音频文件路径
+            user (str): 用户标识
+
+        Returns:
+            Dict[str, Any]: 转换结果，包含识别出的文本
+
+        Raises:
+            FileNotFoundError: 当文件不存在时
+            ValueError: 当文件格式不支持时
+            DifyAPIError: 当API请求失败时
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        with open(file_path, "rb") as file:
+            return await self.audio_to_text_obj(file, os.path.basename(file_path), user)
+
+
+class AsyncChatflowClient(AsyncChatbotClient, ChatflowClient):
+    """Dify Chatflow应用异步客户端类，方法与ChatflowClient一致。"""
+
+
+class AsyncAgentClient(AsyncChatbotClient, AgentClient):
+    """Dify Agent应用异步客户端类，方法与AgentClient一致。"""
+
+
+class AsyncTextGenerationClient(AsyncDifyBaseClient, TextGenerationClient):
+    """Dify Text Generation应用异步客户端类，方法与TextGenerationClient一致。"""
+
+
+def create_async_client(
+    type: str, base_url: str, api_key: str, **kwargs
+) -> AsyncDifyBaseClient:
+    """
+    根据应用类型创建对应的异步客户端，参数与create_client一致。
+
+    Args:
+        type (str): 应用类型，如workflow、chatbot、chatflow、agent、text_generation
+        base_url (str): API基础URL
+        api_key (str): 应用的API密钥
+        **kwargs: 传递给客户端构造函数的其他参数，如http_client、max_connections等
+
+    Returns:
+        AsyncDifyBaseClient: 对应类型的异步客户端实例
+    """
+    if type == DifyType.Workflow:
+        return AsyncWorkflowClient(base_url=base_url, api_key=api_key, **kwargs)
+    elif type == DifyType.Chatbot:
+        return AsyncChatbotClient(base_url=base_url, api_key=api_key, **kwargs)
+    elif type == "chatflow":
+        return AsyncChatflowClient(base_url=base_url, api_key=api_key, **kwargs)
+    elif type == "agent":
+        return AsyncAgentClient(base_url=base_url, api_key=api_key, **kwargs)
+    elif type == "text_generation" or type == "text":
+        return AsyncTextGenerationClient(base_url=base_url, api_key=api_key, **kwargs)
+    else:
+        raise ValueError(f"Invalid client type: {type}")
@@ -0,0 +1,383 @@
+"""
+Pydify - 批量执行
+
+此模块提供批量调用的执行器：以有限的并发数对大量输入逐条调用同一个API，
+按输入顺序或完成顺序产出每一条的结果。单条失败不会中断整个批次，错误记录在对应的BatchResult中。
+
+输入可以是任意可迭代对象（例如逐行读取的文件），执行器只会预先读取有限数量的输入，
+内存占用不随输入总数增长。
+
+示例:
+    ```python
+    client = WorkflowClient(api_key="your_api_key", pool_maxsize=16)
+    for result in client.run_batch(inputs, user="batch", concurrency=16):
+        if result.ok:
+            print(result.index, result.output["data"]["outputs"])
+        else:
+            print(result.index, "失败:", result.error)
+    ```
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from .common import DifyAPIError, _is_transient_error
+from .retry import RetryPolicy
+
+# 每个并发名额默认预先读取的输入数，用于保持线程忙碌以及在按顺序产出时缓冲已完成的结果
+_PENDING_PER_WORKER = 4
+
+
+class BatchResult:
+    """批量调用中一条输入的结果
+
+    Attributes:
+        index (int): 输入的序号，从0开始
+        input (Any): 原始输入
+        output (Any): 调用结果，阻塞模式为响应字典，流式模式为StreamResult；失败时可能为None
+        error (BaseException): 调用失败时的异常，成功时为None
+        attempts (int): 调用次数，包括单条重试
+        duration (float): 从第一次调用开始到结束的时间(秒)，包括重试等待
+    """
+
+    __slots__ = ("index", "input", "output", "error", "attempts", "duration")
+
+    def __init__(self, index: int, input: Any):
+        self.index = index
+        self.input = input
+        self.output: Any = None
+        self.error: Optional[BaseException] = None
+        self.attempts = 0
+        self.duration = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """调用是否成功"""
+        return self.error is None
+
+    def raise_for_error(self):
+        """调用失败时抛出对应的异常"""
+        if self.error is not None:
+            raise self.error
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典，便于序列化。
+
+        Returns:
+            Dict[str, Any]: 包含index、input、output、error、attempts和duration的字典，
+                StreamResult会转换为字典，异常转换为字符串
+        """
+        output = self.output
+        if hasattr(output, "to_dict"):
+            output = output.to_dict()
+        return {
+            "index": self.index,
+            "input": self.input,
+            "output": output,
+            "error": str(self.error).strip() if self.error is not None else None,
+            "attempts": self.attempts,
+            "duration": self.duration,
+        }
+
+    def __repr__(self) -> str:
+        state = "ok" if self.ok else type(self.error).__name__
+        return f"BatchResult(index={self.index}, {state}, attempts={self.attempts})"
+
+
+class BatchStats:
+    """批量调用的进度统计，随每条结果完成而更新
+
+    Attributes:
+        submitted (int): 已读取并提交执行的输入数
+        done (int): 已完成的输入数
+        succeeded (int): 成功的输入数
+        failed (int): 失败的输入数
+        retries (int): 单条重试的总次数
+        started (float): 批次开始的时间(time.monotonic())
+    """
+
+    __slots__ = ("submitted", "done", "succeeded", "failed", "retries", "started")
+
+    def __init__(self):
+        self.submitted = 0
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.started = time.monotonic()
+
+    @property
+    def running(self) -> int:
+        """已提交但尚未完成的输入数"""
+        return self.submitted - self.done
+
+    @property
+    def elapsed(self) -> float:
+        """批次已运行的时间(秒)"""
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """每秒完成的输入数"""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        """已完成输入中失败的比例"""
+        return self.failed / self.done if self.done else 0.0
+
+    def _add(self, result: BatchResult):
+        self.done += 1
+        self.retries += max(result.attempts - 1, 0)
+        if result.ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典。
+
+        Returns:
+            Dict[str, Any]: 各项计数以及elapsed、throughput和error_rate
+        """
+        return {
+            "submitted": self.submitted,
+            "done": self.done,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "error_rate": self.error_rate,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"BatchStats(done={self.done}, failed={self.failed}, "
+            f"running={self.running}, throughput={self.throughput:.2f}/s)"
+        )
+
+
+def _output_error(output: Any) -> Optional[DifyAPIError]:
+    """把执行失败的工作流结果转换为异常，服务端已经给出最终结果，这类失败不会重试"""
+    if hasattr(output, "status"):
+        status, error = output.status, getattr(output, "error", None)
+    elif isinstance(output, dict) and isinstance(output.get("data"), dict):
+        status, error = output["data"].get("status"), output["data"].get("error")
+    else:
+        return None
+    if status != "failed":
+        return None
+    return DifyAPIError(
+        f"PYDIFY:执行失败: {error or '未知错误'}",
+        error_data=output if isinstance(output, dict) else None,
+    )
+
+
+def _retry_delay(
+    error: BaseException, attempt: int, policy: RetryPolicy
+) -> Optional[float]:
+    """单条调用失败后需要等待的时间，不再重试时返回None"""
+    if not isinstance(error, DifyAPIError) or not _is_transient_error(error):
+        return None
+    if not policy.accepts_retry_after(error.retry_after):
+        return None
+    delay = policy.get_delay(attempt, error.retry_after)
+    if not policy.allow_retry(attempt, delay):
+        return None
+    return delay
+
+
+def _run_item(
+    call: Callable[[Any], Any], index: int, item: Any, policy: RetryPolicy
+) -> BatchResult:
+    result = BatchResult(index, item)
+    started = time.monotonic()
+    while True:
+        result.attempts += 1
+        try:
+            result.output = call(item)
+        except Exception as e:
+            delay = _retry_delay(e, result.attempts - 1, policy)
+            if delay is None:
+                result.error = e
+                break
+            time.sleep(delay)
+        else:
+            result.error = _output_error(result.output)
+            break
+    result.duration = time.monotonic() - started
+    return result
+
+
+async def _arun_item(
+    call: Callable[[Any], Awaitable[Any]], index: int, item: Any, policy: RetryPolicy
+) -> BatchResult:
+    result = BatchResult(index, item)
+    started = time.monotonic()
+    while True:
+        result.attempts += 1
+        try:
+            result.output = await call(item)
+        except Exception as e:
+            delay = _retry_delay(e, result.attempts - 1, policy)
+            if delay is None:
+                result.error = e
+                break
+            await asyncio.sleep(delay)
+        else:
+            result.error = _output_error(result.output)
+            break
+    result.duration = time.monotonic() - started
+    return result
+
+
+def iter_batch(
+    call: Callable[[Any], Any],
+    items: Iterable[Any],
+    concurrency: int = 4,
+    ordered: bool = True,
+    retry_policy: Optional[RetryPolicy] = None,
+    on_progress: Optional[Callable[[BatchResult, BatchStats], None]] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[BatchResult]:
+    """
+    在线程池中以有限的并发数对每条输入调用call，并产出结果。
+
+    生成器被提前关闭时，尚未开始的输入会被取消，并等待正在执行的调用结束。
+
+    Args:
+        call (Callable[[Any], Any]): 处理一条输入并返回结果的函数
+        items (Iterable[Any]): 输入，按需读取
+        concurrency (int, optional): 同时执行的调用数。默认为4
+        ordered (bool, optional): 为True时按输入顺序产出结果，否则按完成顺序产出。默认为True
+        retry_policy (RetryPolicy, optional): 单条调用因网络错误、429或5xx失败时的重试策略。
+            默认为None，即不重试
+        on_progress (Callable[[BatchResult, BatchStats], None], optional): 每条输入完成时在迭代方的线程中调用
+        max_pending (int, optional): 已读取但尚未产出的输入数上限，按顺序产出时也是已完成结果的缓冲上限。
+            默认为concurrency的4倍
+
+    Yields:
+        BatchResult: 每条输入的结果
+    """
+    policy = retry_policy or RetryPolicy(max_retries=0)
+    max_pending = max(max_pending or concurrency * _PENDING_PER_WORKER, concurrency)
+    stats = BatchStats()
+    iterator = enumerate(items)
+    exhausted = False
+    pending: Dict[concurrent.futures.Future, int] = {}
+    buffered: Dict[int, BatchResult] = {}
+    next_index = 0
+    executor = concurrent.futures.ThreadPoolExecutor(
+        concurrency, thread_name_prefix="pydify-batch"
+    )
+    try:
+        while True:
+            while not exhausted and len(pending) + len(buffered) < max_pending:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[executor.submit(_run_item, call, index, item, policy)] = index
+                stats.submitted += 1
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in sorted(done, key=pending.get):
+                del pending[future]
+                result = future.result()
+                stats._add(result)
+                if on_progress is not None:
+                    on_progress(result, stats)
+                if ordered:
+                    buffered[result.index] = result
+                else:
+                    yield result
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+async def aiter_batch(
+    call: Callable[[Any], Awaitable[Any]],
+    items: Iterable[Any],
+    concurrency: int = 4,
+    ordered: bool = True,
+    retry_policy: Optional[RetryPolicy] = None,
+    on_progress: Optional[Callable[[BatchResult, BatchStats], None]] = None,
+    max_pending: Optional[int] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    iter_batch的异步版本，在事件循环的任务中执行协程函数call，参数含义与iter_batch相同。
+
+    生成器被提前关闭时，正在执行的调用会被取消。
+
+    Yields:
+        BatchResult: 每条输入的结果
+    """
+    policy = retry_policy or RetryPolicy(max_retries=0)
+    max_pending = max(max_pending or concurrency * _PENDING_PER_WORKER, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = BatchStats()
+    iterator = enumerate(items)
+    exhausted = False
+    pending: Dict[asyncio.Future, int] = {}
+    buffered: Dict[int, BatchResult] = {}
+    next_index = 0
+
+    async def run(index: int, item: Any) -> BatchResult:
+        async with semaphore:
+            return await _arun_item(call, index, item, policy)
+
+    try:
+        while True:
+            while not exhausted and len(pending) + len(buffered) < max_pending:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[asyncio.ensure_future(run(index, item))] = index
+                stats.submitted += 1
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=pending.get):
+                del pending[task]
+                result = task.result()
+                stats._add(result)
+                if on_progress is not None:
+                    on_progress(result, stats)
+                if ordered:
+                    buffered[result.index] = result
+                else:
+                    yield result
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
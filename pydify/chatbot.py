@@ -121,6 +121,10 @@ class ChatbotClient(DifyBaseClient):
 
     type = DifyType.Chatbot
 
+    # 断线后通过message_id在会话历史中查询回答
+    _terminal_events = frozenset([ChatbotEvent.MESSAGE_END, ChatbotEvent.ERROR])
+    _recovery_ids = ("message_id", "conversation_id", "user")
+
     def send_message(
         self,
         query: str,
@@ -144,6 +148,7 @@ class ChatbotClient(DifyBaseClient):
             files (List[Dict[str, Any]], optional): 要包含在消息中的文件列表，每个文件为一个字典。默认为None
             auto_generate_name (bool, optional): 是否自动生成会话标题。默认为True
             **kwargs: 额外的请求参数，如timeout、max_retries等
+                流式模式下还支持events、exclude_events、lazy和断线恢复选项recover等，详见post_stream
 
         Returns:
             Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
@@ -278,10 +283,49 @@ class ChatbotClient(DifyBaseClient):
         headers.pop("Content-Type", None)
 
         endpoint = "audio-to-text"
-        response = self._request(
+        return self._request_json(
             "POST", endpoint, headers=headers, files=files, data=data
         )
-        return response.json()
+
+    def _recovery_request(self, state) -> Dict[str, Any]:
+        return self.get_messages(state.conversation_id, state.user, limit=5)
+
+    def _recovery_events(
+        self, state, result: Dict[str, Any]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """消息生成完成后合成message_replace和message_end事件，用完整回答替换已收到的部分"""
+        for message in result.get("data") or []:
+            if message.get("id") != state.message_id:
+                continue
+
+            ids = {
+                "task_id": state.task_id,
+                "message_id": state.message_id,
+                "conversation_id": state.conversation_id,
+                "recovered": True,
+            }
+            if message.get("status") == "error":
+                return [
+                    dict(
+                        ids,
+                        event=ChatbotEvent.ERROR,
+                        code="message_failed",
+                        message=message.get("error") or "消息生成失败",
+                    )
+                ]
+            if not message.get("answer"):
+                return None
+            return [
+                dict(ids, event=ChatbotEvent.MESSAGE_REPLACE, answer=message["answer"]),
+                dict(
+                    ids,
+                    event=ChatbotEvent.MESSAGE_END,
+                    metadata={
+                        "retriever_resources": message.get("retriever_resources") or []
+                    },
+                ),
+            ]
+        return None
 
     def get_messages(
         self, conversation_id: str, user: str, first_id: str = None, limit: int = 20
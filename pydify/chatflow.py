@@ -66,6 +66,7 @@ class ChatflowClient(ChatbotClient):
             files (List[Dict[str, Any]], optional): 要包含在消息中的文件列表，每个文件为一个字典。默认为None
             auto_generate_name (bool, optional): 是否自动生成会话标题。默认为True
             **kwargs: 额外的请求参数，如timeout、max_retries等
+                流式模式下还支持events、exclude_events、lazy和断线恢复选项recover等，详见post_stream
 
         Returns:
             Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
@@ -254,7 +255,7 @@ class ChatflowClient(ChatbotClient):
         """
         endpoint = f"conversations/{conversation_id}"
         payload = {"user": user}
-        return self._request("DELETE", endpoint, json=payload).json()
+        return self._request_json("DELETE", endpoint, json=payload)
 
     def rename_conversation(
         self,
@@ -368,10 +369,9 @@ class ChatflowClient(ChatbotClient):
         # 移除Content-Type，让requests自动设置multipart/form-data
         headers.pop("Content-Type", None)
 
-        response = self._request(
+        return self._request_json(
             "POST", "audio-to-text", headers=headers, files=files, data=data
         )
-        return response.json()
 
     def text_to_audio(
         self,
@@ -0,0 +1,260 @@
+"""
+Pydify - 熔断器
+
+此模块提供按服务地址（base_url）划分的熔断器。后端不可用时快速失败，
+避免调用方的工作线程在超时和重试上层层堆积；经过冷却时间后放行少量探测请求，
+探测成功后恢复正常。
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .forking import _register_after_fork
+
+logger = logging.getLogger("pydify")
+
+_shared_breakers: Dict[str, "CircuitBreaker"] = {}
+_shared_breakers_lock = threading.Lock()
+
+
+class CircuitState:
+    """熔断器状态枚举"""
+
+    CLOSED = "closed"  # 正常放行
+    OPEN = "open"  # 熔断中，所有请求快速失败
+    HALF_OPEN = "half_open"  # 冷却结束，放行少量探测请求
+
+
+class CircuitBreaker:
+    """熔断器
+
+    以下任一条件满足时熔断器打开:
+    - 统计窗口内的请求数不少于minimum_calls，且失败率不低于failure_rate_threshold
+    - 连续超时次数达到consecutive_timeouts
+
+    打开recovery_timeout秒后进入半开状态，最多同时放行half_open_max_calls个探测请求，
+    连续success_threshold个探测成功后关闭，任一探测失败则重新打开。
+
+    失败指网络错误、超时和5xx响应；4xx（包括429）说明服务端仍能正常响应，按成功处理。
+    熔断器是线程安全的，可以被多个客户端共享。
+
+    示例:
+        ```python
+        def alert(breaker, old_state, new_state):
+            print(f"{breaker.name}: {old_state} -> {new_state}")
+
+        breaker = get_circuit_breaker("https://dify.example.com/v1", on_state_change=alert)
+        client = WorkflowClient(api_key="your_api_key", base_url="https://dify.example.com/v1",
+                                circuit_breaker=breaker)
+        ```
+    """
+
+    def __init__(
+        self,
+        name: str = None,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window: float = 60.0,
+        consecutive_timeouts: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        success_threshold: int = 1,
+        on_state_change: Optional[Callable[["CircuitBreaker", str, str], None]] = None,
+    ):
+        """
+        Args:
+            name (str, optional): 熔断器名称，通常为base_url，用于日志和回调
+            failure_rate_threshold (float, optional): 打开熔断器的失败率阈值(0~1)。默认为0.5
+            minimum_calls (int, optional): 计算失败率所需的最少请求数。默认为10
+            window (float, optional): 失败率统计窗口(秒)。默认为60秒
+            consecutive_timeouts (int, optional): 连续超时多少次后打开熔断器。默认为5
+            recovery_timeout (float, optional): 打开后经过多少秒进入半开状态。默认为30秒
+            half_open_max_calls (int, optional): 半开状态下同时放行的探测请求数。默认为1
+            success_threshold (int, optional): 半开状态下关闭熔断器所需的连续成功探测数。默认为1
+            on_state_change (Callable, optional): 状态变化回调，参数为(熔断器, 旧状态, 新状态)。
+                回调在状态变化的线程中同步调用，其中抛出的异常会被记录并忽略。
+                序列化时不保留回调（lambda等常见回调无法序列化），反序列化后需要重新设置on_state_change
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.consecutive_timeouts = consecutive_timeouts
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.success_threshold = success_threshold
+        self.on_state_change = on_state_change
+
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._outcomes = collections.deque()  # (时间, 是否失败)
+        self._failures = 0
+        self._timeouts = 0
+        self._probes = 0
+        self._probe_successes = 0
+        # 可重入锁，允许状态变化回调中读取熔断器状态
+        self._lock = threading.RLock()
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        self._lock = threading.RLock()
+
+    def __reduce__(self):
+        # 只序列化配置，新进程中的熔断器从关闭状态开始统计；
+        # 状态变化回调通常是lambda或闭包，不参与序列化，需要在新进程中重新设置
+        return (
+            self.__class__,
+            (
+                self.name,
+                self.failure_rate_threshold,
+                self.minimum_calls,
+                self.window,
+                self.consecutive_timeouts,
+                self.recovery_timeout,
+                self.half_open_max_calls,
+                self.success_threshold,
+            ),
+        )
+
+    @property
+    def state(self) -> str:
+        """当前状态，打开状态在冷却时间结束后会显示为半开"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """距离熔断器进入半开状态还需等待的秒数，未打开时为0"""
+        with self._lock:
+            if self._state != CircuitState.OPEN:
+                return 0.0
+            remaining = self._opened_at + self.recovery_timeout - time.monotonic()
+            return max(remaining, 0.0)
+
+    def allow_request(self) -> bool:
+        """
+        判断是否放行一次请求。
+
+        放行后必须调用record_success或record_failure之一报告结果，
+        否则半开状态下的探测名额不会被释放。
+
+        Returns:
+            bool: 放行时返回True，熔断器打开或探测名额已满时返回False
+        """
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CircuitState.CLOSED:
+                return True
+            if self._state == CircuitState.HALF_OPEN:
+                if self._probes < self.half_open_max_calls:
+                    self._probes += 1
+                    return True
+            return False
+
+    def record_success(self):
+        """报告一次成功的请求"""
+        with self._lock:
+            self._timeouts = 0
+            if self._state == CircuitState.HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._probe_successes += 1
+                if self._probe_successes >= self.success_threshold:
+                    self._transition(CircuitState.CLOSED)
+                return
+            self._record_outcome(time.monotonic(), False)
+
+    def record_failure(self, timeout: bool = False):
+        """
+        报告一次失败的请求。
+
+        Args:
+            timeout (bool, optional): 是否为超时导致的失败。默认为False
+        """
+        with self._lock:
+            now = time.monotonic()
+            if timeout:
+                self._timeouts += 1
+            if self._state == CircuitState.HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._transition(CircuitState.OPEN, now)
+                return
+            if self._state == CircuitState.OPEN:
+                return
+
+            self._record_outcome(now, True)
+            if self._timeouts >= self.consecutive_timeouts or (
+                len(self._outcomes) >= self.minimum_calls
+                and self._failures / len(self._outcomes) >= self.failure_rate_threshold
+            ):
+                self._transition(CircuitState.OPEN, now)
+
+    def reset(self):
+        """手动关闭熔断器并清空统计数据"""
+        with self._lock:
+            self._transition(CircuitState.CLOSED)
+
+    def _record_outcome(self, now: float, failed: bool):
+        outcomes = self._outcomes
+        outcomes.append((now, failed))
+        self._failures += failed
+        cutoff = now - self.window
+        while outcomes and outcomes[0][0] < cutoff:
+            self._failures -= outcomes.popleft()[1]
+
+    def _maybe_half_open(self, now: float):
+        if (
+            self._state == CircuitState.OPEN
+            and now - self._opened_at >= self.recovery_timeout
+        ):
+            self._transition(CircuitState.HALF_OPEN)
+
+    def _transition(self, state: str, now: float = None):
+        """切换状态并重置对应的计数器，调用方需持有锁"""
+        old_state = self._state
+        self._state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == CircuitState.OPEN:
+            self._opened_at = now if now is not None else time.monotonic()
+        elif state == CircuitState.CLOSED:
+            self._outcomes.clear()
+            self._failures = 0
+            self._timeouts = 0
+
+        if old_state == state:
+            return
+        logger.warning("熔断器%s状态变化: %s -> %s", self.name or "", old_state, state)
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(self, old_state, state)
+            except Exception:
+                logger.exception("熔断器状态变化回调执行失败")
+
+    def __repr__(self) -> str:
+        return f"CircuitBreaker(name={self.name!r}, state={self._state!r})"
+
+
+def get_circuit_breaker(base_url: str, **kwargs) -> CircuitBreaker:
+    """
+    获取进程内按服务地址共享的熔断器。
+
+    同一个base_url第一次调用时按给定参数创建，之后的调用返回已有的熔断器。
+
+    Args:
+        base_url (str): Dify API基础URL，结尾的斜杠会被忽略
+        **kwargs: 传递给CircuitBreaker构造函数的参数，如recovery_timeout、on_state_change等
+
+    Returns:
+        CircuitBreaker: 该地址共享的熔断器
+    """
+    key = base_url.rstrip("/")
+    with _shared_breakers_lock:
+        breaker = _shared_breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(name=key, **kwargs)
+            _shared_breakers[key] = breaker
+        return breaker
@@ -0,0 +1,360 @@
+"""
+Pydify - 命令行工具
+
+此模块提供pydify命令。pydify run读取JSONL格式的工作流输入，以有限的并发数执行，
+并把每条结果在完成时追加到JSONL输出文件中。
+
+已完成输入行的字节偏移量会记录到检查点文件中，任务崩溃或被终止后使用相同的参数重新运行即可继续，
+已完成的输入不会重复执行。
+--retry-failed重新执行上次失败的输入时，新结果追加在旧结果之后，输出文件中同一个offset会有多条记录，
+以最后一条为准；在输出落盘后、记录检查点前被终止时同样可能出现重复记录。--shard i/N可以让多台机器或多个进程分别处理同一个输入文件的一部分。
+
+示例:
+    ```bash
+    export DIFY_BASE_URL=https://your-dify/v1 DIFY_API_KEY=app-xxx
+    pydify run inputs.jsonl -o results.jsonl --concurrency 16
+    pydify run inputs.jsonl -o results-0.jsonl --shard 0/2   # 机器A
+    pydify run inputs.jsonl -o results-1.jsonl --shard 1/2   # 机器B
+    ```
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from . import create_client
+from .common import DifyType
+from .config import VERSION
+
+# 检查点文件中每行的状态
+_OK = "ok"
+_ERROR = "error"
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    """解析"i/N"形式的分片参数，i从0开始"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为i/N，例如0/4: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片序号应满足0 <= i < N: {value}")
+    return index, count
+
+
+def _load_checkpoint(path: str, retry_failed: bool) -> Set[int]:
+    """
+    读取检查点文件，返回无需再执行的输入行偏移量。
+
+    只接受以换行结尾的完整行，进程在写入过程中被终止留下的半行会被忽略。
+    """
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            parts = line.split()
+            if not parts or not parts[0].isdigit():
+                continue
+            offset = int(parts[0])
+            status = parts[1] if len(parts) > 1 else _OK
+            if status == _OK or not retry_failed:
+                done.add(offset)
+            else:
+                done.discard(offset)
+    return done
+
+
+def _repair_output(path: str) -> Optional[bytes]:
+    """
+    截掉输出文件末尾不完整的行，返回最后一个完整的行。
+
+    Returns:
+        Optional[bytes]: 最后一个完整的行，文件不存在或为空时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        tail = b""
+        position = end
+        # 从末尾向前读取，直到找到最后两个换行符
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(65536, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+        cut = tail.rfind(b"\n") + 1
+        if position + cut < end:
+            f.truncate(position + cut)
+        lines = tail[:cut].splitlines()
+        return lines[-1] if lines else None
+
+
+def _read_inputs(
+    path: str,
+    done: Set[int],
+    shard: Tuple[int, int],
+    offsets: Dict[int, Tuple[int, int]],
+    on_invalid: Callable[[int, int, str], None],
+    counts: Dict[str, int],
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取输入文件，产出属于当前分片且尚未完成的输入。
+
+    每产出一条输入，都会在offsets中记录其批次序号对应的(字节偏移量, 行号)。
+    无法解析的行不会执行，直接通过on_invalid记为失败。
+    """
+    shard_index, shard_count = shard
+    index = 0
+    with open(path, "rb") as f:
+        line_no = 0
+        offset = 0
+        for raw in f:
+            line_offset, line_no = offset, line_no + 1
+            offset += len(raw)
+            if (line_no - 1) % shard_count != shard_index or not raw.strip():
+                continue
+            if line_offset in done:
+                counts["skipped"] += 1
+                continue
+            try:
+                inputs = json.loads(raw)
+                if not isinstance(inputs, dict):
+                    raise ValueError("每行应为一个JSON对象")
+            except ValueError as e:
+                on_invalid(line_offset, line_no, f"无法解析输入: {e}")
+                continue
+            offsets[index] = (line_offset, line_no)
+            index += 1
+            yield inputs
+
+
+class _Writer:
+    """把结果追加到输出文件，并在输出落盘后记录检查点"""
+
+    def __init__(self, output: str, checkpoint: str):
+        self.output = open(output, "a", encoding="utf-8")
+        self.checkpoint = open(checkpoint, "a", encoding="utf-8")
+
+    def write(self, offset: int, line_no: int, record: Dict[str, Any]):
+        record = dict(record, offset=offset, line=line_no)
+        self.output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.output.flush()
+        status = _OK if record.get("error") is None else _ERROR
+        self.mark(offset, status)
+
+    def mark(self, offset: int, status: str):
+        self.checkpoint.write(f"{offset} {status}\n")
+        self.checkpoint.flush()
+
+    def close(self):
+        self.output.close()
+        self.checkpoint.close()
+
+
+class _Reporter:
+    """定期在标准错误输出中报告吞吐量和错误率"""
+
+    def __init__(self, interval: float, counts: Dict[str, int], stream: TextIO):
+        self.interval = interval
+        self.counts = counts
+        self.stream = stream
+        self.started = time.monotonic()
+        self.last = self.started
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+
+    def update(self, ok: bool, running: int = 0):
+        self.done += 1
+        self.failed += 0 if ok else 1
+        self.running = running
+        now = time.monotonic()
+        if self.interval and now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        error_rate = self.failed / self.done if self.done else 0.0
+        parts = [
+            f"完成 {self.done}",
+            f"失败 {self.failed} ({error_rate:.1%})",
+            f"{rate:.2f} 条/秒",
+        ]
+        if not final:
+            parts.append(f"执行中 {self.running}")
+        if self.counts["skipped"]:
+            parts.append(f"已跳过 {self.counts['skipped']}")
+        parts.append(f"用时 {elapsed:.1f}s")
+        prefix = "[pydify] 结束: " if final else "[pydify] "
+        print(prefix + " | ".join(parts), file=self.stream, flush=True)
+
+
+def _run(args: argparse.Namespace) -> int:
+    """执行pydify run，返回退出码"""
+    output = args.output
+    checkpoint = args.checkpoint or output + ".checkpoint"
+    if args.restart:
+        for path in (output, checkpoint):
+            if os.path.exists(path):
+                os.remove(path)
+
+    done = _load_checkpoint(checkpoint, args.retry_failed)
+    # 写完输出、尚未记录检查点时被终止的那一条，以输出文件为准
+    last = _repair_output(output)
+    writer = _Writer(output, checkpoint)
+    if last is not None:
+        try:
+            record = json.loads(last)
+        except ValueError:
+            record = {}
+        offset = record.get("offset")
+        if isinstance(offset, int) and offset not in done:
+            status = _OK if record.get("error") is None else _ERROR
+            writer.mark(offset, status)
+            if status == _OK or not args.retry_failed:
+                done.add(offset)
+
+    client = create_client(
+        DifyType.Workflow,
+        args.base_url,
+        args.api_key,
+        pool_maxsize=max(args.concurrency, 10),
+    )
+    counts = {"skipped": 0}
+    offsets: Dict[int, Tuple[int, int]] = {}
+    reporter = _Reporter(args.progress_interval, counts, sys.stderr)
+
+    def on_invalid(offset: int, line_no: int, error: str):
+        writer.write(offset, line_no, {"input": None, "output": None, "error": error})
+        reporter.update(False)
+
+    items = _read_inputs(args.input, done, args.shard, offsets, on_invalid, counts)
+    results = client.run_batch(
+        items,
+        args.user,
+        concurrency=args.concurrency,
+        response_mode=args.response_mode,
+        ordered=False,
+        item_retries=args.item_retries,
+        on_progress=lambda result, stats: reporter.update(result.ok, stats.running),
+    )
+    interrupted = False
+    try:
+        for result in results:
+            offset, line_no = offsets.pop(result.index)
+            record = result.to_dict()
+            del record["index"]
+            writer.write(offset, line_no, record)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        results.close()
+        writer.close()
+        client.close()
+    reporter.report(final=True)
+    if interrupted:
+        print("[pydify] 已中断，使用相同的参数重新运行即可继续", file=sys.stderr)
+        return 130
+    return 1 if reporter.failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    构建pydify命令的参数解析器。
+
+    Returns:
+        argparse.ArgumentParser: 参数解析器
+    """
+    parser = argparse.ArgumentParser(prog="pydify", description="Dify API命令行工具")
+    parser.add_argument("--version", action="version", version=f"pydify {VERSION}")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser(
+        "run",
+        help="批量执行工作流",
+        description="读取JSONL格式的工作流输入（每行一个inputs对象），把结果按完成顺序追加到JSONL输出文件中。"
+        "中断后使用相同的参数重新运行即可从检查点继续。",
+    )
+    run.add_argument("input", help="输入文件，每行一个JSON对象，作为工作流的inputs")
+    run.add_argument(
+        "-o", "--output", required=True, help="输出文件，结果以JSONL格式追加写入"
+    )
+    run.add_argument(
+        "--checkpoint",
+        help="检查点文件，记录已完成输入行的字节偏移量。默认为输出文件名加.checkpoint",
+    )
+    run.add_argument("--api-key", help="应用的API密钥。默认读取DIFY_API_KEY环境变量")
+    run.add_argument("--base-url", help="API基础URL。默认读取DIFY_BASE_URL环境变量")
+    run.add_argument("--user", default="pydify-cli", help="用户标识。默认为pydify-cli")
+    run.add_argument(
+        "-c", "--concurrency", type=int, default=4, help="同时执行的工作流数。默认为4"
+    )
+    run.add_argument(
+        "--response-mode",
+        choices=["blocking", "streaming"],
+        default="blocking",
+        help="blocking时输出响应字典，streaming时在内部读完整个流并输出汇总结果。默认为blocking",
+    )
+    run.add_argument(
+        "--shard",
+        type=_parse_shard,
+        default=(0, 1),
+        metavar="i/N",
+        help="只处理第i个分片（从0开始，共N个），按行号对N取余划分",
+    )
+    run.add_argument(
+        "--item-retries",
+        type=int,
+        default=0,
+        help="单条输入因网络错误、429或5xx失败时重新执行的次数。默认为0",
+    )
+    run.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="继续时重新执行上次失败的输入。新结果追加在旧结果之后，同一offset以最后一条记录为准",
+    )
+    run.add_argument(
+        "--restart", action="store_true", help="删除输出和检查点文件，从头开始"
+    )
+    run.add_argument(
+        "--progress-interval",
+        type=float,
+        default=5.0,
+        help="报告进度的间隔(秒)，0表示只在结束时报告。默认为5秒",
+    )
+    run.set_defaults(func=_run)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    pydify命令的入口。
+
+    Args:
+        argv (List[str], optional): 命令行参数。默认为None，即使用sys.argv
+
+    Returns:
+        int: 退出码，全部成功时为0，有输入失败时为1，被中断时为130
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    if args.command == "run":
+        if args.concurrency < 1:
+            parser.error("--concurrency必须大于0")
+        args.api_key = args.api_key or os.environ.get("DIFY_API_KEY")
+        if not args.api_key:
+            parser.error("需要通过--api-key或DIFY_API_KEY环境变量提供API密钥")
+    return args.func(args)
@@ -0,0 +1,170 @@
+"""
+Pydify - JSON编解码
+
+此模块提供可替换的JSON编解码后端。请求体的序列化、阻塞响应的解析以及SSE事件的解码
+都通过同一个编解码器完成。默认自动选择已安装的最快后端（orjson > ujson > json标准库）。
+"""
+
+import json
+import threading
+from typing import Any, Dict, Optional, Union
+
+
+class JSONCodec:
+    """JSON编解码器基类
+
+    子类需要实现dumps和loads方法。dumps直接返回UTF-8编码的字节，
+    可以作为请求体发送而无需再次编码；loads同时接受bytes和str。
+    """
+
+    name = None
+
+    def dumps(self, obj: Any) -> bytes:
+        """将对象序列化为UTF-8编码的JSON字节"""
+        raise NotImplementedError
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        """
+        将JSON数据反序列化为Python对象。
+
+        Raises:
+            ValueError: 当数据不是合法的JSON时
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}>"
+
+
+class StdlibJSONCodec(JSONCodec):
+    """基于json标准库的编解码器，在没有安装其他后端时使用"""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """基于orjson的编解码器"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._dumps(obj)
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return self._loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """基于ujson的编解码器"""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+
+        self._dumps = ujson.dumps
+        self._loads = ujson.loads
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return self._loads(data)
+
+
+# 可用的编解码后端，"auto"时按顺序选择第一个已安装的
+CODECS = {
+    "orjson": OrjsonCodec,
+    "ujson": UjsonCodec,
+    "json": StdlibJSONCodec,
+}
+
+_codec_cache: Dict[str, JSONCodec] = {}
+_codec_lock = threading.Lock()
+_default_codec: Optional[JSONCodec] = None
+
+
+def get_codec(codec: Union[str, JSONCodec, None] = "auto") -> JSONCodec:
+    """
+    获取JSON编解码器。
+
+    Args:
+        codec (Union[str, JSONCodec, None], optional): 编解码器名称或实例:
+            - "auto": 自动选择已安装的最快后端
+            - "orjson"/"ujson"/"json": 指定后端
+            - JSONCodec实例: 原样返回
+            - None: 返回全局默认编解码器
+            默认为"auto"
+
+    Returns:
+        JSONCodec: 编解码器实例
+
+    Raises:
+        ValueError: 当名称未知时
+        ImportError: 当指定的后端未安装时
+    """
+    if codec is None:
+        return get_default_codec()
+    if isinstance(codec, JSONCodec):
+        return codec
+
+    instance = _codec_cache.get(codec)
+    if instance is not None:
+        return instance
+
+    with _codec_lock:
+        if codec in _codec_cache:
+            return _codec_cache[codec]
+
+        if codec == "auto":
+            instance = None
+            for codec_cls in CODECS.values():
+                try:
+                    instance = codec_cls()
+                    break
+                except ImportError:
+                    continue
+        elif codec in CODECS:
+            instance = CODECS[codec]()
+        else:
+            raise ValueError(
+                f"Invalid JSON codec: {codec}. Supported: auto, {', '.join(CODECS)}"
+            )
+
+        _codec_cache[codec] = instance
+        return instance
+
+
+def get_default_codec() -> JSONCodec:
+    """
+    获取全局默认的JSON编解码器，未设置时自动选择已安装的最快后端。
+
+    Returns:
+        JSONCodec: 编解码器实例
+    """
+    return _default_codec or get_codec("auto")
+
+
+def set_default_codec(codec: Union[str, JSONCodec, None]):
+    """
+    设置全局默认的JSON编解码器，对所有未单独指定json_codec的客户端生效。
+
+    Args:
+        codec (Union[str, JSONCodec, None]): 编解码器名称或实例，None表示恢复为自动选择
+    """
+    global _default_codec
+    _default_codec = get_codec(codec) if codec is not None else None
@@ -4,11 +4,14 @@ Pydify - 通用工具和基础类
 此模块提供了Dify API客户端的基础类和通用工具。
 """
 
+import contextlib
 import datetime
 import json
+import logging
 import mimetypes
 import os
 import re
+import threading
 import time
 from typing import (
     Any,
@@ -16,6 +19,7 @@ from typing import (
     Callable,
     Dict,
     Generator,
+    Iterable,
     List,
     Optional,
     Tuple,
@@ -24,8 +28,377 @@ from typing import (
 from urllib.parse import urljoin
 
 import requests
-import sseclient
-from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError
+from requests.adapters import HTTPAdapter
+
+from .circuit import CircuitBreaker
+from .codec import JSONCodec, get_codec
+from .events import parse_event
+from .forking import _register_after_fork
+from .hooks import ClientHooks, RequestInfo, _request_size, _response_size
+from .profiling import Profiler, ProfilingAdapter, _get_profiler
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .sse import LazyEvent, build_event_filter, iter_sse_events, peek_event_type
+from .stream import (
+    BufferedStream,
+    StreamGuard,
+    StreamTimeouts,
+    StreamTiming,
+    _StreamHandle,
+)
+
+logger = logging.getLogger("pydify")
+
+# 默认连接池参数
+DEFAULT_POOL_CONNECTIONS = 10  # 缓存的主机连接池数量
+DEFAULT_POOL_MAXSIZE = 10  # 每个主机保持的最大连接数
+
+_shared_sessions: Dict[Tuple[int, int, int, bool], requests.Session] = {}
+_shared_sessions_lock = threading.Lock()
+
+
+def create_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    pool_block: bool = False,
+    profile: bool = False,
+) -> requests.Session:
+    """
+    创建带连接池的HTTP会话。
+
+    会话内的连接会被保持（keep-alive）并复用，避免每次请求都重新进行TCP和TLS握手。
+    重试由客户端自身处理，因此适配器层面不做重试。
+
+    Args:
+        pool_connections (int, optional): 缓存的主机连接池数量。默认为10
+        pool_maxsize (int, optional): 每个主机保持的最大连接数。默认为10
+        pool_block (bool, optional): 连接池耗尽时是否阻塞等待空闲连接，
+                                     为False时会临时创建额外连接（用完即丢弃）。默认为False
+        profile (bool, optional): 是否使用ProfilingAdapter，以便剖析时记录DNS、连接和TLS时间。默认为False
+
+    Returns:
+        requests.Session: 配置好连接池的会话对象
+    """
+    session = requests.Session()
+    adapter = (ProfilingAdapter if profile else HTTPAdapter)(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=0,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_shared_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    pool_block: bool = False,
+) -> requests.Session:
+    """
+    获取进程内共享的HTTP会话。
+
+    相同连接池参数的调用会返回同一个会话，适合多个客户端实例（例如不同应用的API密钥）
+    共用一组到同一Dify服务的长连接。
+
+    Args:
+        pool_connections (int, optional): 缓存的主机连接池数量。默认为10
+        pool_maxsize (int, optional): 每个主机保持的最大连接数。默认为10
+        pool_block (bool, optional): 连接池耗尽时是否阻塞等待空闲连接。默认为False
+
+    Returns:
+        requests.Session: 共享的会话对象
+    """
+    # 按进程区分，fork出的子进程不会拿到父进程的连接池
+    key = (os.getpid(), pool_connections, pool_maxsize, pool_block)
+    with _shared_sessions_lock:
+        session = _shared_sessions.get(key)
+        if session is None:
+            session = create_session(pool_connections, pool_maxsize, pool_block)
+            _shared_sessions[key] = session
+        return session
+
+
+def _parse_error_response(response) -> Tuple[Dict[str, Any], str]:
+    """
+    从失败的HTTP响应中提取错误数据和错误详情。
+
+    Args:
+        response: HTTP响应对象，需提供json()方法和text属性
+
+    Returns:
+        Tuple[Dict[str, Any], str]: 服务器返回的错误数据和可读的错误详情
+    """
+    error_data = {}
+    error_details = ""
+
+    # 尝试解析错误数据
+    try:
+        error_data = response.json()
+        if isinstance(error_data, dict):
+            if "error" in error_data and isinstance(error_data["error"], dict):
+                error_details = error_data["error"].get("message", "")
+            else:
+                error_details = error_data.get("message", "")
+    except ValueError:
+        if response.text:
+            error_details = response.text[:500]
+
+    return error_data, error_details
+
+
+def _response_retry_after(response) -> Optional[float]:
+    """从失败的HTTP响应中解析服务端要求的Retry-After等待时间(秒)，没有时返回None"""
+    return RetryPolicy.parse_retry_after(response.headers.get("Retry-After"))
+
+
+def _format_http_error(
+    method: str,
+    url: str,
+    endpoint: str,
+    status_code: int,
+    reason: str,
+    error_details: str,
+    title: str = "API请求失败",
+) -> str:
+    """构建HTTP状态码错误的格式化消息"""
+    return f"""
+PYDIFY:{title}: 
+└─ 请求信息:
+   ├─ 方法: {method}
+   ├─ URL: {url}
+   └─ 端点: {endpoint}
+└─ 响应信息:
+   ├─ 状态码: {status_code} ({reason})
+   └─ 错误详情: {error_details}
+"""
+
+
+def _format_network_error(
+    method: str,
+    url: str,
+    endpoint: str,
+    error: Exception,
+    base_url: str,
+    timeout: Any,
+) -> str:
+    """构建网络错误的格式化消息，附带排查建议"""
+    error_msg = f"""
+PYDIFY:网络请求失败: 
+└─ 请求信息:
+   ├─ 方法: {method}
+   ├─ URL: {url}
+   └─ 端点: {endpoint}
+└─ 错误信息:
+   ├─ 类型: {type(error).__name__}
+   └─ 详情: {str(error)}
+"""
+
+    # 提供连接问题的建议
+    suggestions = """
+请检查:
+1. 网络连接是否正常
+2. API地址是否正确: {0}
+3. 服务器是否可用
+4. SSL证书是否有效
+5. 超时设置是否合理: {1}秒
+""".format(base_url, timeout)
+
+    return f"{error_msg}{suggestions}"
+
+
+def _format_circuit_open_error(
+    method: str, url: str, endpoint: str, base_url: str, retry_after: float
+) -> str:
+    """构建熔断器打开时的格式化消息"""
+    return f"""
+PYDIFY:熔断器已打开，请求被拒绝:
+└─ 请求信息:
+   ├─ 方法: {method}
+   ├─ URL: {url}
+   └─ 端点: {endpoint}
+└─ 熔断信息:
+   ├─ 服务地址: {base_url}
+   └─ 预计恢复: {retry_after:.1f}秒后放行探测请求
+"""
+
+
+# 各类超时的中文说明，用于错误消息
+_TIMEOUT_DESCRIPTIONS = {
+    StreamTimeouts.CONNECT: "建立连接",
+    StreamTimeouts.FIRST_BYTE: "等待首个数据块",
+    StreamTimeouts.IDLE: "相邻数据块间隔",
+    StreamTimeouts.TOTAL: "流式调用总时长",
+}
+
+
+def _format_stream_timeout_error(
+    method: str, url: str, endpoint: str, kind: str, timeout: Optional[float]
+) -> str:
+    """构建流式请求超时的格式化消息"""
+    return f"""
+PYDIFY:流式请求超时:
+└─ 请求信息:
+   ├─ 方法: {method}
+   ├─ URL: {url}
+   └─ 端点: {endpoint}
+└─ 超时信息:
+   ├─ 类型: {kind} ({_TIMEOUT_DESCRIPTIONS.get(kind, kind)})
+   └─ 时限: {timeout}秒
+"""
+
+
+def _is_transient_error(error: "DifyAPIError") -> bool:
+    """判断错误是否可能在稍后自行恢复（网络错误、429和5xx）"""
+    if isinstance(error, DifyStreamDecodeError):
+        return False
+    return (
+        error.status_code is None
+        or error.status_code == 429
+        or error.status_code >= 500
+    )
+
+
+def _format_recovery_timeout_error(
+    state: "_StreamState", error: Optional[BaseException], timeout: float
+) -> str:
+    """构建断线恢复超时的格式化消息"""
+    return f"""
+PYDIFY:流式连接中断，恢复任务结果超时:
+└─ 任务信息:
+   └─ {state}
+└─ 中断原因:
+   └─ {error if error is not None else "服务端在结束事件之前关闭了连接"}
+└─ 恢复信息:
+   └─ 在{timeout}秒内任务仍未结束
+"""
+
+
+class _StreamState:
+    """流式响应过程中记录的任务标识，用于断线恢复和提前关闭时停止任务
+
+    只在还缺少所需标识时扫描事件数据，取齐之后每个事件只需要判断一次事件类型。
+    """
+
+    __slots__ = (
+        "user",
+        "task_id",
+        "workflow_run_id",
+        "message_id",
+        "conversation_id",
+        "finished",
+        "recover",
+        "stop_on_close",
+        "stopped",
+        "_required",
+        "_terminal_events",
+    )
+
+    _ID_PATTERN = re.compile(
+        rb'"(task_id|workflow_run_id|message_id|conversation_id)"\s*:\s*"([^"\\]*)"'
+    )
+
+    def __init__(
+        self,
+        user: Optional[str],
+        conversation_id: Optional[str],
+        required: Tuple[str, ...],
+        terminal_events: frozenset,
+        recover: bool = True,
+        stop_on_close: bool = True,
+    ):
+        self.user = user
+        self.task_id = None
+        self.workflow_run_id = None
+        self.message_id = None
+        self.conversation_id = conversation_id or None
+        self.finished = False
+        self.recover = recover
+        self.stop_on_close = stop_on_close
+        self.stopped = False
+        self._required = required
+        self._terminal_events = terminal_events
+
+    def observe(self, data: bytes, event_type: Optional[str]):
+        """记录一个事件中的任务标识和结束状态"""
+        if event_type in self._terminal_events:
+            self.finished = True
+        if self.task_id is None or not all(
+            getattr(self, name) for name in self._required
+        ):
+            for match in self._ID_PATTERN.finditer(data):
+                name = match.group(1).decode("ascii")
+                if getattr(self, name) is None and match.group(2):
+                    setattr(self, name, match.group(2).decode("utf-8"))
+
+    def __repr__(self) -> str:
+        ids = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in ("task_id", "workflow_run_id", "message_id", "conversation_id")
+            if getattr(self, name)
+        )
+        return f"StreamState({ids})"
+
+
+def _make_rewind(files: Optional[Dict[str, Any]]) -> Optional[Callable[[], bool]]:
+    """
+    为包含文件的请求生成重试前的重置函数，把文件指针移回发送前的位置。
+
+    Args:
+        files (Dict[str, Any], optional): 传给requests的files参数
+
+    Returns:
+        Optional[Callable[[], bool]]: 重置函数；文件无法重新定位时返回的函数总是返回False，
+            表示该请求不能安全重试。没有文件时返回None
+    """
+    if not files:
+        return None
+
+    positions = []
+    for value in files.values():
+        file_obj = value[1] if isinstance(value, tuple) else value
+        if isinstance(file_obj, (bytes, str)):
+            continue
+        try:
+            positions.append((file_obj, file_obj.tell()))
+        except (AttributeError, OSError):
+            return lambda: False
+
+    def rewind() -> bool:
+        for file_obj, position in positions:
+            file_obj.seek(position)
+        return True
+
+    return rewind
+
+
+# 截止时间将到时，单次尝试至少保留的超时时间(秒)
+_MIN_ATTEMPT_TIMEOUT = 0.01
+
+
+def _call_deadline(deadline: Optional[float]) -> Optional[float]:
+    """把单次调用的时间预算(秒)换算为time.monotonic()上的截止时间，None或0表示不限制"""
+    return time.monotonic() + deadline if deadline else None
+
+
+def _attempt_timeout(timeout: Any, deadline: Optional[float]) -> Any:
+    """
+    计算单次尝试的超时时间，不超过到截止时间为止的剩余时间。
+
+    Args:
+        timeout (Any): 请求的超时设置，可以是秒数、None或requests的(connect, read)元组
+        deadline (float, optional): 整个调用的截止时间(time.monotonic())
+
+    Returns:
+        Any: 与timeout形式相同的超时设置
+    """
+    if deadline is None:
+        return timeout
+    remaining = max(deadline - time.monotonic(), _MIN_ATTEMPT_TIMEOUT)
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
 
 
 class DifyType:
@@ -55,12 +428,30 @@ class DifyBaseClient:
     - 用户会话管理
     - 消息反馈功能
 
+    所有请求都通过带连接池的requests.Session发送，连接会被保持并复用。
+    会话本身是线程安全的，一个客户端实例可以同时被多个线程使用。
+
     子类应设置适当的type属性，并根据需要实现特定的API方法。
     """
 
     type = None
 
-    def __init__(self, api_key: str, base_url: str = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = None,
+        session: requests.Session = None,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = False,
+        json_codec: Union[str, JSONCodec, None] = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+        stream_timeouts: StreamTimeouts = None,
+        hooks: Iterable[ClientHooks] = None,
+        profile: Union[bool, Profiler, None] = None,
+    ):
         """
         初始化Dify API客户端。
 
@@ -70,6 +461,33 @@ class DifyBaseClient:
             base_url (str, optional): API基础URL。如果未提供，则使用默认的Dify API地址。
                                     可以设置为自托管Dify实例的URL。
                                     也可以通过DIFY_BASE_URL环境变量设置。
+            session (requests.Session, optional): 自定义HTTP会话。可以传入get_shared_session()
+                                    的返回值，让多个客户端共用同一个连接池。
+                                    默认为None，即为当前客户端创建独立的连接池
+            pool_connections (int, optional): 缓存的主机连接池数量，仅在未提供session时生效。默认为10
+            pool_maxsize (int, optional): 每个主机保持的最大连接数，仅在未提供session时生效。
+                                    并发线程数较多时应适当调大。默认为10
+            pool_block (bool, optional): 连接池耗尽时是否阻塞等待空闲连接，仅在未提供session时生效。
+                                    默认为False
+            json_codec (Union[str, JSONCodec], optional): 用于请求体、响应和SSE事件的JSON编解码器，
+                                    可以是"auto"、"orjson"、"ujson"、"json"或JSONCodec实例。
+                                    默认为None，即使用set_default_codec设置的全局默认值
+            retry_policy (RetryPolicy, optional): 请求失败时的重试策略，包括指数退避、抖动、
+                                    Retry-After和重试预算等设置。默认为RetryPolicy()
+            rate_limiter (RateLimiter, optional): 客户端限流器，请求在本地排队而不是被服务端以429拒绝。
+                                    可以传入get_rate_limiter(api_key, ...)的返回值，
+                                    让使用同一密钥的客户端共享限额。默认为None，即不限流
+            circuit_breaker (CircuitBreaker, optional): 熔断器，后端持续失败时快速失败并抛出
+                                    DifyCircuitOpenError。可以传入get_circuit_breaker(base_url)的返回值，
+                                    让访问同一服务的客户端共享熔断状态。默认为None，即不熔断
+            stream_timeouts (StreamTimeouts, optional): 流式请求的分段超时设置，分别限制建立连接、
+                                    等待首个数据块、相邻数据块间隔和总时长。默认为StreamTimeouts()
+            hooks (Iterable[ClientHooks], optional): 调用钩子，在请求开始、重试、收到响应、
+                                    收到流式事件和出错时回调，例如MetricsCollector。默认为None
+            profile (Union[bool, Profiler], optional): 是否记录每次请求在DNS、连接、TLS、等待响应和下载上的耗时，
+                                    记录保存在client.profiler中。也可以传入Profiler实例让多个客户端共用统计。
+                                    使用外部传入的session时无法拆分连接阶段，只记录等待和下载时间。
+                                    默认为None，即由PYDIFY_PROFILE环境变量决定
 
         注意:
             - API密钥应当保密，不要在客户端代码中硬编码
@@ -84,6 +502,99 @@ class DifyBaseClient:
         if not self.base_url.endswith("/"):
             self.base_url += "/"
 
+        self.profiler = _get_profiler(profile)
+        # 自行创建的会话由客户端负责关闭，外部传入的会话由调用方管理
+        self._owns_session = session is None
+        # 自行创建会话时的连接池参数，在子进程中据此重新创建会话
+        self._pool_options = {
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+            "pool_block": pool_block,
+        }
+        self._after_fork()
+        self._session = session or self._create_session()
+        self.json_codec = json_codec
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.stream_timeouts = stream_timeouts or StreamTimeouts()
+        self.hooks = tuple(hooks or ())
+        _register_after_fork(self)
+
+    # 只在当前进程中有效的属性，序列化时丢弃，在新进程中重新创建
+    _process_local = ("_session_lock", "_streams", "_streams_cond")
+
+    def _after_fork(self):
+        """
+        丢弃从父进程继承的连接池和锁。
+
+        自行创建的会话在首次使用时重新创建。父进程的套接字仍由父进程使用，因此不关闭旧会话。
+        外部传入的会话由调用方负责，不会被替换。
+        """
+        self._session_lock = threading.Lock()
+        if self._owns_session:
+            self._session = None
+        # 正在进行的流式调用，用于在关闭前统一停止或等待服务端任务
+        self._streams = set()
+        self._streams_cond = threading.Condition()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        序列化时只保留配置，连接池、锁和正在进行的流式调用都不会被复制。
+
+        自行创建的会话会在反序列化后首次使用时重新创建；外部传入的requests.Session
+        按requests自身的方式序列化，得到一个连接池为空的新会话。
+        """
+        state = {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in self._process_local
+        }
+        if self._owns_session:
+            state["_session"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._after_fork()
+        _register_after_fork(self)
+
+    def _create_session(self) -> requests.Session:
+        return create_session(profile=self.profiler is not None, **self._pool_options)
+
+    @property
+    def session(self) -> requests.Session:
+        """客户端使用的HTTP会话，在fork出的子进程中或反序列化后首次访问时重新创建"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    @session.setter
+    def session(self, session: requests.Session):
+        self._session = session
+
+    @property
+    def codec(self) -> JSONCodec:
+        """当前客户端使用的JSON编解码器"""
+        return get_codec(self.json_codec)
+
+    def close(self):
+        """
+        关闭客户端持有的连接池。
+
+        仅关闭客户端自行创建的会话，通过session参数传入的会话不会被关闭。
+        """
+        if self._owns_session and self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _get_headers(self) -> Dict[str, str]:
         """
         获取API请求头。
@@ -96,6 +607,178 @@ class DifyBaseClient:
             "Content-Type": "application/json",
         }
 
+    def _throttle(self):
+        """按照限流器的速率等待，直到可以发出下一个请求（包括重试）"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def _stream_slot(self):
+        """返回占用一个并发流名额的上下文管理器，未设置限流器时不做任何限制"""
+        if self.rate_limiter is None:
+            return contextlib.nullcontext()
+        return self.rate_limiter.stream_slot()
+
+    # 熔断器统计时视为超时的异常类型
+    _timeout_exceptions = (requests.Timeout, TimeoutError)
+
+    def _check_circuit(self, method: str, url: str, endpoint: str):
+        """
+        熔断器打开时快速失败。
+
+        Raises:
+            DifyCircuitOpenError: 当熔断器打开或半开状态下探测名额已满时
+        """
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow_request():
+            retry_after = breaker.retry_after
+            raise DifyCircuitOpenError(
+                _format_circuit_open_error(
+                    method, url, endpoint, self.base_url, retry_after
+                ),
+                retry_after=retry_after,
+            )
+
+    def _record_outcome(self, response=None, error: BaseException = None):
+        """向熔断器报告一次请求的结果，网络错误、超时和5xx响应记为失败"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return
+        if error is not None:
+            breaker.record_failure(timeout=isinstance(error, self._timeout_exceptions))
+        elif response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def add_hook(self, hook: ClientHooks):
+        """注册一个调用钩子"""
+        self.hooks = self.hooks + (hook,)
+
+    def remove_hook(self, hook: ClientHooks):
+        """移除一个已注册的调用钩子"""
+        self.hooks = tuple(h for h in self.hooks if h is not hook)
+
+    def _emit(self, name: str, *args):
+        """依次调用所有钩子的name方法，钩子抛出的异常只记录日志"""
+        for hook in self.hooks:
+            try:
+                getattr(hook, name)(*args)
+            except Exception:
+                logger.warning(
+                    "调用钩子%s.%s失败", type(hook).__name__, name, exc_info=True
+                )
+
+    def _start_call(
+        self, method: str, endpoint: str, url: str, stream: bool = False
+    ) -> Optional[RequestInfo]:
+        """调用开始时通知钩子，没有注册钩子时返回None，后续的钩子方法都不做任何事情"""
+        if not self.hooks:
+            return None
+        info = RequestInfo(method, endpoint, url, stream)
+        self._emit("on_request_start", info)
+        return info
+
+    def _retry_hook(
+        self, info: Optional[RequestInfo]
+    ) -> Optional[Callable[[int, float, Any], None]]:
+        """返回传给RetryPolicy的on_retry回调"""
+        if info is None:
+            return None
+
+        def on_retry(attempt: int, delay: float, reason: Any):
+            info.attempts += 1
+            self._emit("on_retry", info, attempt, delay, reason)
+
+        return on_retry
+
+    def _call_response(self, info: Optional[RequestInfo], response):
+        """收到最终响应时通知钩子，流式响应的响应体字节数在读取事件时累计"""
+        if info is None:
+            return
+        info.elapsed = time.monotonic() - info.started
+        info.status_code = response.status_code
+        info.bytes_out = _request_size(response)
+        if not info.stream:
+            info.bytes_in = _response_size(response)
+            info.duration = info.elapsed
+        self._emit("on_response", info)
+
+    def _stream_event(self, info: RequestInfo, event_type: Optional[str], size: int):
+        """流式调用收到一个事件时通知钩子"""
+        info.events += 1
+        info.bytes_in += size
+        self._emit("on_stream_event", info, event_type, size)
+
+    def _stream_timing(
+        self,
+        timing: Optional[StreamTiming],
+        info: Optional[RequestInfo],
+        started: float,
+    ) -> Optional[StreamTiming]:
+        """准备流式调用的时间记录，调用方没有传入但注册了钩子时也会创建，供钩子读取"""
+        if timing is None and info is not None:
+            timing = StreamTiming()
+        if timing is not None:
+            timing._start(started)
+            if info is not None:
+                info.timing = timing
+        return timing
+
+    def _stream_end(self, info: Optional[RequestInfo]):
+        """流式调用结束时通知钩子"""
+        if info is None:
+            return
+        info.duration = time.monotonic() - info.started
+        self._emit("on_stream_end", info)
+
+    def _call_error(
+        self, info: Optional[RequestInfo], error: BaseException
+    ) -> BaseException:
+        """调用失败时通知钩子，返回error以便直接raise"""
+        if info is not None and info.error is None:
+            info.error = error
+            if info.duration is None or info.stream:
+                info.duration = time.monotonic() - info.started
+            self._emit("on_error", info, error)
+        return error
+
+    def _send(
+        self,
+        send: Callable[[], requests.Response],
+        method: str,
+        url: str,
+        endpoint: str,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        在限流器和熔断器的保护下发送一次请求，每次重试都会重新经过这里。
+
+        Args:
+            send (Callable[[], requests.Response]): 实际发送请求的函数
+            method (str): HTTP方法，用于错误信息
+            url (str): 完整的请求URL，用于错误信息
+            endpoint (str): API端点，用于错误信息和剖析统计
+            stream (bool, optional): 是否为流式请求，仅用于剖析统计。默认为False
+
+        Returns:
+            requests.Response: 请求响应对象
+
+        Raises:
+            DifyCircuitOpenError: 当熔断器打开时
+        """
+        self._throttle()
+        self._check_circuit(method, url, endpoint)
+        try:
+            if self.profiler is None:
+                response = send()
+            else:
+                response = self.profiler.measure(method, endpoint, send, stream)
+        except BaseException as e:
+            self._record_outcome(error=e)
+            raise
+        self._record_outcome(response)
+        return response
+
     def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
         """
         发送HTTP请求到Dify API并处理可能的错误。
@@ -110,9 +793,11 @@ class DifyBaseClient:
                 - params: URL查询参数
                 - data: 表单数据
                 - json: JSON数据
-                - timeout: 请求超时时间(秒)
-                - max_retries: 最大重试次数
-                - retry_delay: 重试间隔(秒)
+                - timeout: 单次尝试的超时时间(秒)
+                - deadline: 整个调用的时间预算(秒)，包括所有重试和退避等待。每次尝试的超时时间
+                  不超过剩余时间，预算用完后不再重试。默认为None，即不限制
+                - max_retries: 最大重试次数，覆盖客户端重试策略中的设置
+                - retry_delay: 退避的基础等待时间(秒)，覆盖客户端重试策略中的设置
 
         Returns:
             requests.Response: 请求响应对象
@@ -132,118 +817,107 @@ class DifyBaseClient:
         headers = kwargs.pop("headers", {})
         headers.update(self._get_headers())
 
-        # 设置重试机制
-        max_retries = kwargs.pop("max_retries", 2)
-        retry_delay = kwargs.pop("retry_delay", 1)
+        # 单次调用传入的max_retries/retry_delay会覆盖客户端的默认重试策略
+        policy = self.retry_policy.replace(
+            max_retries=kwargs.pop("max_retries", None),
+            base_delay=kwargs.pop("retry_delay", None),
+        )
         timeout = kwargs.pop("timeout", 30)
+        deadline = _call_deadline(kwargs.pop("deadline", None))
+        info = self._start_call(method, endpoint, url)
 
-        # 添加超时参数
-        kwargs["timeout"] = timeout
-
-        for attempt in range(max_retries + 1):
-            try:
-                response = requests.request(method, url, headers=headers, **kwargs)
-
-                if not response.ok:
-                    error_data = {}
-                    error_details = ""
+        try:
+            response = policy.execute(
+                lambda: self._send(
+                    lambda: self.session.request(
+                        method,
+                        url,
+                        headers=headers,
+                        timeout=_attempt_timeout(timeout, deadline),
+                        **kwargs,
+                    ),
+                    method,
+                    url,
+                    endpoint,
+                ),
+                description=f"{method} {endpoint}",
+                rewind=_make_rewind(kwargs.get("files")),
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
+            )
+        except (requests.RequestException, ConnectionError) as e:
+            # 提供更友好的错误信息
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    _format_network_error(
+                        method, url, endpoint, e, self.base_url, timeout
+                    )
+                ),
+            )
+        except DifyAPIError as e:
+            raise self._call_error(info, e)
+        self._call_response(info, response)
 
-                    # 尝试解析错误数据
-                    try:
-                        error_data = response.json()
-                        if isinstance(error_data, dict):
-                            if "error" in error_data and isinstance(
-                                error_data["error"], dict
-                            ):
-                                error_details = error_data["error"].get("message", "")
-                            else:
-                                error_details = error_data.get("message", "")
-                    except RequestsJSONDecodeError:
-                        if response.text:
-                            error_details = response.text[:500]
-
-                    # 构建格式化的错误消息
-                    error_msg = f"""
-PYDIFY:API请求失败: 
-└─ 请求信息:
-   ├─ 方法: {method}
-   ├─ URL: {url}
-   └─ 端点: {endpoint}
-└─ 响应信息:
-   ├─ 状态码: {response.status_code} ({response.reason})
-   └─ 错误详情: {error_details}
-"""
+        if not response.ok:
+            error_data, error_details = _parse_error_response(response)
 
-                    # 如果是可重试的错误码，并且还有重试次数，则重试
-                    if (
-                        response.status_code in [429, 500, 502, 503, 504]
-                        and attempt < max_retries
-                    ):
-                        print(
-                            f"请求失败，状态码: {response.status_code}，{attempt+1}秒后重试..."
-                        )
-                        time.sleep(retry_delay)
-                        continue
+            # 构建格式化的错误消息
+            error_msg = _format_http_error(
+                method,
+                url,
+                endpoint,
+                response.status_code,
+                response.reason,
+                error_details,
+            )
+            raise self._call_error(
+                info,
+                DifyAPIError(
+                    error_msg,
+                    status_code=response.status_code,
+                    error_data=error_data,
+                    retry_after=_response_retry_after(response),
+                ),
+            )
 
-                    # 否则抛出异常
-                    raise DifyAPIError(
-                        error_msg,
-                        status_code=response.status_code,
-                        error_data=error_data,
-                    )
+        return response
 
-                return response
-
-            except (requests.RequestException, ConnectionError) as e:
-                # 如果是网络错误且还有重试次数，则重试
-                if attempt < max_retries:
-                    # 提供更详细的错误信息
-                    error_type = type(e).__name__
-
-                    # 检测具体的连接问题类型
-                    if isinstance(e, requests.exceptions.SSLError):
-                        error_msg = f"SSL连接错误: {str(e)}"
-                    elif isinstance(e, requests.exceptions.ConnectTimeout):
-                        error_msg = f"连接超时: {str(e)}"
-                    elif isinstance(e, requests.exceptions.ReadTimeout):
-                        error_msg = f"读取超时: {str(e)}"
-                    elif isinstance(e, requests.exceptions.ConnectionError):
-                        error_msg = f"网络连接错误: {str(e)}"
-                    else:
-                        error_msg = f"网络错误({error_type}): {str(e)}"
+    def _request_json(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """
+        发送请求并将响应解析为JSON，供需要自定义请求参数（如multipart上传）的方法使用。
 
-                    print(f"{error_msg}，{attempt+1}秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
+        Args:
+            method (str): HTTP方法
+            endpoint (str): API端点路径，相对于base_url
+            **kwargs: 传递给_request方法的其他参数
 
-                # 提供更友好的错误信息
-                error_type = type(e).__name__
+        Returns:
+            Dict[str, Any]: 响应的JSON数据
+        """
+        return self.codec.loads(self._request(method, endpoint, **kwargs).content)
 
-                # 格式化的网络错误消息
-                error_msg = f"""
-PYDIFY:网络请求失败: 
-└─ 请求信息:
-   ├─ 方法: {method}
-   ├─ URL: {url}
-   └─ 端点: {endpoint}
-└─ 错误信息:
-   ├─ 类型: {error_type}
-   └─ 详情: {str(e)}
-"""
+    def _parse_json_response(self, response, endpoint: str) -> Dict[str, Any]:
+        """
+        使用客户端的JSON编解码器解析响应内容。
 
-                # 提供连接问题的建议
-                suggestions = """
-请检查:
-1. 网络连接是否正常
-2. API地址是否正确: {0}
-3. 服务器是否可用
-4. SSL证书是否有效
-5. 超时设置是否合理: {1}秒
-""".format(
-                    self.base_url, timeout
-                )
+        Args:
+            response: HTTP响应对象
+            endpoint (str): 请求的API端点，用于输出警告信息
 
-                raise DifyAPIError(f"{error_msg}{suggestions}")
+        Returns:
+            Dict[str, Any]: 解析后的JSON数据，响应为空或无法解析时返回空字典
+        """
+        try:
+            if not response.content.strip():
+                # 如果响应为空，返回空字典
+                return {}
+            return self.codec.loads(response.content)
+        except ValueError:
+            # 捕获JSON解析错误，打印警告信息并返回空字典
+            print(f"警告: 无法解析API响应为JSON ({endpoint})")
+            print(f"响应内容: {response.text[:100]}")
+            return {}
 
     def get(self, endpoint: str, **kwargs) -> Dict[str, Any]:
         """
@@ -272,16 +946,7 @@ PYDIFY:网络请求失败:
             ```
         """
         response = self._request("GET", endpoint, **kwargs)
-        try:
-            if not response.text.strip():
-                # 如果响应为空，返回空字典
-                return {}
-            return response.json()
-        except RequestsJSONDecodeError as e:
-            # 捕获JSON解析错误，打印警告信息并返回空字典
-            print(f"警告: 无法解析API响应为JSON ({endpoint})")
-            print(f"响应内容: {response.text[:100]}")
-            return {}
+        return self._parse_json_response(response, endpoint)
 
     def post(
         self,
@@ -317,17 +982,16 @@ PYDIFY:网络请求失败:
             })
             ```
         """
-        response = self._request("POST", endpoint, data=data, json=json_data, **kwargs)
-        try:
-            if not response.text.strip():
-                # 如果响应为空，返回空字典
-                return {}
-            return response.json()
-        except RequestsJSONDecodeError as e:
-            # 捕获JSON解析错误，打印警告信息并返回空字典
-            print(f"警告: 无法解析API响应为JSON ({endpoint})")
-            print(f"响应内容: {response.text[:100]}")
-            return {}
+        if json_data is not None and data is None:
+            # 请求体只序列化一次，直接以字节形式发送
+            response = self._request(
+                "POST", endpoint, data=self.codec.dumps(json_data), **kwargs
+            )
+        else:
+            response = self._request(
+                "POST", endpoint, data=data, json=json_data, **kwargs
+            )
+        return self._parse_json_response(response, endpoint)
 
     def post_stream(
         self, endpoint: str, json_data: Dict[str, Any], **kwargs
@@ -342,11 +1006,65 @@ PYDIFY:网络请求失败:
             endpoint (str): API端点，相对于base_url的路径
             json_data (Dict[str, Any]): 要发送的JSON数据
             **kwargs: 传递给requests的其他参数，常用的包括:
-                - timeout: 请求超时时间(秒)，流式请求通常需要更长的超时时间
-                - max_retries: 最大重试次数
+                - timeout: 流式调用的总时长上限(秒)，等同于total_timeout
+                - connect_timeout (float): 建立连接的超时时间(秒)
+                - first_byte_timeout (float): 从发出请求到收到第一块数据的超时时间(秒)
+                - idle_timeout (float): 相邻两块数据之间的最长间隔(秒)
+                - total_timeout (float): 流式调用的总时长上限(秒)
+                - max_retries: 建立连接时的最大重试次数，覆盖客户端重试策略中的设置
+                - retry_delay: 退避的基础等待时间(秒)，覆盖客户端重试策略中的设置
+                - events (Iterable[str]): 只产出这些类型的事件，例如["text_chunk", "workflow_finished"]。
+                  使用白名单时error事件总是会被保留
+                - exclude_events (Iterable[str]): 丢弃这些类型的事件，例如["ping", "node_started"]
+                - lazy (bool): 为True时产出LazyEvent对象，事件数据只在被访问时才解码。默认为False
+                - typed (bool): 为True时产出类型化的事件对象（如NodeFinished、TextChunk，见pydify.events），
+                  字段以属性访问。与lazy同时使用时，inputs、outputs等体积较大的字段在第一次访问时才解码。
+                  不能与raw同时使用。默认为False
+                - raw (bool): 为True时原样产出SSE事件帧的字节（如b'data: {...}\\n\\n'），不解码JSON，
+                  可以直接写入下游的HTTP响应。仍然会读取事件类型用于过滤、任务标识记录和错误检测。
+                  默认为False
+                - recover (bool): 连接中断后是否尝试通过查询接口恢复结果。默认为True
+                - recover_timeout (float): 恢复时轮询查询接口的最长时间(秒)。默认为600秒
+                - recover_interval (float): 恢复时的轮询间隔(秒)。默认为2秒
+                - stop_on_close (bool): 调用方在任务结束前关闭生成器时，是否调用stop_task停止服务端任务。
+                  默认为True
+                - timing (StreamTiming): 传入后记录收到响应头、第一块数据和第一个内容事件的时间、
+                  相邻内容事件的间隔以及总时长，调用过程中即可读取
+                - buffer_size (int): 大于0时在后台线程中读取SSE流，最多缓存这么多个事件，
+                  让较慢的调用方不会拖慢服务端的发送。默认为0，即在调用方线程中直接读取
+                - backpressure (str): 缓存已满时的处理策略，"block"、"drop_pings"或"coalesce"，
+                  含义见BufferedStream。默认为"block"
+
+                被过滤的事件只读取事件类型，不会解码完整的JSON数据。
+
+        重试规则:
+            流式请求只在建立连接阶段按客户端的重试策略重试，即:
+            - 连接失败、请求发送失败或等待响应头超时等网络错误
+            - 响应状态码属于重试策略中的可重试状态码（默认429、500、502、503、504）
+            一旦收到成功的响应头，服务端就已经开始执行任务，此后无论是否已经产出事件都不会重试，
+            避免同一个工作流或消息被重复执行。
+
+        超时规则:
+            以上四个超时参数覆盖客户端stream_timeouts中的对应设置，0表示不限制。
+            读取事件期间由看门狗监控，超时后立即关闭连接并抛出对应的异常:
+            DifyConnectTimeoutError、DifyFirstByteTimeoutError、DifyIdleTimeoutError或
+            DifyTotalTimeoutError，它们都是DifyTimeoutError的子类。
+            调用方处理事件所花的时间不计入空闲间隔，但计入总时长。
+
+        断线恢复:
+            如果连接在收到结束事件之前中断（网络错误或服务端提前关闭连接），而此时已经从事件中
+            取得了任务标识（Workflow为workflow_run_id，对话类应用为message_id和conversation_id），
+            客户端会轮询对应的查询接口直到任务结束，然后补发合成的结束事件（带有"recovered": True），
+            而不是重新执行整个任务。不支持恢复的应用类型或尚未取得标识时，原样抛出网络错误。
+
+        提前关闭:
+            调用方提前停止读取并关闭生成器时（显式调用close()、break后生成器被回收等），
+            客户端立即断开连接，并使用第一个事件中的task_id调用stop_task，避免服务端继续生成。
+            正在进行的流式任务可以通过cancel_active_tasks统一停止，或通过drain_active_tasks等待结束。
 
         Yields:
-            Dict[str, Any]: 每个SSE事件块解析后的JSON数据
+            Dict[str, Any]: 每个SSE事件块解析后的JSON数据，lazy为True时为LazyEvent对象，
+                raw为True时为SSE事件帧的字节，typed为True时为StreamEvent对象
 
         Raises:
             DifyAPIError: 当API请求失败时
@@ -367,29 +1085,468 @@ PYDIFY:网络请求失败:
                     print(chunk["answer"], end="")
             ```
         """
+        # 类型化事件: 在延迟解码的事件流之上构造事件对象
+        if kwargs.pop("typed", False):
+            if kwargs.get("raw"):
+                raise ValueError("typed和raw不能同时使用")
+            lazy = kwargs.pop("lazy", False)
+            with contextlib.closing(
+                self.post_stream(endpoint, json_data, lazy=True, **kwargs)
+            ) as events:
+                for event in events:
+                    yield parse_event(event, self.codec.loads, lazy)
+            return
+
+        # 后台线程读取模式: 由BufferedStream在后台线程中迭代普通的流式生成器
+        buffer_size = kwargs.pop("buffer_size", 0)
+        backpressure = kwargs.pop("backpressure", BufferedStream.BLOCK)
+        if buffer_size:
+            # 句柄让调用方关闭缓冲区时可以立即断开后台线程正在读取的连接
+            handle = _StreamHandle()
+            yield from BufferedStream(
+                self.post_stream(endpoint, json_data, _handle=handle, **kwargs),
+                buffer_size,
+                backpressure,
+                handle,
+            )
+            return
+        # 未使用缓冲区时句柄不会被关闭，只为统一下面的判断
+        handle = kwargs.pop("_handle", None) or _StreamHandle()
+
         url = urljoin(self.base_url, endpoint)
         headers = kwargs.pop("headers", {})
         headers.update(self._get_headers())
 
-        # 设置重试机制
-        max_retries = kwargs.pop("max_retries", 2)
-        retry_delay = kwargs.pop("retry_delay", 1)
-        timeout = kwargs.get("timeout", 3600)  # 流式请求需要更长的超时时间
+        # 事件过滤与延迟解码
+        accept = build_event_filter(
+            kwargs.pop("events", None), kwargs.pop("exclude_events", None)
+        )
+        lazy = kwargs.pop("lazy", False)
+        raw = kwargs.pop("raw", False)
+
+        # 单次调用传入的max_retries/retry_delay会覆盖客户端的默认重试策略，仅作用于建立连接
+        policy = self.retry_policy.replace(
+            max_retries=kwargs.pop("max_retries", None),
+            base_delay=kwargs.pop("retry_delay", None),
+        )
+        # 分段超时: 连接和首个数据块的时限交给requests，读取期间的时限由看门狗控制
+        started = time.monotonic()
+        timeouts = self._pop_stream_timeouts(kwargs)
+
+        # 断线恢复与提前关闭时停止任务
+        state = self._new_stream_state(
+            json_data,
+            kwargs.pop("recover", True),
+            kwargs.pop("stop_on_close", True),
+        )
+        recover_timeout = kwargs.pop("recover_timeout", 600)
+        recover_interval = kwargs.pop("recover_interval", 2)
+        info = self._start_call("POST", endpoint, url, stream=True)
+        timing = self._stream_timing(kwargs.pop("timing", None), info, started)
+
+        self._track_stream(state)
+        try:
+            # 并发流名额在整个流被读完之前一直被占用，恢复阶段只做普通查询，不占用名额
+            error = None
+            with self._stream_slot():
+                try:
+                    yield from self._iter_stream(
+                        policy,
+                        url,
+                        endpoint,
+                        json_data,
+                        headers,
+                        accept,
+                        lazy,
+                        state,
+                        timeouts,
+                        started,
+                        raw,
+                        info,
+                        timing,
+                        handle,
+                        **kwargs,
+                    )
+                except (
+                    requests.RequestException,
+                    ConnectionError,
+                ) + _RECOVERABLE_TIMEOUTS as e:
+                    if state is None or not self._can_recover(state) or handle.closed:
+                        raise
+                    error = e
+
+            if (
+                state is None
+                or state.finished
+                or not self._can_recover(state)
+                or handle.closed
+            ):
+                return
+            events = self._recover_stream(
+                state, error, recover_timeout, recover_interval
+            )
+            state.finished = True
+            yield from self._filter_recovered(events, accept, lazy, raw)
+        except GeneratorExit:
+            # yield from已经关闭了内层生成器和连接，这里只需要停止服务端任务
+            if state is not None and state.stop_on_close:
+                self._stop_stream_task(state)
+            raise
+        except Exception as e:
+            if handle.closed:
+                # 连接是调用方关闭缓冲区时主动断开的，按提前关闭处理
+                if state is not None and state.stop_on_close:
+                    self._stop_stream_task(state)
+                return
+            raise self._call_error(info, e)
+        finally:
+            self._untrack_stream(state)
+            if timing is not None:
+                timing._finish()
+            self._stream_end(info)
+
+    def _pop_stream_timeouts(self, kwargs: Dict[str, Any]) -> StreamTimeouts:
+        """从请求参数中取出单次调用的超时设置，与客户端的stream_timeouts合并"""
+        total = kwargs.pop("total_timeout", None)
+        timeout = kwargs.pop("timeout", None)
+        return self.stream_timeouts.replace(
+            connect=kwargs.pop("connect_timeout", None),
+            first_byte=kwargs.pop("first_byte_timeout", None),
+            idle=kwargs.pop("idle_timeout", None),
+            total=total if total is not None else timeout,
+        )
+
+    # 流式响应中表示任务结束的事件
+    _terminal_events = frozenset(["workflow_finished", "message_end", "error"])
+    # 断线恢复所需的任务标识，为空表示不支持断线恢复
+    _recovery_ids = ()
+
+    def _new_stream_state(
+        self,
+        json_data: Dict[str, Any],
+        recover: bool = True,
+        stop_on_close: bool = True,
+    ) -> Optional["_StreamState"]:
+        """创建记录流式任务标识的状态对象，既不需要恢复也不需要停止任务时返回None"""
+        recover = recover and bool(self._recovery_ids)
+        if not recover and not stop_on_close:
+            return None
+        return _StreamState(
+            json_data.get("user"),
+            json_data.get("conversation_id"),
+            self._recovery_ids if recover else (),
+            self._terminal_events,
+            recover=recover,
+            stop_on_close=stop_on_close,
+        )
+
+    def _can_recover(self, state: "_StreamState") -> bool:
+        """是否已经取得断线恢复所需的全部任务标识"""
+        return state.recover and all(
+            getattr(state, name) for name in self._recovery_ids
+        )
+
+    def _track_stream(self, state: Optional["_StreamState"]):
+        """把流式调用登记为正在进行"""
+        if state is None:
+            return
+        with self._streams_cond:
+            self._streams.add(state)
+
+    def _untrack_stream(self, state: Optional["_StreamState"]):
+        """流式调用结束后取消登记，并唤醒等待中的drain_active_tasks"""
+        if state is None:
+            return
+        with self._streams_cond:
+            self._streams.discard(state)
+            self._streams_cond.notify_all()
+
+    def _running_streams(self) -> List["_StreamState"]:
+        """已经取得task_id且尚未结束的流式调用"""
+        with self._streams_cond:
+            return [s for s in self._streams if s.task_id and not s.finished]
+
+    @property
+    def active_tasks(self) -> Dict[str, Optional[str]]:
+        """
+        正在进行的流式任务。
+
+        Returns:
+            Dict[str, Optional[str]]: task_id到发起任务的user的映射
+        """
+        return {state.task_id: state.user for state in self._running_streams()}
+
+    def _stop_stream_task(self, state: "_StreamState") -> Any:
+        """
+        调用stop_task停止流式调用对应的服务端任务，每个任务只停止一次。
+
+        停止失败只记录日志，不会从生成器的close()中抛出异常。
+        """
+        if state.stopped or state.finished or not state.task_id:
+            return None
+        state.stopped = True
+        logger.info("停止流式任务: %s", state)
+        try:
+            return self.stop_task(state.task_id, state.user)
+        except Exception as e:
+            logger.warning("停止任务%s失败: %s", state.task_id, e)
+            return None
+
+    def cancel_active_tasks(self) -> Dict[str, Any]:
+        """
+        停止所有正在进行的流式任务，通常在服务关闭前调用。
+
+        服务端停止任务后会发送结束事件，正在读取这些流的调用方会正常收到结束事件。
+
+        Returns:
+            Dict[str, Any]: task_id到stop_task返回结果的映射，停止失败的任务对应None
+        """
+        return {
+            state.task_id: self._stop_stream_task(state)
+            for state in self._running_streams()
+        }
+
+    def drain_active_tasks(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有正在进行的流式调用结束。
+
+        Args:
+            timeout (float, optional): 最长等待时间(秒)。默认为None，即一直等待
+
+        Returns:
+            bool: 所有流式调用都已结束时返回True，超时返回False
+        """
+        with self._streams_cond:
+            return self._streams_cond.wait_for(lambda: not self._streams, timeout)
+
+    def _recovery_request(self, state: "_StreamState") -> Any:
+        """
+        查询任务的当前状态，由支持断线恢复的子类实现。
+
+        异步客户端中返回协程，因此这里只负责发出查询，结果交给_recovery_events处理。
+        """
+        raise NotImplementedError
+
+    def _recovery_events(
+        self, state: "_StreamState", result: Dict[str, Any]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        根据查询结果生成合成事件，由支持断线恢复的子类实现。
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 任务已结束时返回需要补发的事件，仍在运行时返回None
+        """
+        raise NotImplementedError
+
+    def _recover_stream(
+        self,
+        state: "_StreamState",
+        error: Optional[BaseException],
+        timeout: float,
+        interval: float,
+    ) -> List[Dict[str, Any]]:
+        """
+        轮询查询接口直到任务结束，返回需要补发的合成事件。
+
+        Args:
+            state (_StreamState): 中断前记录的任务标识
+            error (BaseException, optional): 导致中断的网络错误，服务端提前关闭连接时为None
+            timeout (float): 最长轮询时间(秒)
+            interval (float): 轮询间隔(秒)
 
-        # 添加超时参数
-        kwargs["timeout"] = timeout
+        Returns:
+            List[Dict[str, Any]]: 合成的事件列表
+
+        Raises:
+            DifyAPIError: 当查询接口返回客户端错误或轮询超时时
+        """
+        logger.warning("流式连接中断(%s)，开始查询任务结果: %s", error, state)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                events = self._recovery_events(state, self._recovery_request(state))
+            except DifyAPIError as e:
+                if not _is_transient_error(e):
+                    raise
+                events = None
+            if events is not None:
+                return events
+            if time.monotonic() + interval > deadline:
+                raise DifyAPIError(
+                    _format_recovery_timeout_error(state, error, timeout)
+                ) from error
+            time.sleep(interval)
 
-        with requests.post(
-            url, json=json_data, headers=headers, stream=True, **kwargs
+    def _filter_recovered(
+        self,
+        events: List[Dict[str, Any]],
+        accept: Optional[Callable[[str], bool]],
+        lazy: bool,
+        raw: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """对合成事件应用与正常事件相同的过滤、延迟解码和原始帧设置"""
+        result = []
+        for chunk in events:
+            if accept is not None and not accept(chunk["event"]):
+                continue
+            if raw:
+                chunk = b"data: " + self.codec.dumps(chunk) + b"\n\n"
+            elif lazy:
+                chunk = LazyEvent(
+                    self.codec.dumps(chunk), self.codec.loads, chunk["event"]
+                )
+            result.append(chunk)
+        return result
+
+    def _open_stream(
+        self,
+        policy: RetryPolicy,
+        url: str,
+        endpoint: str,
+        json_data: Dict[str, Any],
+        headers: Dict[str, str],
+        timeouts: StreamTimeouts = None,
+        started: float = None,
+        info: Optional[RequestInfo] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        建立流式连接，按重试策略重试网络错误和可重试的状态码。
+
+        只有在收到成功的响应头之前才会重试，参见post_stream中的重试规则。
+        重试次数耗尽后，可重试状态码的响应会原样返回，由调用方报错。
+        设置了total时限时，重试和退避等待同样计入总时长，剩余时间不足时不再重试。
+
+        Returns:
+            requests.Response: 尚未读取响应体的流式响应
+
+        Raises:
+            DifyTimeoutError: 当建立连接或等待响应头超时，且重试后仍然超时时
+            DifyAPIError: 当其他网络错误在重试后仍然存在时
+        """
+        timeouts = timeouts or self.stream_timeouts
+        # 等待响应头也计入首个数据块的时限，但不超过总时长
+        first_byte = timeouts.first_byte
+        if timeouts.total and (first_byte is None or timeouts.total < first_byte):
+            first_byte = timeouts.total
+        deadline = None
+        if timeouts.total:
+            deadline = (started or time.monotonic()) + timeouts.total
+        body = self.codec.dumps(json_data)
+        try:
+            return policy.execute(
+                lambda: self._send(
+                    lambda: self.session.post(
+                        url,
+                        data=body,
+                        headers=headers,
+                        stream=True,
+                        timeout=_attempt_timeout(
+                            (timeouts.connect, first_byte), deadline
+                        ),
+                        **kwargs,
+                    ),
+                    "POST",
+                    url,
+                    endpoint,
+                    stream=True,
+                ),
+                description=f"POST {endpoint} (流式)",
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
+            )
+        except requests.ConnectTimeout as e:
+            raise self._stream_timeout_error(
+                StreamTimeouts.CONNECT, timeouts, url, endpoint
+            ) from e
+        except requests.ReadTimeout as e:
+            raise self._stream_timeout_error(
+                StreamTimeouts.FIRST_BYTE, timeouts, url, endpoint
+            ) from e
+        except (requests.RequestException, ConnectionError) as e:
+            raise DifyAPIError(
+                _format_network_error(
+                    "POST", url, endpoint, e, self.base_url, timeouts.total
+                )
+            )
+
+    def _stream_timeout_error(
+        self, kind: str, timeouts: StreamTimeouts, url: str, endpoint: str
+    ) -> "DifyTimeoutError":
+        """根据超时类型构造对应的DifyTimeoutError子类实例"""
+        timeout = getattr(timeouts, kind)
+        return _TIMEOUT_ERRORS[kind](
+            _format_stream_timeout_error("POST", url, endpoint, kind, timeout),
+            kind,
+            timeout,
+        )
+
+    def _iter_stream(
+        self,
+        policy: RetryPolicy,
+        url: str,
+        endpoint: str,
+        json_data: Dict[str, Any],
+        headers: Dict[str, str],
+        accept: Optional[Callable[[str], bool]],
+        lazy: bool,
+        state: Optional["_StreamState"] = None,
+        timeouts: StreamTimeouts = None,
+        started: float = None,
+        raw: bool = False,
+        info: Optional[RequestInfo] = None,
+        timing: Optional[StreamTiming] = None,
+        handle: Optional[_StreamHandle] = None,
+        **kwargs,
+    ) -> Generator[Dict[str, Any], None, None]:
+        """建立流式连接并逐个产出解码后的事件，参数含义见post_stream"""
+        timeouts = timeouts or self.stream_timeouts
+        if started is None:
+            started = time.monotonic()
+        with self._open_stream(
+            policy,
+            url,
+            endpoint,
+            json_data,
+            headers,
+            timeouts,
+            started,
+            info,
+            **kwargs,
         ) as response:
+            if handle is not None:
+                handle.attach(response)
+            if timing is not None:
+                timing._headers()
+            self._call_response(info, response)
             try:
                 response.raise_for_status()
             except Exception as e:
+                error_json = {}
                 try:
                     error_data = response.content.decode("utf-8").strip("\n")
+                except (UnicodeDecodeError, requests.RequestException) as decode_error:
+                    # 构建格式化的错误消息（无法获取响应内容）
+                    error_msg = f"""
+PYDIFY:流式请求失败: 
+└─ 请求信息:
+   ├─ 方法: POST
+   ├─ URL: {url}
+   └─ 端点: {endpoint}
+└─ 响应信息:
+   ├─ 状态码: {response.status_code} ({response.reason})
+└─ 原始错误:
+   ├─ 类型: {type(e).__name__}
+   └─ 详情: {str(e)}
+└─ 解析错误:
+   └─ {str(decode_error)}
+"""
+                else:
                     try:
                         error_json = json.loads(error_data)
-
+                    except json.JSONDecodeError:
+                        pass
+                    if isinstance(error_json, dict) and error_json:
                         # 构建格式化的错误消息
                         error_msg = f"""
 PYDIFY:流式请求失败: 
@@ -404,9 +1561,9 @@ PYDIFY:流式请求失败:
    ├─ 错误类型: {error_json.get('code', '未知')}
    └─ 错误详情: {error_json.get('message', '未知')}
 """
-                        raise DifyAPIError(error_msg)
-                    except json.JSONDecodeError:
+                    else:
                         # 无法解析JSON时直接使用原始错误内容
+                        error_json = {}
                         error_msg = f"""
 PYDIFY:流式请求失败: 
 └─ 请求信息:
@@ -419,46 +1576,56 @@ PYDIFY:流式请求失败:
 └─ 原始错误:
    └─ {str(e)}
 """
-                        raise DifyAPIError(error_msg)
-                except Exception as decode_error:
-                    # 构建格式化的错误消息（无法获取响应内容）
-                    error_msg = f"""
-PYDIFY:流式请求失败: 
-└─ 请求信息:
-   ├─ 方法: POST
-   ├─ URL: {url}
-   └─ 端点: {endpoint}
-└─ 响应信息:
-   ├─ 状态码: {response.status_code} ({response.reason})
-└─ 原始错误:
-   ├─ 类型: {type(e).__name__}
-   └─ 详情: {str(e)}
-└─ 解析错误:
-   └─ {str(decode_error)}
-"""
-                    raise DifyAPIError(error_msg)
-
-            try:
-                client = sseclient.SSEClient(response)
-            except Exception as e:
-                # 构建格式化的SSE初始化错误消息
-                error_msg = f"""
-PYDIFY:SSE客户端初始化失败: 
-└─ 请求信息:
-   ├─ 方法: POST
-   ├─ URL: {url}
-   └─ 端点: {endpoint}
-└─ 错误信息:
-   ├─ 类型: {type(e).__name__}
-   └─ 详情: {str(e)}
-"""
-                raise DifyAPIError(error_msg)
+                raise DifyAPIError(
+                    error_msg,
+                    status_code=response.status_code,
+                    error_data=error_json,
+                    retry_after=_response_retry_after(response),
+                )
 
-            # 处理SSE流式响应
-            for event in client.events():
+            # 处理SSE流式响应，按到达的字节块增量解码
+            loads = self.codec.loads
+            chunks = response.iter_content(chunk_size=None)
+            if timing is not None:
+                chunks = timing._watch(chunks)
+            if timeouts.watched:
+                chunks = StreamGuard(
+                    response,
+                    timeouts,
+                    started,
+                    lambda kind: self._stream_timeout_error(
+                        kind, timeouts, url, endpoint
+                    ),
+                ).guarded_chunks(chunks)
+            for event in iter_sse_events(chunks):
+                event_type = None
+                if (
+                    accept is not None
+                    or lazy
+                    or raw
+                    or state is not None
+                    or timing is not None
+                ):
+                    # 只读取事件类型，被过滤的事件不做完整解码
+                    event_type = peek_event_type(event.data)
+                    if timing is not None:
+                        timing._event(event_type)
+                    if info is not None:
+                        self._stream_event(info, event_type, len(event.data))
+                    if state is not None:
+                        state.observe(event.data, event_type)
+                    if event_type is not None and accept is not None:
+                        if not accept(event_type):
+                            continue
+                    if raw:
+                        yield event.to_bytes()
+                        continue
+                    if lazy:
+                        yield LazyEvent(event.data, loads, event_type)
+                        continue
                 try:
-                    yield json.loads(event.data)
-                except json.JSONDecodeError as e:
+                    chunk = loads(event.data)
+                except ValueError as e:
                     # 构建格式化的JSON解析错误消息
                     error_msg = f"""
 PYDIFY:处理SSE流式响应时JSON解析错误: 
@@ -470,9 +1637,74 @@ PYDIFY:处理SSE流式响应时JSON解析错误:
    ├─ 类型: {type(e).__name__}
    └─ 详情: {str(e)}
 └─ 原始数据:
-   └─ {event.data[:500]}
+   └─ {event.data[:500].decode("utf-8", "replace")}
 """
-                    raise DifyAPIError(error_msg)
+                    raise DifyStreamDecodeError(error_msg)
+
+                # 无法预读事件类型时，在解码后再进行过滤
+                if event_type is None and accept is not None:
+                    if not accept(chunk.get("event")):
+                        continue
+                yield chunk
+
+    def _run_batch(
+        self,
+        send: Callable[[Any], Any],
+        items: Iterable[Any],
+        streaming: bool,
+        concurrency: int,
+        ordered: bool,
+        item_retries: int,
+        on_progress: Optional[Callable] = None,
+        max_pending: Optional[int] = None,
+    ):
+        """
+        以有限的并发数对每条输入调用send，供run_batch等批量方法使用。
+
+        Args:
+            send (Callable[[Any], Any]): 对一条输入发起调用的函数，返回响应字典或流式生成器
+            items (Iterable[Any]): 输入，按需读取
+            streaming (bool): send是否返回流式生成器，为True时读完整个流并汇总为StreamResult
+            concurrency (int): 同时执行的调用数
+            ordered (bool): 是否按输入顺序产出结果
+            item_retries (int): 单条调用因网络错误、429或5xx失败时整条重新执行的次数，
+                退避等待沿用客户端的重试策略
+            on_progress (Callable[[BatchResult, BatchStats], None], optional): 每条输入完成时调用
+            max_pending (int, optional): 已读取但尚未产出的输入数上限。默认为concurrency的4倍
+
+        Returns:
+            Iterator[BatchResult]: 每条输入的结果
+
+        Raises:
+            ValueError: 当concurrency小于1时
+        """
+        from .batch import iter_batch
+        from .result import StreamResult
+
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        adapter = self.session.get_adapter(self.base_url)
+        pool_maxsize = getattr(adapter, "_pool_maxsize", None)
+        if isinstance(pool_maxsize, int) and concurrency > pool_maxsize:
+            logger.warning(
+                "批量调用的并发数(%d)大于连接池大小(%d)，超出的连接用完即丢弃，建议调大pool_maxsize",
+                concurrency,
+                pool_maxsize,
+            )
+
+        def call(item: Any) -> Any:
+            output = send(item)
+            return StreamResult.collect(output) if streaming else output
+
+        return iter_batch(
+            call,
+            items,
+            concurrency=concurrency,
+            ordered=ordered,
+            retry_policy=self.retry_policy.replace(max_retries=item_retries),
+            on_progress=on_progress,
+            max_pending=max_pending,
+        )
 
     def stop_task(self, task_id: str, user: str) -> Dict[str, Any]:
         """
@@ -568,10 +1800,11 @@ PYDIFY:处理SSE流式响应时JSON解析错误:
         import mimetypes
 
         mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        url = urljoin(self.base_url, "files/upload")
+        info = self._start_call("POST", "files/upload", url)
 
-        # 直接使用requests库进行请求，而不是通过_request方法
+        # 直接使用会话发送multipart请求，而不是通过_request方法
         try:
-            url = urljoin(self.base_url, "files/upload")
 
             # 准备请求头（不包含Content-Type，让requests自动处理)
             headers = {
@@ -584,15 +1817,33 @@ PYDIFY:处理SSE流式响应时JSON解析错误:
 
             # 设置超时参数
             timeout = kwargs.pop("timeout", 30)
+            deadline = _call_deadline(kwargs.pop("deadline", None))
 
-            # 直接发送请求
-            response = requests.post(
-                url,
-                headers=headers,
-                files=files,
-                data=data,
-                timeout=timeout,
+            # 重试前把文件指针移回原位，文件无法重新定位时不重试
+            policy = self.retry_policy.replace(
+                max_retries=kwargs.pop("max_retries", None),
+                base_delay=kwargs.pop("retry_delay", None),
+            )
+
+            response = policy.execute(
+                lambda: self._send(
+                    lambda: self.session.post(
+                        url,
+                        headers=headers,
+                        files=files,
+                        data=data,
+                        timeout=_attempt_timeout(timeout, deadline),
+                    ),
+                    "POST",
+                    url,
+                    "files/upload",
+                ),
+                description="文件上传",
+                rewind=_make_rewind(files),
+                deadline=deadline,
+                on_retry=self._retry_hook(info),
             )
+            self._call_response(info, response)
 
             # 检查响应状态
             if not response.ok:
@@ -628,10 +1879,13 @@ PYDIFY:文件上传失败:
 """
 
                 raise DifyAPIError(
-                    error_msg, status_code=response.status_code, error_data=error_data
+                    error_msg,
+                    status_code=response.status_code,
+                    error_data=error_data,
+                    retry_after=_response_retry_after(response),
                 )
 
-            return response.json()
+            return self.codec.loads(response.content)
 
         except requests.RequestException as e:
             # 构建格式化的网络错误消息
@@ -647,10 +1901,10 @@ PYDIFY:文件上传网络错误:
    ├─ 类型: {type(e).__name__}
    └─ 详情: {str(e)}
 """
-            raise DifyAPIError(error_msg)
+            raise self._call_error(info, DifyAPIError(error_msg))
         except Exception as e:
             if isinstance(e, DifyAPIError):
-                raise
+                raise self._call_error(info, e)
 
             # 构建格式化的通用错误消息
             error_msg = f"""
@@ -663,7 +1917,7 @@ PYDIFY:文件上传失败:
    ├─ 类型: {type(e).__name__}
    └─ 详情: {str(e)}
 """
-            raise DifyAPIError(error_msg)
+            raise self._call_error(info, DifyAPIError(error_msg))
 
     def text_to_audio(
         self,
@@ -908,6 +2162,18 @@ PYDIFY:文件上传失败:
         if raw:
             return params
 
+        return self._normalize_parameters(params)
+
+    def _normalize_parameters(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将get_parameters返回的原始参数整理为便于使用的格式。
+
+        Args:
+            params (Dict[str, Any]): 原始的应用参数
+
+        Returns:
+            Dict[str, Any]: 整理后的应用参数，user_input_form被展开为控件列表
+        """
         # 对user_input_form进行处理，使其变成一个列表
         user_input_form = []
         for item in params["user_input_form"]:
@@ -1085,12 +2351,23 @@ PYDIFY:文件上传失败:
 
 
 class DifyAPIError(Exception):
-    """Dify API错误异常"""
+    """Dify API错误异常
 
-    def __init__(self, message: str, status_code: int = None, error_data: Dict = None):
+    Attributes:
+        retry_after (float): 服务端通过Retry-After响应头要求的等待时间(秒)，没有时为None
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: int = None,
+        error_data: Dict = None,
+        retry_after: Optional[float] = None,
+    ):
         self.message = message
         self.status_code = status_code
         self.error_data = error_data or {}
+        self.retry_after = retry_after
         super().__init__(self.message)
 
     def __str__(self) -> str:
@@ -1108,6 +2385,65 @@ class DifyAPIError(Exception):
         return self.message
 
 
+class DifyCircuitOpenError(DifyAPIError):
+    """熔断器打开时抛出的异常，请求没有被发送到服务端
+
+    Attributes:
+        retry_after (float): 距离熔断器放行探测请求还需等待的秒数
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message, retry_after=retry_after)
+
+
+class DifyStreamDecodeError(DifyAPIError):
+    """流式响应中的事件数据无法解析
+
+    服务端返回的内容本身有误，重新执行通常得到同样的结果，因此不会被当作可恢复的网络错误重试。
+    """
+
+
+class DifyTimeoutError(DifyAPIError):
+    """流式请求超时时抛出的异常
+
+    Attributes:
+        kind (str): 超时类型，取值见StreamTimeouts的CONNECT、FIRST_BYTE、IDLE和TOTAL
+        timeout (float): 触发的时限(秒)
+    """
+
+    def __init__(self, message: str, kind: str, timeout: Optional[float] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.timeout = timeout
+
+
+class DifyConnectTimeoutError(DifyTimeoutError):
+    """建立连接超时，请求很可能没有到达服务端"""
+
+
+class DifyFirstByteTimeoutError(DifyTimeoutError):
+    """发出请求后迟迟没有收到响应数据"""
+
+
+class DifyIdleTimeoutError(DifyTimeoutError):
+    """已经开始接收事件，但相邻两块数据之间的间隔超过了时限"""
+
+
+class DifyTotalTimeoutError(DifyTimeoutError):
+    """流式调用的总时长超过了时限"""
+
+
+_TIMEOUT_ERRORS = {
+    StreamTimeouts.CONNECT: DifyConnectTimeoutError,
+    StreamTimeouts.FIRST_BYTE: DifyFirstByteTimeoutError,
+    StreamTimeouts.IDLE: DifyIdleTimeoutError,
+    StreamTimeouts.TOTAL: DifyTotalTimeoutError,
+}
+
+# 开始接收事件后的超时与断线一样处理，已知任务标识时通过查询接口恢复结果
+_RECOVERABLE_TIMEOUTS = (DifyIdleTimeoutError, DifyTotalTimeoutError)
+
+
 def analyze_app_capabilities(client):
     """分析应用的功能和配置"""
     # 获取应用参数
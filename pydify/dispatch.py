@@ -0,0 +1,372 @@
+"""
+Pydify - 事件分发
+
+此模块提供EventDispatcher，把按事件类型组织的处理函数映射编译为分发表，
+读取流式响应并把每个事件交给对应的处理函数。
+
+默认在读取线程中直接调用处理函数；开启background后，处理函数在线程池（异步客户端为
+事件循环中的任务）中执行，读取方可以继续从连接中读取数据，不会因为处理较慢而让服务端的
+发送阻塞。同一类型的事件总是按到达顺序依次处理，不同类型的事件可以并行处理。
+
+示例:
+    ```python
+    dispatcher = EventDispatcher(
+        {
+            "message": lambda e: print(e["answer"], end=""),
+            "node_finished": save_node_result,  # 较慢的处理函数
+            "message_end": lambda e: print(),
+        },
+        background=["node_finished"],
+    )
+    dispatcher.run(client.send_message("你好", user="user_123"))
+    ```
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import threading
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .stream import _event_type
+
+# 与examples中get_standard_handlers兼容的处理函数键名前缀
+_HANDLER_PREFIX = "handle_"
+
+
+class _Lane:
+    """同一事件类型的待处理队列，同一时间最多只有一个线程或任务在处理"""
+
+    __slots__ = ("queue", "running")
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.running = False
+
+
+class _ThreadLanes:
+    """一次同步分发的后台处理状态"""
+
+    def __init__(self, executor: concurrent.futures.Executor, max_pending: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.lanes: Dict[str, _Lane] = {}
+        self.pending = 0
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+    def submit(self, event_type: str, handler: Callable, event: Any):
+        with self.cond:
+            while (
+                self.max_pending
+                and self.pending >= self.max_pending
+                and self.error is None
+            ):
+                self.cond.wait()
+            lane = self.lanes.get(event_type)
+            if lane is None:
+                lane = self.lanes[event_type] = _Lane()
+            lane.queue.append((handler, event))
+            self.pending += 1
+            if lane.running:
+                return
+            lane.running = True
+        self.executor.submit(self._drain, lane)
+
+    def _drain(self, lane: _Lane):
+        while True:
+            with self.cond:
+                if not lane.queue:
+                    lane.running = False
+                    return
+                handler, event = lane.queue.popleft()
+            try:
+                handler(event)
+            except BaseException as e:
+                with self.cond:
+                    if self.error is None:
+                        self.error = e
+            finally:
+                with self.cond:
+                    self.pending -= 1
+                    self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+
+class _TaskLanes:
+    """一次异步分发的后台处理状态"""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.lanes: Dict[str, _Lane] = {}
+        self.tasks = set()
+        self.pending = 0
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def submit(
+        self, event_type: str, handler: Callable, is_async: bool, event: Any
+    ):
+        while (
+            self.max_pending and self.pending >= self.max_pending and self.error is None
+        ):
+            await self.changed.wait()
+        lane = self.lanes.get(event_type)
+        if lane is None:
+            lane = self.lanes[event_type] = _Lane()
+        lane.queue.append((handler, is_async, event))
+        self.pending += 1
+        if lane.running:
+            return
+        lane.running = True
+        task = asyncio.ensure_future(self._drain(lane))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _drain(self, lane: _Lane):
+        loop = asyncio.get_running_loop()
+        while lane.queue:
+            handler, is_async, event = lane.queue.popleft()
+            try:
+                if is_async:
+                    await handler(event)
+                else:
+                    await loop.run_in_executor(None, handler, event)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+            finally:
+                self.pending -= 1
+                self._notify()
+        lane.running = False
+
+    async def wait(self):
+        while self.pending:
+            await self.changed.wait()
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+class EventDispatcher:
+    """按事件类型分发流式事件的处理器
+
+    处理函数映射的键为事件类型（如"message"、"node_finished"），也可以使用examples中
+    get_standard_handlers的"handle_message"形式。处理函数接收事件作为唯一参数，
+    事件可以是字典、LazyEvent或typed=True产出的StreamEvent。
+
+    同一个分发器可以重复使用，也可以在多个线程中同时使用，每次run/arun的后台处理状态相互独立。
+    """
+
+    def __init__(
+        self,
+        handlers: Mapping[str, Callable[[Any], Any]],
+        default: Optional[Callable[[Any], Any]] = None,
+        background: Union[bool, Iterable[str]] = False,
+        max_workers: int = 4,
+        max_pending: int = 1024,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ):
+        """
+        Args:
+            handlers (Mapping[str, Callable]): 事件类型到处理函数的映射，值为None的项会被忽略
+            default (Callable, optional): 没有对应处理函数的事件交给它处理。默认为None，即忽略这些事件
+            background (Union[bool, Iterable[str]], optional): 为True时所有处理函数都在后台执行，
+                也可以传入需要在后台执行的事件类型列表。默认为False，即在读取线程中直接执行
+            max_workers (int, optional): 同步分发时后台线程池的线程数，传入executor时忽略。默认为4
+            max_pending (int, optional): 后台等待处理的事件数上限，达到上限时读取方等待处理完成，
+                0表示不限制。默认为1024
+            executor (concurrent.futures.Executor, optional): 同步分发时使用的线程池，由调用方负责关闭。
+                默认为None，即在第一次需要时创建
+        """
+        self._table: Dict[str, Tuple[Callable, bool, bool]] = {}
+        if background is True or background is False:
+            background_types = None
+        else:
+            background_types = frozenset(background)
+        for event_type, handler in handlers.items():
+            if handler is None:
+                continue
+            if event_type.startswith(_HANDLER_PREFIX):
+                event_type = event_type[len(_HANDLER_PREFIX) :]
+            in_background = (
+                background is True
+                if background_types is None
+                else event_type in background_types
+            )
+            self._table[event_type] = (
+                handler,
+                asyncio.iscoroutinefunction(handler),
+                in_background,
+            )
+        self._default = None
+        if default is not None:
+            self._default = (
+                default,
+                asyncio.iscoroutinefunction(default),
+                background is True,
+            )
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+
+    @property
+    def event_types(self) -> frozenset:
+        """有对应处理函数的事件类型"""
+        return frozenset(self._table)
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="pydify-dispatch"
+                )
+            return self._executor
+
+    def run(self, events: Iterable[Any]) -> int:
+        """
+        读取同步流式方法产出的事件并分发，直到流结束且所有后台处理完成。
+
+        Args:
+            events (Iterable[Any]): 流式方法返回的事件生成器
+
+        Returns:
+            int: 已分发的事件数
+
+        Raises:
+            Exception: 处理函数抛出的第一个异常。后台处理函数出错时停止读取并关闭流，
+                等待已提交的处理完成后再抛出
+        """
+        table = self._table
+        default = self._default
+        lanes = None
+        count = 0
+        try:
+            for event in events:
+                event_type = _event_type(event)
+                entry = table.get(event_type, default)
+                if entry is None:
+                    continue
+                count += 1
+                handler, is_async, in_background = entry
+                if is_async:
+                    raise TypeError(f"同步分发不支持协程处理函数: {event_type}")
+                if not in_background:
+                    handler(event)
+                    continue
+                if lanes is None:
+                    lanes = _ThreadLanes(self._get_executor(), self.max_pending)
+                lanes.submit(event_type, handler, event)
+                if lanes.error is not None:
+                    break
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+            if lanes is not None:
+                lanes.wait()
+        if lanes is not None and lanes.error is not None:
+            raise lanes.error
+        return count
+
+    async def arun(self, events: AsyncIterable[Any]) -> int:
+        """
+        run的异步版本，用于异步客户端的流式方法。
+
+        处理函数可以是普通函数或协程函数。后台执行时协程处理函数在事件循环的任务中运行，
+        普通处理函数在事件循环的默认线程池中运行。
+
+        Args:
+            events (AsyncIterable[Any]): 异步流式方法返回的事件生成器
+
+        Returns:
+            int: 已分发的事件数
+
+        Raises:
+            Exception: 处理函数抛出的第一个异常
+        """
+        table = self._table
+        default = self._default
+        lanes = None
+        count = 0
+        try:
+            async for event in events:
+                event_type = _event_type(event)
+                entry = table.get(event_type, default)
+                if entry is None:
+                    continue
+                count += 1
+                handler, is_async, in_background = entry
+                if not in_background:
+                    if is_async:
+                        await handler(event)
+                    else:
+                        handler(event)
+                    continue
+                if lanes is None:
+                    lanes = _TaskLanes(self.max_pending)
+                await lanes.submit(event_type, handler, is_async, event)
+                if lanes.error is not None:
+                    break
+            if lanes is not None:
+                await lanes.wait()
+        except BaseException:
+            if lanes is not None:
+                lanes.cancel()
+            raise
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        if lanes is not None and lanes.error is not None:
+            raise lanes.error
+        return count
+
+    def close(self):
+        """关闭分发器自己创建的线程池"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def dispatch_stream(
+    events: Iterable[Any], handlers: Mapping[str, Callable[[Any], Any]], **kwargs
+) -> int:
+    """
+    使用一次性的EventDispatcher分发同步流式事件。
+
+    Args:
+        events (Iterable[Any]): 流式方法返回的事件生成器
+        handlers (Mapping[str, Callable]): 事件类型到处理函数的映射
+        **kwargs: 传递给EventDispatcher的其他参数
+
+    Returns:
+        int: 已分发的事件数
+    """
+    dispatcher = EventDispatcher(handlers, **kwargs)
+    try:
+        return dispatcher.run(events)
+    finally:
+        if kwargs.get("executor") is None:
+            dispatcher.close()
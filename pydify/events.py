@@ -0,0 +1,527 @@
+"""
+Pydify - 类型化事件
+
+此模块为流式响应中的每种事件提供基于__slots__的事件类，例如NodeFinished、TextChunk、MessageEnd，
+以属性而不是嵌套字典的方式访问字段。每个事件只保存Dify文档中列出的字段，不保留整棵字典，
+长期保存大量事件时占用的内存明显更少，属性访问也比多层字典查找更快。
+
+使用lazy=True时，构造事件只用到已经取得的事件类型和原始JSON字节，不解码JSON：
+第一次访问普通字段时才解码，并且不保留inputs、outputs、process_data等体积较大的字段，
+这些字段在被访问时再从原始JSON字节中解码；先访问体积较大的字段时只解码一次。
+
+示例:
+    ```python
+    for event in client.run(inputs, user, typed=True, lazy=True):
+        if isinstance(event, NodeFinished):
+            print(event.title, event.elapsed_time, event.total_tokens)
+        elif isinstance(event, WorkflowFinished):
+            print(event.outputs)  # 此时才会解码outputs
+    ```
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+from .sse import LazyEvent
+
+
+class _HeavyField:
+    """延迟解码字段的描述符，值在第一次访问时才从原始JSON中取出"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._heavy_fields()[self.name]
+
+
+class StreamEvent:
+    """流式事件的基类
+
+    子类通过以下类属性声明字段:
+    - _fields: 事件顶层的字段
+    - _data_fields: 事件data对象中的字段
+    - _heavy: data对象中体积较大、可以延迟解码的字段，以_HeavyField描述符的形式访问
+
+    缺失的字段值为None。由from_raw构造的事件在第一次访问字段时才解码。
+
+    Attributes:
+        event (str): 事件类型
+        task_id (str): 任务ID
+        recovered (bool): 是否为断线恢复时补发的合成事件
+    """
+
+    __slots__ = ("task_id", "recovered", "_raw", "_loads", "_heavy_values", "_deferred")
+
+    event: str = None
+    _fields = ("task_id",)
+    _data_fields = ()
+    _heavy = ()
+
+    @classmethod
+    def from_dict(
+        cls,
+        chunk: Dict[str, Any],
+        raw: Optional[bytes] = None,
+        loads: Optional[Callable[[bytes], Any]] = None,
+    ) -> "StreamEvent":
+        """
+        从解码后的事件字典构造事件对象。
+
+        Args:
+            chunk (Dict[str, Any]): 解码后的事件数据
+            raw (bytes, optional): 原始JSON字节。与loads一起提供时，体积较大的字段不会被保留，
+                在第一次访问时重新解码
+            loads (Callable[[bytes], Any], optional): 用于重新解码raw的函数
+
+        Returns:
+            StreamEvent: 事件对象
+        """
+        self = cls.__new__(cls)
+        self._fill(chunk, raw, loads)
+        return self
+
+    @classmethod
+    def from_raw(cls, raw: bytes, loads: Callable[[bytes], Any]) -> "StreamEvent":
+        """
+        从原始JSON字节构造事件对象，构造时不解码，第一次访问字段时才解码。
+
+        Args:
+            raw (bytes): 原始JSON字节，事件类型必须与cls一致
+            loads (Callable[[bytes], Any]): 用于解码raw的函数
+
+        Returns:
+            StreamEvent: 事件对象
+        """
+        self = cls.__new__(cls)
+        self._raw = raw
+        self._loads = loads
+        self._heavy_values = None
+        self._deferred = True
+        return self
+
+    def _fill(
+        self,
+        chunk: Dict[str, Any],
+        raw: Optional[bytes] = None,
+        loads: Optional[Callable[[bytes], Any]] = None,
+    ):
+        cls = type(self)
+        for name in cls._fields:
+            setattr(self, name, chunk.get(name))
+        self.recovered = chunk.get("recovered", False)
+        data = chunk.get("data") if cls._data_fields or cls._heavy else None
+        if not isinstance(data, dict):
+            data = {}
+        for name in cls._data_fields:
+            setattr(self, name, data.get(name))
+        self._deferred = False
+        if cls._heavy and raw is not None and loads is not None:
+            self._raw = raw
+            self._loads = loads
+            self._heavy_values = None
+        else:
+            self._raw = None
+            self._loads = None
+            self._heavy_values = {name: data.get(name) for name in cls._heavy}
+
+    def __getattr__(self, name):
+        # 只有尚未解码的事件的字段才会走到这里：解码普通字段，体积较大的字段仍然延迟解码
+        if not name.startswith("_") and self._deferred:
+            self._fill(self._loads(self._raw), self._raw, self._loads)
+            return getattr(self, name)
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def _heavy_fields(self) -> Dict[str, Any]:
+        """返回延迟解码字段的值，必要时从原始JSON中解码"""
+        if self._deferred:
+            # 还没有解码过时一次取得全部字段
+            self._fill(self._loads(self._raw))
+        elif self._heavy_values is None:
+            data = self._loads(self._raw).get("data") or {}
+            self._heavy_values = {name: data.get(name) for name in self._heavy}
+            self._raw = None
+            self._loads = None
+        return self._heavy_values
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换回与原始事件结构相同的字典，用于序列化或与处理字典事件的代码互操作。
+
+        Returns:
+            Dict[str, Any]: 事件字典
+        """
+        if self._deferred:
+            self._fill(self._loads(self._raw))
+        chunk = {"event": self.event}
+        for name in self._fields:
+            chunk[name] = getattr(self, name)
+        if self._data_fields or self._heavy:
+            data = {name: getattr(self, name) for name in self._data_fields}
+            data.update(self._heavy_fields())
+            chunk["data"] = data
+        if self.recovered:
+            chunk["recovered"] = True
+        return chunk
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self._fields + self._data_fields
+            if getattr(self, name) is not None
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+# Workflow / Chatflow 事件
+
+
+class WorkflowStarted(StreamEvent):
+    """workflow_started: 工作流开始执行"""
+
+    __slots__ = (
+        "workflow_run_id",
+        "id",
+        "workflow_id",
+        "sequence_number",
+        "created_at",
+    )
+
+    event = "workflow_started"
+    _fields = ("task_id", "workflow_run_id")
+    _data_fields = ("id", "workflow_id", "sequence_number", "created_at")
+
+
+class NodeStarted(StreamEvent):
+    """node_started: 节点开始执行"""
+
+    __slots__ = (
+        "workflow_run_id",
+        "id",
+        "node_id",
+        "node_type",
+        "title",
+        "index",
+        "predecessor_node_id",
+        "created_at",
+    )
+
+    event = "node_started"
+    _fields = ("task_id", "workflow_run_id")
+    _data_fields = (
+        "id",
+        "node_id",
+        "node_type",
+        "title",
+        "index",
+        "predecessor_node_id",
+        "created_at",
+    )
+    _heavy = ("inputs",)
+
+    inputs = _HeavyField("inputs")
+
+
+class NodeFinished(StreamEvent):
+    """node_finished: 节点执行结束（成功或失败）"""
+
+    __slots__ = (
+        "workflow_run_id",
+        "id",
+        "node_id",
+        "node_type",
+        "title",
+        "index",
+        "predecessor_node_id",
+        "status",
+        "error",
+        "elapsed_time",
+        "execution_metadata",
+        "created_at",
+    )
+
+    event = "node_finished"
+    _fields = ("task_id", "workflow_run_id")
+    _data_fields = (
+        "id",
+        "node_id",
+        "node_type",
+        "title",
+        "index",
+        "predecessor_node_id",
+        "status",
+        "error",
+        "elapsed_time",
+        "execution_metadata",
+        "created_at",
+    )
+    _heavy = ("inputs", "process_data", "outputs")
+
+    inputs = _HeavyField("inputs")
+    process_data = _HeavyField("process_data")
+    outputs = _HeavyField("outputs")
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        """节点消耗的token数，取自execution_metadata"""
+        metadata = self.execution_metadata or {}
+        return metadata.get("total_tokens")
+
+    @property
+    def total_price(self) -> Optional[str]:
+        """节点的花费"""
+        metadata = self.execution_metadata or {}
+        return metadata.get("total_price")
+
+
+class WorkflowFinished(StreamEvent):
+    """workflow_finished: 工作流执行结束（成功或失败）"""
+
+    __slots__ = (
+        "workflow_run_id",
+        "id",
+        "workflow_id",
+        "status",
+        "error",
+        "elapsed_time",
+        "total_tokens",
+        "total_steps",
+        "created_at",
+        "finished_at",
+    )
+
+    event = "workflow_finished"
+    _fields = ("task_id", "workflow_run_id")
+    _data_fields = (
+        "id",
+        "workflow_id",
+        "status",
+        "error",
+        "elapsed_time",
+        "total_tokens",
+        "total_steps",
+        "created_at",
+        "finished_at",
+    )
+    _heavy = ("outputs",)
+
+    outputs = _HeavyField("outputs")
+
+
+class TextChunk(StreamEvent):
+    """text_chunk: 工作流输出的文本块"""
+
+    __slots__ = ("workflow_run_id", "text", "from_variable_selector")
+
+    event = "text_chunk"
+    _fields = ("task_id", "workflow_run_id")
+    _data_fields = ("text", "from_variable_selector")
+
+
+# Chatbot / Agent / TextGeneration 事件
+
+
+class Message(StreamEvent):
+    """message: LLM返回的文本块"""
+
+    __slots__ = ("message_id", "conversation_id", "answer", "created_at")
+
+    event = "message"
+    _fields = ("task_id", "message_id", "conversation_id", "answer", "created_at")
+
+
+class AgentMessage(Message):
+    """agent_message: Agent模式下返回的文本块"""
+
+    __slots__ = ()
+
+    event = "agent_message"
+
+
+class AgentThought(StreamEvent):
+    """agent_thought: Agent的思考步骤，包含工具调用信息"""
+
+    __slots__ = (
+        "message_id",
+        "conversation_id",
+        "id",
+        "position",
+        "thought",
+        "observation",
+        "tool",
+        "tool_input",
+        "message_files",
+        "created_at",
+    )
+
+    event = "agent_thought"
+    _fields = (
+        "task_id",
+        "message_id",
+        "conversation_id",
+        "id",
+        "position",
+        "thought",
+        "observation",
+        "tool",
+        "tool_input",
+        "message_files",
+        "created_at",
+    )
+
+
+class MessageFile(StreamEvent):
+    """message_file: 需要展示的文件"""
+
+    __slots__ = ("id", "type", "belongs_to", "url", "conversation_id")
+
+    event = "message_file"
+    _fields = ("task_id", "id", "type", "belongs_to", "url", "conversation_id")
+
+
+class MessageEnd(StreamEvent):
+    """message_end: 消息结束，流式返回结束"""
+
+    __slots__ = ("message_id", "conversation_id", "metadata")
+
+    event = "message_end"
+    _fields = ("task_id", "message_id", "conversation_id", "metadata")
+
+    @property
+    def usage(self) -> Optional[Dict[str, Any]]:
+        """模型用量信息"""
+        return (self.metadata or {}).get("usage")
+
+    @property
+    def retriever_resources(self) -> Optional[list]:
+        """引用和归属分段列表"""
+        return (self.metadata or {}).get("retriever_resources")
+
+
+class MessageReplace(StreamEvent):
+    """message_replace: 内容审查后替换消息内容"""
+
+    __slots__ = ("message_id", "conversation_id", "answer", "created_at")
+
+    event = "message_replace"
+    _fields = ("task_id", "message_id", "conversation_id", "answer", "created_at")
+
+
+class TTSMessage(StreamEvent):
+    """tts_message: base64编码的TTS音频块"""
+
+    __slots__ = ("message_id", "audio", "created_at")
+
+    event = "tts_message"
+    _fields = ("task_id", "message_id", "audio", "created_at")
+
+
+class TTSMessageEnd(TTSMessage):
+    """tts_message_end: TTS音频流结束"""
+
+    __slots__ = ()
+
+    event = "tts_message_end"
+
+
+class ErrorEvent(StreamEvent):
+    """error: 流式输出过程中出现的异常"""
+
+    __slots__ = ("message_id", "status", "code", "message")
+
+    event = "error"
+    _fields = ("task_id", "message_id", "status", "code", "message")
+
+
+class Ping(StreamEvent):
+    """ping: 保持连接存活，每10秒一次"""
+
+    __slots__ = ()
+
+    event = "ping"
+
+
+class UnknownEvent(StreamEvent):
+    """未知类型的事件，保留完整的事件字典
+
+    Attributes:
+        event (str): 事件类型
+        data (Dict[str, Any]): 完整的事件字典
+    """
+
+    __slots__ = ("event", "data")
+
+    def __init__(self, chunk: Dict[str, Any]):
+        self.event = chunk.get("event")
+        self.data = chunk
+        self.task_id = chunk.get("task_id")
+        self.recovered = chunk.get("recovered", False)
+        self._raw = None
+        self._loads = None
+        self._heavy_values = {}
+        self._deferred = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.data
+
+    def __repr__(self) -> str:
+        return f"UnknownEvent(event={self.event!r})"
+
+
+EVENT_TYPES = {
+    cls.event: cls
+    for cls in (
+        WorkflowStarted,
+        NodeStarted,
+        NodeFinished,
+        WorkflowFinished,
+        TextChunk,
+        Message,
+        AgentMessage,
+        AgentThought,
+        MessageFile,
+        MessageEnd,
+        MessageReplace,
+        TTSMessage,
+        TTSMessageEnd,
+        ErrorEvent,
+        Ping,
+    )
+}
+
+
+def parse_event(
+    chunk: Any, loads: Optional[Callable[[bytes], Any]] = None, lazy: bool = False
+) -> StreamEvent:
+    """
+    把流式事件转换为对应的类型化事件对象。
+
+    Args:
+        chunk (Any): 解码后的事件字典或LazyEvent
+        loads (Callable[[bytes], Any], optional): 重新解码原始JSON的函数，chunk为LazyEvent时必需
+        lazy (bool, optional): 为True且chunk为尚未解码的LazyEvent时，构造事件时不解码JSON，
+            第一次访问字段时才解码，体积较大的字段不会被保留。默认为False
+
+    Returns:
+        StreamEvent: 事件对象，未知类型的事件返回UnknownEvent
+    """
+    raw = None
+    if isinstance(chunk, LazyEvent):
+        if lazy and loads is not None:
+            cls = EVENT_TYPES.get(chunk.event)
+            if cls is not None and not chunk.decoded:
+                return cls.from_raw(chunk.raw, loads)
+            raw = chunk.raw
+        chunk = chunk.to_dict()
+    cls = EVENT_TYPES.get(chunk.get("event"))
+    if cls is None:
+        return UnknownEvent(chunk)
+    return cls.from_dict(chunk, raw, loads)
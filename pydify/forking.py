@@ -0,0 +1,30 @@
+"""
+Pydify - 多进程支持
+
+fork出的子进程会继承父进程中客户端持有的连接池、锁和后台线程的状态：
+连接池中的套接字与父进程共用，父进程中其他线程持有的锁在子进程中永远不会被释放。
+
+此模块维护一个需要在fork后重置的对象集合。子进程启动时会调用每个对象的_after_fork方法，
+由对象丢弃从父进程继承的连接池和锁，并在首次使用时重新创建。
+不支持fork的平台（例如Windows）上此模块不做任何事情。
+"""
+
+import os
+import weakref
+
+# 需要在fork后重置的对象，对象被回收后自动移除
+_instances = weakref.WeakSet()
+
+
+def _register_after_fork(obj):
+    """登记一个对象，在fork出的子进程中调用它的_after_fork方法"""
+    _instances.add(obj)
+
+
+def _after_fork_in_child():
+    for obj in list(_instances):
+        obj._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,155 @@
+"""
+Pydify - 调用钩子
+
+此模块定义客户端的插桩接口。向客户端注册ClientHooks的子类后，每次API调用
+（普通请求、流式请求和文件上传）都会在关键节点回调对应的方法，可以用来统计指标、记录日志或接入监控系统。
+
+没有注册任何钩子时，客户端不会创建RequestInfo，也不会做额外的计时和字节统计。
+
+示例:
+    ```python
+    class SlowCallLogger(ClientHooks):
+        def on_response(self, info):
+            if info.elapsed > 5:
+                print(f"慢请求: {info.method} {info.endpoint} {info.elapsed:.2f}s")
+
+    client = WorkflowClient(api_key="your_api_key", hooks=[SlowCallLogger()])
+    ```
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+
+class RequestInfo:
+    """一次API调用的信息，在同一次调用的各个钩子回调之间共享
+
+    Attributes:
+        method (str): HTTP方法
+        endpoint (str): API端点
+        url (str): 完整的请求URL
+        stream (bool): 是否为流式调用
+        started (float): 调用开始的时间(time.monotonic())
+        attempts (int): 已发出的请求次数，包括重试
+        status_code (int): 响应状态码，尚未收到响应时为None
+        elapsed (float): 从调用开始到收到响应的时间(秒)，包括重试和退避等待；
+            普通请求包括读取响应体，流式请求只到收到响应头为止
+        duration (float): 整个调用的时间(秒)，流式调用包括读取所有事件
+        bytes_out (int): 最后一次请求的请求体字节数
+        bytes_in (int): 响应体字节数，流式调用为所有事件data字段的字节数之和
+        events (int): 流式调用已收到的事件数
+        error (BaseException): 调用失败时的异常
+        timing (StreamTiming): 流式调用的首字延迟和事件间隔记录，普通请求为None
+        context (Dict[str, Any]): 供钩子保存同一次调用状态的字典，例如TracingHooks的span
+    """
+
+    __slots__ = (
+        "method",
+        "endpoint",
+        "url",
+        "stream",
+        "started",
+        "attempts",
+        "status_code",
+        "elapsed",
+        "duration",
+        "bytes_out",
+        "bytes_in",
+        "events",
+        "error",
+        "timing",
+        "context",
+    )
+
+    def __init__(self, method: str, endpoint: str, url: str, stream: bool = False):
+        self.method = method
+        self.endpoint = endpoint
+        self.url = url
+        self.stream = stream
+        self.started = time.monotonic()
+        self.attempts = 1
+        self.status_code: Optional[int] = None
+        self.elapsed: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.events = 0
+        self.error: Optional[BaseException] = None
+        self.timing = None
+        self.context: Dict[str, Any] = {}
+
+    def __repr__(self) -> str:
+        return (
+            f"RequestInfo({self.method} {self.endpoint}, status={self.status_code}, "
+            f"attempts={self.attempts}, elapsed={self.elapsed})"
+        )
+
+
+class ClientHooks:
+    """客户端钩子的基类，所有方法默认不做任何事情，子类只需要覆盖关心的方法
+
+    钩子在发起调用的线程（异步客户端为事件循环）中同步执行，应当尽快返回。
+    钩子抛出的异常会被记录到日志，不会影响API调用本身。
+    """
+
+    def on_request_start(self, info: RequestInfo):
+        """调用开始，尚未发出请求"""
+
+    def on_retry(self, info: RequestInfo, attempt: int, delay: float, reason: Any):
+        """
+        第attempt次尝试（从0开始）失败，将在delay秒后重试。
+
+        Args:
+            info (RequestInfo): 调用信息
+            attempt (int): 失败的尝试序号
+            delay (float): 重试前的等待时间(秒)
+            reason (Any): 失败原因，网络错误时为异常对象，可重试的状态码时为状态码
+        """
+
+    def on_response(self, info: RequestInfo):
+        """收到最终的响应（包括错误状态码），info.status_code、elapsed和字节数已经填好"""
+
+    def on_stream_event(self, info: RequestInfo, event_type: Optional[str], size: int):
+        """
+        流式调用收到一个事件，包括之后被过滤掉的事件。
+
+        Args:
+            info (RequestInfo): 调用信息
+            event_type (str): 事件类型，无法读取时为None
+            size (int): 事件data字段的字节数
+        """
+
+    def on_stream_end(self, info: RequestInfo):
+        """流式调用结束（正常结束、出错或被调用方提前关闭），info.duration和events已经填好"""
+
+    def on_error(self, info: RequestInfo, error: BaseException):
+        """调用失败，即将向调用方抛出error"""
+
+
+def _header_size(headers: Any) -> Optional[int]:
+    value = headers.get("Content-Length") if headers is not None else None
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _request_size(response: Any) -> int:
+    """取得响应对应请求的请求体字节数，支持requests和httpx，无法确定时返回0"""
+    request = getattr(response, "request", None)
+    if request is None:
+        return 0
+    size = _header_size(getattr(request, "headers", None))
+    if size is not None:
+        return size
+    body = getattr(request, "body", None)
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    return 0
+
+
+def _response_size(response: Any) -> int:
+    """取得已读取的响应体字节数"""
+    content = getattr(response, "content", None)
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    return 0
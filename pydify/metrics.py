@@ -0,0 +1,336 @@
+"""
+Pydify - 调用指标
+
+此模块提供MetricsCollector，一个内置的ClientHooks实现，按端点统计请求数与状态码、
+延迟直方图、重试次数、收发字节数、每个流的事件数和错误数，并以Prometheus文本格式导出。
+
+导出方式有两种: 调用render()取得文本（例如在已有的Web服务中挂到/metrics路由），
+或调用start_http_server()在本地启动一个只提供指标的HTTP服务。
+
+示例:
+    ```python
+    metrics = MetricsCollector()
+    client = WorkflowClient(api_key="your_api_key", hooks=[metrics])
+    metrics.start_http_server(9108)  # curl http://127.0.0.1:9108/metrics
+    ```
+"""
+
+import bisect
+import http.server
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .forking import _register_after_fork
+from .hooks import ClientHooks, RequestInfo
+
+# 请求延迟直方图的默认分桶(秒)
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 每个流事件数直方图的默认分桶
+DEFAULT_EVENT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# 端点路径中的ID段，替换为占位符以免标签基数无限增长
+_ID_SEGMENT = re.compile(
+    r"^(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$"
+)
+
+
+def _endpoint_label(endpoint: str) -> str:
+    """把端点转换为指标标签，去掉查询参数，并把UUID和数字ID替换为{id}"""
+    path = endpoint.split("?", 1)[0].strip("/")
+    return "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/")
+    )
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, key: Tuple, amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        for key, value in sorted(self.values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            )
+
+
+class _Histogram:
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str], buckets: Iterable[float]
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶计数..., 总和, 总数]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, key: Tuple, value: float):
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            counts[index] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        names = self.labels + ("le",)
+        for key, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} "
+                    f"{_format_value(cumulative)}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} "
+                f"{_format_value(counts[-1])}"
+            )
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(counts[-1])}")
+
+
+class MetricsCollector(ClientHooks):
+    """按端点统计API调用指标的钩子
+
+    同一个收集器可以注册到多个客户端（包括异步客户端），所有统计都是线程安全的。
+    端点路径中的UUID和数字ID会被替换为{id}，避免标签数量随任务数增长。
+
+    导出的指标（前缀可以通过namespace修改）:
+    - pydify_requests_total{method,endpoint,status}: 调用次数，网络错误等没有响应的调用status为"error"
+    - pydify_request_duration_seconds{method,endpoint}: 从调用开始到收到响应的时间，包括重试，
+      流式调用只到收到响应头为止
+    - pydify_stream_duration_seconds{endpoint}: 流式调用的总时长
+    - pydify_time_to_first_token_seconds{endpoint}: 流式调用从开始到收到第一个内容事件的时间
+    - pydify_retries_total{method,endpoint}: 重试次数
+    - pydify_request_bytes_total / pydify_response_bytes_total{method,endpoint}: 发送和接收的字节数
+    - pydify_stream_events{endpoint}: 每个流式调用收到的事件数
+    - pydify_stream_events_total{endpoint,event}: 按类型统计的流式事件数
+    - pydify_errors_total{method,endpoint,error}: 按异常类型统计的失败调用数
+    """
+
+    def __init__(
+        self,
+        namespace: str = "pydify",
+        latency_buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+        event_buckets: Iterable[float] = DEFAULT_EVENT_BUCKETS,
+    ):
+        """
+        Args:
+            namespace (str, optional): 指标名前缀。默认为"pydify"
+            latency_buckets (Iterable[float], optional): 延迟直方图的分桶(秒)
+            event_buckets (Iterable[float], optional): 每个流事件数直方图的分桶
+        """
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        _register_after_fork(self)
+        method_endpoint = ("method", "endpoint")
+        self._requests = _Counter(
+            f"{namespace}_requests_total", "API调用次数", method_endpoint + ("status",)
+        )
+        self._latency = _Histogram(
+            f"{namespace}_request_duration_seconds",
+            "从调用开始到收到响应的时间(秒)",
+            method_endpoint,
+            latency_buckets,
+        )
+        self._stream_duration = _Histogram(
+            f"{namespace}_stream_duration_seconds",
+            "流式调用的总时长(秒)",
+            ("endpoint",),
+            latency_buckets,
+        )
+        self._first_token = _Histogram(
+            f"{namespace}_time_to_first_token_seconds",
+            "流式调用从开始到收到第一个内容事件的时间(秒)",
+            ("endpoint",),
+            latency_buckets,
+        )
+        self._retries = _Counter(
+            f"{namespace}_retries_total", "重试次数", method_endpoint
+        )
+        self._bytes_out = _Counter(
+            f"{namespace}_request_bytes_total", "发送的请求体字节数", method_endpoint
+        )
+        self._bytes_in = _Counter(
+            f"{namespace}_response_bytes_total", "接收的响应体字节数", method_endpoint
+        )
+        self._stream_events = _Histogram(
+            f"{namespace}_stream_events",
+            "每个流式调用收到的事件数",
+            ("endpoint",),
+            event_buckets,
+        )
+        self._event_types = _Counter(
+            f"{namespace}_stream_events_total",
+            "按类型统计的流式事件数",
+            ("endpoint", "event"),
+        )
+        self._errors = _Counter(
+            f"{namespace}_errors_total", "失败的调用数", method_endpoint + ("error",)
+        )
+        self._metrics = (
+            self._requests,
+            self._latency,
+            self._stream_duration,
+            self._first_token,
+            self._retries,
+            self._bytes_out,
+            self._bytes_in,
+            self._stream_events,
+            self._event_types,
+            self._errors,
+        )
+        self._server: Optional[http.server.HTTPServer] = None
+
+    # ClientHooks
+
+    def on_retry(self, info: RequestInfo, attempt: int, delay: float, reason: Any):
+        with self._lock:
+            self._retries.inc((info.method, _endpoint_label(info.endpoint)))
+
+    def on_response(self, info: RequestInfo):
+        key = (info.method, _endpoint_label(info.endpoint))
+        with self._lock:
+            self._requests.inc(key + (str(info.status_code),))
+            self._latency.observe(key, info.elapsed)
+            self._bytes_out.inc(key, info.bytes_out)
+            if not info.stream:
+                self._bytes_in.inc(key, info.bytes_in)
+
+    def on_stream_event(self, info: RequestInfo, event_type: Optional[str], size: int):
+        with self._lock:
+            self._event_types.inc((_endpoint_label(info.endpoint), event_type or ""))
+
+    def on_stream_end(self, info: RequestInfo):
+        endpoint = _endpoint_label(info.endpoint)
+        with self._lock:
+            self._stream_events.observe((endpoint,), info.events)
+            self._stream_duration.observe((endpoint,), info.duration)
+            timing = info.timing
+            if timing is not None and timing.first_content is not None:
+                self._first_token.observe((endpoint,), timing.first_content)
+            self._bytes_in.inc((info.method, endpoint), info.bytes_in)
+
+    def on_error(self, info: RequestInfo, error: BaseException):
+        key = (info.method, _endpoint_label(info.endpoint))
+        with self._lock:
+            if info.status_code is None:
+                self._requests.inc(key + ("error",))
+            self._errors.inc(key + (type(error).__name__,))
+
+    # 导出
+
+    def render(self) -> str:
+        """
+        以Prometheus文本格式导出当前的所有指标。
+
+        Returns:
+            str: Prometheus文本格式(version 0.0.4)的指标
+        """
+        lines: List[str] = []
+        with self._lock:
+            for metric in self._metrics:
+                if metric.values:
+                    metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+    __call__ = render
+
+    def reset(self):
+        """清空所有统计"""
+        with self._lock:
+            for metric in self._metrics:
+                metric.values.clear()
+
+    def start_http_server(
+        self, port: int = 0, addr: str = "127.0.0.1"
+    ) -> http.server.HTTPServer:
+        """
+        在后台线程中启动一个HTTP服务，在/metrics路径提供Prometheus文本格式的指标。
+
+        Args:
+            port (int, optional): 监听端口，0表示由系统分配。默认为0
+            addr (str, optional): 监听地址。默认为"127.0.0.1"，只允许本机访问
+
+        Returns:
+            http.server.HTTPServer: 服务对象，实际端口为server.server_port
+        """
+        collector = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = collector.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((addr, port), Handler)
+        thread = threading.Thread(
+            target=server.serve_forever, name="pydify-metrics", daemon=True
+        )
+        thread.start()
+        self._server = server
+        return server
+
+    def _after_fork(self):
+        """清空计数，每个进程只统计自己发出的请求。HTTP服务的线程不会被fork，在子进程中视为未启动"""
+        MetricsCollector.__init__(
+            self, self.namespace, self._latency.buckets, self._stream_events.buckets
+        )
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self.namespace, self._latency.buckets, self._stream_events.buckets),
+        )
+
+    def stop_http_server(self):
+        """停止start_http_server启动的HTTP服务"""
+        server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
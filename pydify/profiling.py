@@ -0,0 +1,529 @@
+"""
+Pydify - 请求分阶段计时
+
+此模块提供可选的请求剖析功能：记录每次请求在DNS解析、TCP连接、TLS握手、等待响应头
+和下载响应体上各花了多少时间，并按端点保留最近若干次请求的滚动统计，随时可以输出为表格。
+据此可以判断变慢的原因是连接没有复用（需要调整连接池或代理），还是服务端处理本身较慢。
+
+剖析默认是关闭的，可以通过客户端的profile参数或PYDIFY_PROFILE环境变量开启。
+
+示例:
+    ```python
+    client = WorkflowClient(api_key="your_api_key", profile=True)
+    for item in items:
+        client.run(item, user="user_123", response_mode="blocking")
+    client.profiler.dump()
+    ```
+"""
+
+import collections
+import contextvars
+import os
+import socket
+import sys
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .forking import _register_after_fork
+from .metrics import _endpoint_label
+
+# 开启剖析的环境变量
+PROFILE_ENV = "PYDIFY_PROFILE"
+# 每个端点默认保留的最近请求数
+DEFAULT_PROFILE_WINDOW = 1000
+
+# 表格中的阶段及其列名
+_PHASES = (
+    ("dns", "DNS"),
+    ("connect", "连接"),
+    ("tls", "TLS"),
+    ("wait", "等待"),
+    ("download", "下载"),
+    ("total", "总计"),
+)
+
+# 当前线程（或异步任务）中正在剖析的请求，由连接类和httpx的trace回调写入各阶段时间
+_current: "contextvars.ContextVar[Optional[RequestProfile]]" = contextvars.ContextVar(
+    "pydify_profile", default=None
+)
+
+
+def profiling_enabled(profile: Any = None) -> bool:
+    """
+    判断是否开启剖析。
+
+    Args:
+        profile (Any, optional): 客户端的profile参数，为None时读取PYDIFY_PROFILE环境变量
+
+    Returns:
+        bool: 是否开启剖析
+    """
+    if profile is None:
+        return os.environ.get(PROFILE_ENV, "").strip().lower() in (
+            "1",
+            "true",
+            "yes",
+            "on",
+        )
+    return bool(profile)
+
+
+def _get_profiler(profile: Any) -> Optional["Profiler"]:
+    """根据客户端的profile参数取得剖析器，未开启时返回None"""
+    if isinstance(profile, Profiler):
+        return profile
+    if profiling_enabled(profile):
+        return Profiler()
+    return None
+
+
+class RequestProfile:
+    """一次请求（重试时为一次尝试）的分阶段耗时，单位为秒
+
+    复用已有连接的请求没有DNS、连接和TLS阶段，对应的值为None。无法拆分连接阶段时
+    （例如使用外部传入的会话），wait包含建立连接的时间，reused为None。
+
+    Attributes:
+        dns (float): DNS解析时间，异步客户端不单独统计，计入connect
+        connect (float): TCP连接时间
+        tls (float): TLS握手时间，HTTP请求为None
+        wait (float): 从发出请求到收到响应头的时间，包括上传请求体和服务端处理
+        download (float): 读取响应体的时间，流式请求为None
+        total (float): 整个请求的时间
+        reused (bool): 是否复用了连接池中的连接
+        error (bool): 请求是否因网络错误失败
+    """
+
+    __slots__ = (
+        "dns",
+        "connect",
+        "tls",
+        "wait",
+        "download",
+        "total",
+        "reused",
+        "error",
+        "_marks",
+    )
+
+    def __init__(self):
+        self.dns: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.tls: Optional[float] = None
+        self.wait: Optional[float] = None
+        self.download: Optional[float] = None
+        self.total: Optional[float] = None
+        self.reused: Optional[bool] = None
+        self.error = False
+        # httpx trace回调记录的时间点
+        self._marks: Dict[str, float] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典。
+
+        Returns:
+            Dict[str, Any]: 各阶段耗时(秒)以及reused、error
+        """
+        return {
+            "dns": self.dns,
+            "connect": self.connect,
+            "tls": self.tls,
+            "wait": self.wait,
+            "download": self.download,
+            "total": self.total,
+            "reused": self.reused,
+            "error": self.error,
+        }
+
+    def __repr__(self) -> str:
+        phases = ", ".join(
+            f"{name}={value * 1000:.1f}ms"
+            for name, value in ((name, getattr(self, name)) for name, _ in _PHASES)
+            if value is not None
+        )
+        return f"RequestProfile({phases}, reused={self.reused})"
+
+    async def _trace(self, name: str, info: Dict[str, Any]):
+        """httpx(httpcore)的trace回调，记录连接、TLS和收发响应头的时间点"""
+        self._marks[name.split(".", 1)[-1]] = time.perf_counter()
+
+    def _from_marks(self, started: float, finished: float, stream: bool):
+        """根据trace回调记录的时间点计算各阶段耗时"""
+        marks = self._marks
+        self.total = finished - started
+        if "connect_tcp.complete" in marks:
+            self.connect = marks["connect_tcp.complete"] - marks["connect_tcp.started"]
+            self.reused = False
+        else:
+            self.reused = True
+        if "start_tls.complete" in marks:
+            self.tls = marks["start_tls.complete"] - marks["start_tls.started"]
+        sent = marks.get("send_request_headers.started")
+        headers = marks.get("receive_response_headers.complete")
+        if sent is not None and headers is not None:
+            self.wait = headers - sent
+            if not stream:
+                self.download = finished - headers
+
+    def _from_elapsed(self, elapsed: Optional[float], stream: bool):
+        """根据requests的response.elapsed（从发出请求到解析完响应头）计算等待和下载时间"""
+        if elapsed is None:
+            return
+        setup = (self.dns or 0) + (self.connect or 0) + (self.tls or 0)
+        self.wait = max(elapsed - setup, 0.0)
+        if not stream:
+            self.download = max(self.total - elapsed, 0.0)
+
+
+def _resolve(host: str, port: int) -> List[str]:
+    """解析主机名，返回去重后的地址列表，失败时返回空列表"""
+    try:
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except OSError:
+        return []
+    addresses = []
+    for info in infos:
+        address = info[4][0]
+        if address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+class _ProfiledConnectionMixin:
+    """在新建连接时分别记录DNS解析和TCP连接时间的urllib3连接"""
+
+    def _new_conn(self):
+        profile = _current.get()
+        if profile is None:
+            return super()._new_conn()
+        host = self._dns_host
+        started = time.perf_counter()
+        addresses = _resolve(host, self.port)
+        resolved = time.perf_counter()
+        profile.dns = resolved - started
+        profile.reused = False
+        if not addresses:
+            # 解析失败时交给urllib3报告原本的错误
+            return super()._new_conn()
+        # 使用已解析的地址建立连接，避免重复解析；TLS的SNI和证书校验仍使用原主机名
+        self._dns_host = addresses[0]
+        try:
+            sock = super()._new_conn()
+        except Exception:
+            if len(addresses) == 1:
+                raise
+            # 第一个地址连接失败时，由urllib3按原主机名依次尝试所有地址
+            self._dns_host = host
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        profile.connect = time.perf_counter() - resolved
+        return sock
+
+
+class _ProfiledHTTPConnection(_ProfiledConnectionMixin, HTTPConnection):
+    pass
+
+
+class _ProfiledHTTPSConnection(_ProfiledConnectionMixin, HTTPSConnection):
+    def connect(self):
+        profile = _current.get()
+        started = time.perf_counter()
+        super().connect()
+        if profile is not None and profile.connect is not None:
+            profile.tls = max(
+                time.perf_counter() - started - profile.dns - profile.connect, 0.0
+            )
+
+
+class _ProfiledHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _ProfiledHTTPConnection
+
+
+class _ProfiledHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _ProfiledHTTPSConnection
+
+
+class ProfilingAdapter(HTTPAdapter):
+    """新建连接时记录DNS、TCP连接和TLS握手时间的HTTPAdapter
+
+    只在Profiler.measure期间记录，其余请求与普通的HTTPAdapter完全相同。
+    经过HTTP代理的HTTPS请求，TLS时间包括建立隧道的时间。
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _ProfiledHTTPConnectionPool,
+            "https": _ProfiledHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        profile = _current.get()
+        if profile is not None:
+            # 新建连接时由连接类改为False
+            profile.reused = True
+        return super().send(request, *args, **kwargs)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """已排序列表的百分位数（最近秩法）"""
+    index = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def _display_width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+
+def _pad(text: str, width: int, left: bool = False) -> str:
+    padding = " " * max(width - _display_width(text), 0)
+    return text + padding if left else padding + text
+
+
+def _format_ms(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    return f"{value * 1000:.1f}"
+
+
+class Profiler:
+    """按端点保存请求分阶段耗时的滚动统计
+
+    每个端点（方法加路径，路径中的ID替换为{id}）只保留最近window次请求。
+    同一个剖析器可以传给多个客户端（包括异步客户端和DifySite）共用，所有操作都是线程安全的。
+    """
+
+    def __init__(self, window: int = DEFAULT_PROFILE_WINDOW):
+        """
+        Args:
+            window (int, optional): 每个端点保留的最近请求数。默认为1000
+        """
+        self.window = window
+        self._after_fork()
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        """清空记录，每个进程只统计自己发出的请求"""
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, collections.deque] = {}
+
+    def __reduce__(self):
+        return (self.__class__, (self.window,))
+
+    def measure(
+        self,
+        method: str,
+        endpoint: str,
+        send: Callable[[], Any],
+        stream: bool = False,
+    ) -> Any:
+        """
+        发送一次同步请求并记录各阶段耗时。
+
+        Args:
+            method (str): HTTP方法
+            endpoint (str): API端点
+            send (Callable[[], Any]): 发送请求并返回requests.Response的函数
+            stream (bool, optional): 是否为流式请求，流式请求返回时只收到了响应头。默认为False
+
+        Returns:
+            Any: send的返回值
+        """
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = send()
+        except Exception:
+            profile.error = True
+            profile.total = time.perf_counter() - started
+            self.record(method, endpoint, profile)
+            raise
+        finally:
+            _current.reset(token)
+        profile.total = time.perf_counter() - started
+        elapsed = getattr(response, "elapsed", None)
+        profile._from_elapsed(
+            elapsed.total_seconds() if elapsed is not None else None, stream
+        )
+        self.record(method, endpoint, profile)
+        return response
+
+    async def ameasure(
+        self,
+        method: str,
+        endpoint: str,
+        send: Callable[[Optional[Dict[str, Any]]], Awaitable[Any]],
+        stream: bool = False,
+    ) -> Any:
+        """
+        measure的异步版本，通过httpx的trace扩展记录各阶段耗时。
+
+        httpx不单独报告DNS解析，DNS时间计入connect。
+
+        Args:
+            method (str): HTTP方法
+            endpoint (str): API端点
+            send (Callable): 接收httpx请求扩展字典（extensions）并发送请求的协程函数
+            stream (bool, optional): 是否为流式请求。默认为False
+
+        Returns:
+            Any: send的返回值
+        """
+        profile = RequestProfile()
+        started = time.perf_counter()
+        try:
+            response = await send({"trace": profile._trace})
+        except Exception:
+            profile.error = True
+            profile.total = time.perf_counter() - started
+            self.record(method, endpoint, profile)
+            raise
+        profile._from_marks(started, time.perf_counter(), stream)
+        self.record(method, endpoint, profile)
+        return response
+
+    def record(self, method: str, endpoint: str, profile: RequestProfile):
+        """
+        记录一次请求的耗时。
+
+        Args:
+            method (str): HTTP方法
+            endpoint (str): API端点
+            profile (RequestProfile): 请求的分阶段耗时
+        """
+        key = f"{method.upper()} {_endpoint_label(endpoint)}"
+        with self._lock:
+            profiles = self._profiles.get(key)
+            if profiles is None:
+                profiles = self._profiles[key] = collections.deque(maxlen=self.window)
+            profiles.append(profile)
+
+    def profiles(self, key: str) -> List[RequestProfile]:
+        """
+        取得某个端点最近的请求耗时记录。
+
+        Args:
+            key (str): 端点，格式与summary()的键相同，如"POST workflows/run"
+
+        Returns:
+            List[RequestProfile]: 从旧到新的记录
+        """
+        with self._lock:
+            return list(self._profiles.get(key, ()))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按端点汇总最近的请求耗时。
+
+        DNS、连接和TLS只统计新建了连接的请求，其余阶段统计所有成功的请求。
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 端点（如"POST workflows/run"）到统计结果的映射，统计结果包括:
+                - count (int): 请求数
+                - errors (int): 网络错误数
+                - reused (float): 复用连接的比例，无法判断时为None
+                - dns、connect、tls、wait、download、total: 各阶段的统计，
+                  包含count、mean、p50、p90、p99和max(秒)，没有数据时为None
+        """
+        with self._lock:
+            snapshot = {key: list(profiles) for key, profiles in self._profiles.items()}
+        summary = {}
+        for key, profiles in sorted(snapshot.items()):
+            known = [p.reused for p in profiles if p.reused is not None]
+            entry: Dict[str, Any] = {
+                "count": len(profiles),
+                "errors": sum(1 for p in profiles if p.error),
+                "reused": sum(known) / len(known) if known else None,
+            }
+            for phase, _ in _PHASES:
+                values = sorted(
+                    getattr(p, phase)
+                    for p in profiles
+                    if getattr(p, phase) is not None
+                    and (phase == "total" or not p.error)
+                )
+                entry[phase] = (
+                    {
+                        "count": len(values),
+                        "mean": sum(values) / len(values),
+                        "p50": _percentile(values, 50),
+                        "p90": _percentile(values, 90),
+                        "p99": _percentile(values, 99),
+                        "max": values[-1],
+                    }
+                    if values
+                    else None
+                )
+            summary[key] = entry
+        return summary
+
+    def format_table(self, percentile: str = "p50") -> str:
+        """
+        把汇总结果格式化为文本表格，时间单位为毫秒。
+
+        Args:
+            percentile (str, optional): 各阶段列显示的统计量，可以是"mean"、"p50"、"p90"、"p99"或"max"。
+                总计列另外显示p90。默认为"p50"
+
+        Returns:
+            str: 文本表格，没有记录时返回提示
+        """
+        summary = self.summary()
+        if not summary:
+            return "(没有剖析记录)"
+        header = ["端点", "次数", "错误", "复用"]
+        header += [f"{title}({percentile})" for _, title in _PHASES]
+        header.append("总计(p90)")
+        rows = [header]
+        for key, entry in summary.items():
+            row = [
+                key,
+                str(entry["count"]),
+                str(entry["errors"]),
+                "-" if entry["reused"] is None else f"{entry['reused']:.0%}",
+            ]
+            for phase, _ in _PHASES:
+                stats = entry[phase]
+                row.append(_format_ms(stats[percentile] if stats else None))
+            total = entry["total"]
+            row.append(_format_ms(total["p90"] if total else None))
+            rows.append(row)
+        widths = [
+            max(_display_width(row[i]) for row in rows) for i in range(len(header))
+        ]
+        lines = []
+        for index, row in enumerate(rows):
+            lines.append(
+                "  ".join(
+                    _pad(cell, width, left=column == 0)
+                    for column, (cell, width) in enumerate(zip(row, widths))
+                ).rstrip()
+            )
+            if index == 0:
+                lines.append("  ".join("-" * width for width in widths))
+        lines.append("时间单位: 毫秒(ms)")
+        return "\n".join(lines)
+
+    def dump(self, file: Optional[TextIO] = None, percentile: str = "p50"):
+        """
+        把汇总表格写入文件。
+
+        Args:
+            file (TextIO, optional): 输出目标。默认为sys.stderr
+            percentile (str, optional): 各阶段列显示的统计量，参见format_table。默认为"p50"
+        """
+        print(self.format_table(percentile), file=file or sys.stderr)
+
+    def reset(self):
+        """清空所有记录"""
+        with self._lock:
+            self._profiles.clear()
@@ -0,0 +1,192 @@
+"""
+Pydify - 客户端限流
+
+此模块提供基于令牌桶的客户端限流器，在请求发出前于本地排队等待，
+避免多个任务共用一个API密钥时频繁触发服务端的429限流。
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from .forking import _register_after_fork
+
+# 异步等待并发流名额时的轮询间隔(秒)
+_ASYNC_POLL_INTERVAL = 0.01
+
+_shared_limiters: Dict[str, "RateLimiter"] = {}
+_shared_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """令牌桶限流器
+
+    同时支持两种限制:
+    - 每秒请求数: 令牌以requests_per_second的速度补充，桶容量为burst。
+      每次发出请求（包括重试和流式请求的建立）前取走一个令牌，令牌不足时在本地等待
+    - 并发流数量: 同一时刻最多保持max_concurrent_streams个流式响应
+
+    限流器是线程安全的，可以在多个线程和多个客户端实例之间共享，也可以被同步和异步客户端同时使用。
+    令牌采用预约方式发放，排队的调用方按到达顺序依次获得令牌，不会出现惊群。
+
+    示例:
+        ```python
+        limiter = get_rate_limiter("your_api_key", requests_per_second=5, max_concurrent_streams=10)
+        workflow = WorkflowClient(api_key="your_api_key", rate_limiter=limiter)
+        ```
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrent_streams: Optional[int] = None,
+    ):
+        """
+        Args:
+            requests_per_second (float, optional): 每秒允许发出的请求数，None表示不限制。默认为None
+            burst (int, optional): 令牌桶容量，即空闲后允许的瞬时突发请求数。
+                默认为max(1, requests_per_second)
+            max_concurrent_streams (int, optional): 最大并发流式请求数，None表示不限制。默认为None
+
+        Raises:
+            ValueError: 当参数不是正数时
+        """
+        if requests_per_second is not None and requests_per_second <= 0:
+            raise ValueError("requests_per_second必须大于0")
+        if max_concurrent_streams is not None and max_concurrent_streams <= 0:
+            raise ValueError("max_concurrent_streams必须大于0")
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst or max(1, int(requests_per_second or 1))
+        self.max_concurrent_streams = max_concurrent_streams
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._after_fork()
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        """重新创建锁和并发流名额，父进程中正在进行的流不占用子进程的名额"""
+        self._lock = threading.Lock()
+        self._streams = (
+            threading.BoundedSemaphore(self.max_concurrent_streams)
+            if self.max_concurrent_streams
+            else None
+        )
+
+    def __reduce__(self):
+        # 只序列化配置，每个进程各自计算限额
+        return (
+            self.__class__,
+            (self.requests_per_second, self.burst, self.max_concurrent_streams),
+        )
+
+    def reserve(self) -> float:
+        """
+        预约一个令牌，返回拿到令牌前需要等待的时间。
+
+        令牌允许被预支为负数，后来的调用方需要等待的时间会相应变长，从而保证先到先得。
+
+        Returns:
+            float: 需要等待的秒数，0表示可以立即发送
+        """
+        if self.requests_per_second is None:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated_at) * self.requests_per_second,
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.requests_per_second
+
+    def acquire(self):
+        """阻塞当前线程，直到可以发出下一个请求"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        """acquire的异步版本，等待期间不阻塞事件循环"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @contextlib.contextmanager
+    def stream_slot(self) -> Iterator[None]:
+        """
+        占用一个并发流名额，在with语句块结束（流被读完或关闭）时释放。
+
+        示例:
+            ```python
+            with limiter.stream_slot():
+                for event in iter_events():
+                    ...
+            ```
+        """
+        if self._streams is None:
+            yield
+            return
+
+        self._streams.acquire()
+        try:
+            yield
+        finally:
+            self._streams.release()
+
+    @contextlib.asynccontextmanager
+    async def astream_slot(self) -> AsyncIterator[None]:
+        """stream_slot的异步版本，等待名额期间不阻塞事件循环"""
+        if self._streams is None:
+            yield
+            return
+
+        while not self._streams.acquire(blocking=False):
+            await asyncio.sleep(_ASYNC_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self._streams.release()
+
+    def __repr__(self) -> str:
+        return (
+            f"RateLimiter(requests_per_second={self.requests_per_second}, "
+            f"burst={self.burst}, max_concurrent_streams={self.max_concurrent_streams})"
+        )
+
+
+def get_rate_limiter(
+    api_key: str,
+    requests_per_second: Optional[float] = None,
+    burst: Optional[int] = None,
+    max_concurrent_streams: Optional[int] = None,
+) -> RateLimiter:
+    """
+    获取进程内按API密钥共享的限流器。
+
+    Dify的限流以API密钥为单位，使用相同密钥的所有客户端（包括批处理任务和在线请求）
+    应当共用一个限流器。同一个密钥第一次调用时按给定参数创建，之后的调用返回已有的限流器。
+
+    Args:
+        api_key (str): Dify API密钥
+        requests_per_second (float, optional): 每秒允许发出的请求数
+        burst (int, optional): 令牌桶容量
+        max_concurrent_streams (int, optional): 最大并发流式请求数
+
+    Returns:
+        RateLimiter: 该密钥共享的限流器
+    """
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(api_key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_second, burst, max_concurrent_streams)
+            _shared_limiters[api_key] = limiter
+        return limiter
@@ -0,0 +1,314 @@
+"""
+Pydify - 流式结果累加
+
+此模块提供StreamResult，消费一次流式调用产生的事件并汇总为最终结果：
+拼接后的完整文本、消息/会话/运行ID、用量信息、各节点的输出与耗时等。
+
+文本片段先保存在列表中，只在读取text时拼接一次，避免在循环中反复执行
+answer += chunk["answer"]带来的二次方复制开销。
+
+示例:
+    ```python
+    # 直接汇总整个流
+    result = StreamResult.collect(client.send_message("你好", user="user_123"))
+    print(result.text, result.conversation_id, result.usage)
+
+    # 边转发事件边汇总
+    result = StreamResult()
+    for event in result.wrap(client.run(inputs, user="user_123")):
+        print(event["event"])
+    print(result.outputs, result.nodes)
+    ```
+"""
+
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from .events import StreamEvent
+
+# 产出文本片段的事件及其文本字段
+_TEXT_EVENTS = {"message": "answer", "agent_message": "answer"}
+
+
+class StreamResult:
+    """流式调用的结果累加器
+
+    支持普通字典事件、LazyEvent以及typed=True产出的StreamEvent对象，不支持raw=True产出的字节帧。
+
+    Attributes:
+        task_id (str): 任务ID
+        message_id (str): 消息ID（对话类应用）
+        conversation_id (str): 会话ID（对话类应用）
+        workflow_run_id (str): 工作流运行ID（Workflow/Chatflow）
+        status (str): 最终状态，"succeeded"、"failed"、"stopped"等；收到error事件时为"failed"
+        error (str): 错误信息
+        outputs (Dict[str, Any]): 工作流的最终输出
+        usage (Dict[str, Any]): 模型用量信息（message_end事件中的metadata.usage）
+        metadata (Dict[str, Any]): message_end事件中的完整metadata
+        total_tokens (int): 消耗的token总数
+        elapsed_time (float): 服务端报告的总耗时(秒)
+        nodes (Dict[str, Dict[str, Any]]): 按node_id记录的节点结果，包含title、node_type、status、
+            error、outputs、elapsed_time和total_tokens，按节点结束的顺序排列
+        thoughts (List[Dict[str, Any]]): Agent的思考步骤（agent_thought事件）
+        files (List[Dict[str, Any]]): message_file事件中的文件
+        event_count (int): 已处理的事件数
+        duration (float): 从第一个事件到最后一个事件的客户端耗时(秒)
+        recovered (bool): 结果是否来自断线恢复
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._text: Optional[str] = None
+        self.task_id: Optional[str] = None
+        self.message_id: Optional[str] = None
+        self.conversation_id: Optional[str] = None
+        self.workflow_run_id: Optional[str] = None
+        self.status: Optional[str] = None
+        self.error: Optional[str] = None
+        self.outputs: Optional[Dict[str, Any]] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.metadata: Optional[Dict[str, Any]] = None
+        self.total_tokens: Optional[int] = None
+        self.elapsed_time: Optional[float] = None
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.thoughts: List[Dict[str, Any]] = []
+        self.files: List[Dict[str, Any]] = []
+        self.event_count = 0
+        self.recovered = False
+        self._first_at: Optional[float] = None
+        self._last_at: Optional[float] = None
+
+    @classmethod
+    def collect(cls, events: Iterable[Any]) -> "StreamResult":
+        """
+        读完整个流并返回汇总结果。
+
+        Args:
+            events (Iterable[Any]): 流式方法返回的事件生成器
+
+        Returns:
+            StreamResult: 汇总结果
+        """
+        result = cls()
+        for event in events:
+            result.add(event)
+        return result
+
+    @classmethod
+    async def acollect(cls, events: AsyncIterable[Any]) -> "StreamResult":
+        """
+        collect的异步版本，用于异步客户端的流式方法。
+
+        Args:
+            events (AsyncIterable[Any]): 异步流式方法返回的事件生成器
+
+        Returns:
+            StreamResult: 汇总结果
+        """
+        result = cls()
+        async for event in events:
+            result.add(event)
+        return result
+
+    def wrap(self, events: Iterable[Any]) -> Iterator[Any]:
+        """
+        原样产出事件，同时累加到当前结果中。生成器被提前关闭时会关闭上游的流。
+
+        Args:
+            events (Iterable[Any]): 流式方法返回的事件生成器
+
+        Yields:
+            Any: 上游的事件
+        """
+        try:
+            for event in events:
+                self.add(event)
+                yield event
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+
+    async def awrap(self, events: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        """
+        wrap的异步版本。
+
+        Args:
+            events (AsyncIterable[Any]): 异步流式方法返回的事件生成器
+
+        Yields:
+            Any: 上游的事件
+        """
+        try:
+            async for event in events:
+                self.add(event)
+                yield event
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def add(self, event: Any):
+        """
+        累加一个事件。
+
+        Args:
+            event (Any): 字典事件、LazyEvent或StreamEvent
+        """
+        if isinstance(event, (bytes, bytearray)):
+            raise TypeError("StreamResult不支持raw=True产出的SSE字节帧")
+        if isinstance(event, StreamEvent):
+            event = event.to_dict()
+
+        now = time.monotonic()
+        if self._first_at is None:
+            self._first_at = now
+        self._last_at = now
+        self.event_count += 1
+
+        event_type = event.get("event")
+        if event_type == "ping":
+            return
+
+        text_field = _TEXT_EVENTS.get(event_type)
+        if text_field is not None:
+            self._append(event.get(text_field))
+        elif event_type == "text_chunk":
+            self._append((event.get("data") or {}).get("text"))
+        elif event_type == "message_replace":
+            self._parts = [event.get("answer") or ""]
+            self._text = None
+
+        for name in ("task_id", "message_id", "conversation_id", "workflow_run_id"):
+            value = event.get(name)
+            if value:
+                setattr(self, name, value)
+        if event.get("recovered"):
+            self.recovered = True
+
+        handler = _HANDLERS.get(event_type)
+        if handler is not None:
+            handler(self, event)
+
+    def _append(self, text: Optional[str]):
+        if text:
+            self._parts.append(text)
+            self._text = None
+
+    def _on_node_finished(self, event: Dict[str, Any]):
+        data = event.get("data") or {}
+        metadata = data.get("execution_metadata") or {}
+        node_id = data.get("node_id") or data.get("id")
+        self.nodes[node_id] = {
+            "title": data.get("title"),
+            "node_type": data.get("node_type"),
+            "status": data.get("status"),
+            "error": data.get("error"),
+            "outputs": data.get("outputs"),
+            "elapsed_time": data.get("elapsed_time"),
+            "total_tokens": metadata.get("total_tokens"),
+        }
+
+    def _on_workflow_finished(self, event: Dict[str, Any]):
+        data = event.get("data") or {}
+        self.status = data.get("status")
+        self.error = data.get("error")
+        self.outputs = data.get("outputs")
+        self.total_tokens = data.get("total_tokens")
+        self.elapsed_time = data.get("elapsed_time")
+
+    def _on_message_end(self, event: Dict[str, Any]):
+        self.metadata = event.get("metadata")
+        self.usage = (self.metadata or {}).get("usage")
+        if self.usage:
+            self.total_tokens = self.usage.get("total_tokens", self.total_tokens)
+            self.elapsed_time = self.usage.get("latency", self.elapsed_time)
+        if self.status is None:
+            self.status = "succeeded"
+
+    def _on_agent_thought(self, event: Dict[str, Any]):
+        self.thoughts.append(dict(event))
+
+    def _on_message_file(self, event: Dict[str, Any]):
+        self.files.append(dict(event))
+
+    def _on_error(self, event: Dict[str, Any]):
+        self.status = "failed"
+        self.error = event.get("message")
+
+    @property
+    def text(self) -> str:
+        """拼接后的完整文本，只在内容变化后第一次读取时拼接"""
+        if self._text is None:
+            self._text = "".join(self._parts)
+            self._parts = [self._text] if self._text else []
+        return self._text
+
+    @property
+    def answer(self) -> str:
+        """text的别名，与对话类应用的answer字段对应"""
+        return self.text
+
+    @property
+    def succeeded(self) -> bool:
+        """调用是否成功结束"""
+        return self.status == "succeeded"
+
+    @property
+    def duration(self) -> Optional[float]:
+        """从第一个事件到最后一个事件的客户端耗时(秒)"""
+        if self._first_at is None:
+            return None
+        return self._last_at - self._first_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典，便于序列化。
+
+        Returns:
+            Dict[str, Any]: 结果字典
+        """
+        return {
+            "text": self.text,
+            "task_id": self.task_id,
+            "message_id": self.message_id,
+            "conversation_id": self.conversation_id,
+            "workflow_run_id": self.workflow_run_id,
+            "status": self.status,
+            "error": self.error,
+            "outputs": self.outputs,
+            "usage": self.usage,
+            "total_tokens": self.total_tokens,
+            "elapsed_time": self.elapsed_time,
+            "nodes": self.nodes,
+            "thoughts": self.thoughts,
+            "files": self.files,
+            "event_count": self.event_count,
+            "duration": self.duration,
+            "recovered": self.recovered,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"StreamResult(status={self.status!r}, events={self.event_count}, "
+            f"text={len(self.text)} chars)"
+        )
+
+
+_HANDLERS = {
+    "node_finished": StreamResult._on_node_finished,
+    "workflow_finished": StreamResult._on_workflow_finished,
+    "message_end": StreamResult._on_message_end,
+    "agent_thought": StreamResult._on_agent_thought,
+    "message_file": StreamResult._on_message_file,
+    "error": StreamResult._on_error,
+}
@@ -0,0 +1,426 @@
+"""
+Pydify - 重试策略
+
+此模块提供可配置的请求重试策略，支持指数退避、全抖动(full jitter)、最大等待时间、
+服务端Retry-After响应头以及跨请求共享的重试预算，避免服务过载时产生同步的重试风暴。
+"""
+
+import asyncio
+import collections
+import copy
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple, Type
+
+import requests
+
+from .forking import _register_after_fork
+
+logger = logging.getLogger("pydify")
+
+# 默认可重试的HTTP状态码
+DEFAULT_RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# 默认愿意按Retry-After等待的最长时间(秒)
+DEFAULT_MAX_RETRY_AFTER = 300.0
+
+
+class RetryBudget:
+    """重试预算
+
+    限制一段时间窗口内重试请求占正常请求的比例，防止服务端已经过载时客户端继续放大流量。
+    在ttl秒的窗口内，允许的重试次数为 min_retries_per_second * ttl + ratio * 请求数。
+
+    同一个预算对象可以在多个客户端和线程之间共享。
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_retries_per_second: float = 1.0,
+        ttl: float = 10.0,
+    ):
+        """
+        Args:
+            ratio (float, optional): 允许的重试次数与请求次数之比。默认为0.2
+            min_retries_per_second (float, optional): 请求量很低时每秒至少允许的重试次数。默认为1
+            ttl (float, optional): 统计窗口长度(秒)。默认为10秒
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.ttl = ttl
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # 只序列化配置，每个进程各自统计
+        return (self.__class__, (self.ratio, self.min_retries_per_second, self.ttl))
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        for queue in (self._requests, self._retries):
+            while queue and queue[0] < cutoff:
+                queue.popleft()
+
+    def record_request(self):
+        """记录一次新的请求（不包括重试）"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """
+        尝试从预算中取出一次重试。
+
+        Returns:
+            bool: 预算充足时返回True并记录本次重试，否则返回False
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            allowed = self.min_retries_per_second * self.ttl + self.ratio * len(
+                self._requests
+            )
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    """请求重试策略
+
+    第n次重试（从0开始计数）前的等待时间为 [0, min(max_delay, base_delay * 2^n)] 之间的随机值，
+    即"全抖动"指数退避。如果服务端返回了Retry-After响应头，则按其要求等待，不受max_delay限制；
+    要求的等待时间超过max_retry_after时不再重试，而不是提前重试。
+
+    示例:
+        ```python
+        policy = RetryPolicy(max_retries=5, base_delay=0.5, max_delay=20)
+        client = WorkflowClient(api_key="your_api_key", retry_policy=policy)
+        ```
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        jitter: bool = True,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        respect_retry_after: bool = True,
+        retry_on_network_errors: bool = True,
+        budget: Optional[RetryBudget] = None,
+        max_retry_after: Optional[float] = DEFAULT_MAX_RETRY_AFTER,
+    ):
+        """
+        Args:
+            max_retries (int, optional): 最大重试次数，0表示不重试。默认为2
+            base_delay (float, optional): 退避的基础等待时间(秒)。默认为1秒
+            max_delay (float, optional): 单次等待时间上限(秒)。默认为30秒
+            jitter (bool, optional): 是否使用全抖动。为False时按确定的指数退避等待。默认为True
+            retry_statuses (Iterable[int], optional): 需要重试的HTTP状态码。默认为429和5xx网关类错误
+            respect_retry_after (bool, optional): 是否遵循服务端的Retry-After响应头。默认为True
+            retry_on_network_errors (bool, optional): 连接错误、超时等网络错误是否重试。默认为True
+            budget (RetryBudget, optional): 重试预算，预算耗尽时不再重试。默认为None，即不限制
+            max_retry_after (float, optional): 愿意按Retry-After等待的最长时间(秒)，服务端要求等待更久时不再重试。
+                None表示不限制。默认为300秒
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.retry_on_network_errors = retry_on_network_errors
+        self.budget = budget
+        self.max_retry_after = max_retry_after
+
+    def replace(self, **changes) -> "RetryPolicy":
+        """
+        返回修改了部分参数的策略副本，重试预算对象在副本之间共享。
+
+        Args:
+            **changes: 需要修改的参数，值为None的参数会被忽略
+
+        Returns:
+            RetryPolicy: 新的策略对象
+        """
+        policy = copy.copy(self)
+        for name, value in changes.items():
+            if value is not None:
+                setattr(policy, name, value)
+        return policy
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        """判断HTTP状态码是否需要重试"""
+        return status_code in self.retry_statuses
+
+    def record_request(self):
+        """在一次调用（不含重试）开始时记录到重试预算"""
+        if self.budget is not None:
+            self.budget.record_request()
+
+    def allow_retry(
+        self, attempt: int, delay: float = 0.0, deadline: Optional[float] = None
+    ) -> bool:
+        """
+        判断第attempt次尝试（从0开始）失败后是否还可以重试。
+
+        Args:
+            attempt (int): 已经失败的尝试序号
+            delay (float, optional): 重试前需要等待的时间(秒)。默认为0
+            deadline (float, optional): 整个调用的截止时间(time.monotonic())，等待结束时
+                已经超过截止时间则不再重试。默认为None，即不限制
+
+        Returns:
+            bool: 重试次数、截止时间和重试预算都允许时返回True
+        """
+        if attempt >= self.max_retries:
+            return False
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            logger.warning("调用的剩余时间不足以再次重试，放弃重试")
+            return False
+        if self.budget is not None and not self.budget.try_acquire():
+            logger.warning("重试预算已耗尽，放弃重试")
+            return False
+        return True
+
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算第attempt次重试前的等待时间。
+
+        Args:
+            attempt (int): 重试序号，从0开始
+            retry_after (float, optional): 服务端通过Retry-After要求的等待时间(秒)，
+                遵循Retry-After时原样使用，不受max_delay限制
+
+        Returns:
+            float: 等待时间(秒)
+        """
+        if retry_after is not None and self.respect_retry_after:
+            return max(retry_after, 0.0)
+
+        ceiling = min(self.max_delay, self.base_delay * (2**attempt))
+        if self.jitter:
+            return random.uniform(0, ceiling)
+        return ceiling
+
+    def accepts_retry_after(self, retry_after: Optional[float]) -> bool:
+        """
+        判断是否愿意按服务端要求的Retry-After等待后重试。
+
+        Args:
+            retry_after (float, optional): 服务端要求的等待时间(秒)
+
+        Returns:
+            bool: 要求的等待时间超过max_retry_after时返回False，此时应放弃重试而不是提前重试
+        """
+        if (
+            retry_after is None
+            or not self.respect_retry_after
+            or self.max_retry_after is None
+            or retry_after <= self.max_retry_after
+        ):
+            return True
+        logger.warning(
+            "服务端要求等待%.1f秒后重试，超过max_retry_after(%.1f秒)，放弃重试",
+            retry_after,
+            self.max_retry_after,
+        )
+        return False
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """
+        解析Retry-After响应头，支持秒数和HTTP日期两种格式。
+
+        Args:
+            value (str): 响应头的值
+
+        Returns:
+            Optional[float]: 需要等待的秒数，无法解析时返回None
+        """
+        if not value:
+            return None
+        value = value.strip()
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at is None:
+            return None
+        return max(retry_at.timestamp() - time.time(), 0.0)
+
+    def execute(
+        self,
+        send: Callable[[], requests.Response],
+        description: str = "请求",
+        rewind: Callable[[], bool] = None,
+        retry_exceptions: Tuple[Type[BaseException], ...] = (
+            requests.RequestException,
+            ConnectionError,
+        ),
+        deadline: Optional[float] = None,
+        on_retry: Optional[Callable[[int, float, Any], None]] = None,
+    ) -> requests.Response:
+        """
+        按照策略执行一次可重试的同步HTTP调用。
+
+        可重试的状态码在重试次数耗尽后会作为普通响应返回，由调用方决定如何报错；
+        网络异常在重试次数耗尽后原样抛出。
+
+        Args:
+            send (Callable[[], requests.Response]): 发送请求并返回响应的函数
+            description (str, optional): 用于日志的请求描述。默认为"请求"
+            rewind (Callable[[], bool], optional): 重试前调用，用于重置请求体（如文件指针）。
+                返回False表示请求体无法重放，此时不再重试
+            retry_exceptions (Tuple[Type[BaseException], ...], optional): 视为网络错误的异常类型
+            deadline (float, optional): 整个调用（包括所有重试和等待）的截止时间(time.monotonic())，
+                超过后不再发起重试。默认为None，即不限制
+            on_retry (Callable[[int, float, Any], None], optional): 决定重试后、等待前调用，
+                参数为失败的尝试序号、等待时间和失败原因（异常对象或状态码）
+
+        Returns:
+            requests.Response: 最后一次请求的响应
+        """
+        self.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = send()
+            except retry_exceptions as e:
+                delay = self._network_error_delay(
+                    e, attempt, description, rewind, deadline, on_retry
+                )
+                if delay is None:
+                    raise
+            else:
+                delay = self._response_delay(
+                    response, attempt, description, rewind, deadline, on_retry
+                )
+                if delay is None:
+                    return response
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def aexecute(
+        self,
+        send: Callable[[], Awaitable[Any]],
+        description: str = "请求",
+        rewind: Callable[[], bool] = None,
+        retry_exceptions: Tuple[Type[BaseException], ...] = (ConnectionError,),
+        deadline: Optional[float] = None,
+        on_retry: Optional[Callable[[int, float, Any], None]] = None,
+    ) -> Any:
+        """
+        execute的异步版本，重试等待期间不会阻塞事件循环。
+
+        Args:
+            send (Callable[[], Awaitable[Any]]): 发送请求并返回响应的协程函数
+            description (str, optional): 用于日志的请求描述。默认为"请求"
+            rewind (Callable[[], bool], optional): 重试前调用，用于重置请求体
+            retry_exceptions (Tuple[Type[BaseException], ...], optional): 视为网络错误的异常类型
+            deadline (float, optional): 整个调用的截止时间(time.monotonic())。默认为None
+            on_retry (Callable[[int, float, Any], None], optional): 决定重试后、等待前调用。默认为None
+
+        Returns:
+            Any: 最后一次请求的响应
+        """
+        self.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = await send()
+            except retry_exceptions as e:
+                delay = self._network_error_delay(
+                    e, attempt, description, rewind, deadline, on_retry
+                )
+                if delay is None:
+                    raise
+            else:
+                delay = self._response_delay(
+                    response, attempt, description, rewind, deadline, on_retry
+                )
+                if delay is None:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _network_error_delay(
+        self,
+        error: BaseException,
+        attempt: int,
+        description: str,
+        rewind: Optional[Callable[[], bool]],
+        deadline: Optional[float] = None,
+        on_retry: Optional[Callable[[int, float, Any], None]] = None,
+    ) -> Optional[float]:
+        """网络错误后需要等待的时间，不再重试时返回None"""
+        if not self.retry_on_network_errors:
+            return None
+        delay = self.get_delay(attempt)
+        if not self.allow_retry(attempt, delay, deadline):
+            return None
+        if rewind is not None and not rewind():
+            return None
+        logger.warning(
+            "%s网络错误(%s: %s)，%.2f秒后重试(%d/%d)",
+            description,
+            type(error).__name__,
+            error,
+            delay,
+            attempt + 1,
+            self.max_retries,
+        )
+        if on_retry is not None:
+            on_retry(attempt, delay, error)
+        return delay
+
+    def _response_delay(
+        self,
+        response: Any,
+        attempt: int,
+        description: str,
+        rewind: Optional[Callable[[], bool]],
+        deadline: Optional[float] = None,
+        on_retry: Optional[Callable[[int, float, Any], None]] = None,
+    ) -> Optional[float]:
+        """收到响应后需要等待的时间，响应无需重试或不再重试时返回None"""
+        if not self.is_retryable_status(response.status_code):
+            return None
+        retry_after = self.parse_retry_after(response.headers.get("Retry-After"))
+        if not self.accepts_retry_after(retry_after):
+            return None
+        delay = self.get_delay(attempt, retry_after)
+        if not self.allow_retry(attempt, delay, deadline):
+            return None
+        if rewind is not None and not rewind():
+            return None
+        logger.warning(
+            "%s失败，状态码: %s，%.2f秒后重试(%d/%d)",
+            description,
+            response.status_code,
+            delay,
+            attempt + 1,
+            self.max_retries,
+        )
+        if on_retry is not None:
+            on_retry(attempt, delay, response.status_code)
+        return delay
@@ -5,12 +5,19 @@ Pydify - Dify 网站API交互
 """
 
 import time
-from typing import Callable, List, Union
+from typing import Any, Callable, Dict, List, Union
 
 import requests
 import yaml
 
+from .common import create_session
 from .config import *
+from .forking import _register_after_fork
+from .profiling import Profiler, _get_profiler
+from .retry import RetryPolicy
+
+# 幂等的HTTP方法，失败后重试不会产生重复的写入
+_IDEMPOTENT_METHODS = frozenset(["get", "head", "options", "put", "delete"])
 
 
 class DifySite:
@@ -18,20 +25,35 @@ class DifySite:
     Dify网站API交互类，提供与Dify平台管理API的交互功能
 
     此类封装了Dify平台的所有管理API，包括登录认证、应用管理、API密钥管理等功能。
-    初始化时会自动登录并获取访问令牌，后续所有API调用都会使用此令牌进行认证。
+    首次调用API（或读取access_token）时自动登录并获取访问令牌，后续所有API调用都会使用此令牌进行认证。
+
+    实例可以被序列化后传给其他进程，序列化时只保留地址、账号和配置，
+    在新进程中首次调用API时重新登录。
     """
 
-    def __init__(self, base_url, email, password):
+    def __init__(
+        self,
+        base_url,
+        email,
+        password,
+        retry_policy: RetryPolicy = None,
+        profile: Union[bool, Profiler, None] = None,
+        retry_non_idempotent: bool = False,
+    ):
         """
-        初始化DifySite实例并自动登录获取访问令牌
+        初始化DifySite实例，不发送请求，首次调用API时自动登录获取访问令牌
 
         Args:
             base_url (str): Dify平台的基础URL，例如 "http://sandanapp.com:11080"
             email (str): 登录邮箱账号
             password (str): 登录密码
-
-        Raises:
-            Exception: 登录失败时抛出异常，包含错误信息
+            retry_policy (RetryPolicy, optional): 请求失败（429、5xx或网络错误）时的重试策略。
+                默认为RetryPolicy()
+            profile (Union[bool, Profiler], optional): 是否记录每次请求的分阶段耗时，记录保存在site.profiler中。
+                开启后请求通过带连接池的会话发送。默认为None，即由PYDIFY_PROFILE环境变量决定
+            retry_non_idempotent (bool, optional): 创建、导入应用等非幂等的POST/PATCH请求是否也在5xx和网络错误时重试。
+                服务端可能在返回错误前已经完成写入，重试会产生重复的应用。
+                默认为False，即这类请求只在429时重试
         """
         if base_url.endswith("/"):
             base_url = base_url[:-1]
@@ -40,9 +62,85 @@ class DifySite:
         self.password = password
         self.access_token = None
         self.refresh_token = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_non_idempotent = retry_non_idempotent
+        self.profiler = _get_profiler(profile)
+        self._after_fork()
+        _register_after_fork(self)
+
+    def _after_fork(self):
+        """开启剖析时重新创建会话，不与父进程共用连接"""
+        self.session = None
+        if self.profiler is not None:
+            self.session = create_session(profile=True)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """序列化时丢弃会话和令牌，反序列化后在首次调用API时重新登录"""
+        state = self.__dict__.copy()
+        state.update(session=None, _access_token=None, refresh_token=None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._after_fork()
+        _register_after_fork(self)
+
+    @property
+    def access_token(self) -> str:
+        """访问令牌，尚未登录时（例如刚创建或反序列化后）先登录获取
+
+        Raises:
+            Exception: 登录失败时抛出异常，包含错误信息
+        """
+        if self._access_token is None:
+            self._login()
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, access_token: str):
+        self._access_token = access_token
+
+    def _request(
+        self, method: str, url: str, idempotent: bool = None, **kwargs
+    ) -> requests.Response:
+        """
+        按照重试策略发送HTTP请求。
+
+        可重试的状态码在重试次数耗尽后会原样返回，由调用方检查状态码并报错。
+        非幂等的请求默认只在429时重试，避免服务端已经完成写入后重复执行。
 
-        # 自动登录并获取访问令牌
-        self._login()
+        Args:
+            method (str): HTTP方法名，如"get"、"post"
+            url (str): 完整的请求URL
+            idempotent (bool, optional): 请求是否可以安全地重复执行。默认为None，即按HTTP方法判断
+            **kwargs: 传递给requests的其他参数
+
+        Returns:
+            requests.Response: 请求响应对象
+        """
+        policy = self.retry_policy
+        if idempotent is None:
+            idempotent = method in _IDEMPOTENT_METHODS
+        if not idempotent and not self.retry_non_idempotent:
+            policy = policy.replace(
+                retry_statuses=policy.retry_statuses & {429},
+                retry_on_network_errors=False,
+            )
+        if self.profiler is None:
+            send = getattr(requests, method)
+            return policy.execute(
+                lambda: send(url, **kwargs),
+                description=f"{method.upper()} {url}",
+            )
+        endpoint = url[len(self.base_url) :]
+        return policy.execute(
+            lambda: self.profiler.measure(
+                method,
+                endpoint,
+                lambda: self.session.request(method, url, **kwargs),
+            ),
+            description=f"{method.upper()} {url}",
+        )
 
     def _login(self):
         """
@@ -58,7 +156,8 @@ class DifySite:
             "password": self.password,
             "remember_me": True,
         }
-        response = requests.post(url, json=data)
+        # 登录不会产生写入，可以安全地重试
+        response = self._request("post", url, idempotent=True, json=data)
         if response.status_code != 200:
             raise Exception(f"登录失败: {response.text}")
 
@@ -130,8 +229,8 @@ class DifySite:
         url = f"{self.base_url}/console/api/apps?" + "&".join(params)
 
         # 发送请求
-        response = requests.get(
-            url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(f"获取应用失败: {response.text}")
@@ -168,8 +267,8 @@ class DifySite:
         export_url = (
             f"{self.base_url}/console/api/apps/{app_id}/export?include_secret=false"
         )
-        response = requests.get(
-            export_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", export_url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(f"获取DSL失败: {response.text}")
@@ -198,7 +297,8 @@ class DifySite:
 
         if app_id:
             payload["app_id"] = app_id
-        response = requests.post(
+        response = self._request(
+            "post",
             import_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -252,7 +352,8 @@ class DifySite:
             "icon_background": "#FFEAD5",
             "icon_type": "emoji",
         }
-        response = requests.post(
+        response = self._request(
+            "post",
             create_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -303,8 +404,8 @@ class DifySite:
                 - deleted_tools (list): 已删除的工具列表
         """
         get_url = f"{self.base_url}/console/api/apps/{app_id}"
-        response = requests.get(
-            get_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", get_url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
 
         if response.status_code != 200:
@@ -331,8 +432,8 @@ class DifySite:
                 - created_at (int): 创建时间戳
         """
         create_url = f"{self.base_url}/console/api/apps/{app_id}/api-keys"
-        response = requests.post(
-            create_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "post", create_url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 201:
             raise Exception(f"创建API密钥失败: {response.text}")
@@ -357,8 +458,8 @@ class DifySite:
                 - created_at (int): 创建时间戳
         """
         get_url = f"{self.base_url}/console/api/apps/{app_id}/api-keys"
-        response = requests.get(
-            get_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", get_url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(f"获取API密钥列表失败: {response.text}")
@@ -379,8 +480,10 @@ class DifySite:
             dict: 删除操作的响应数据，如果删除成功，通常返回空对象{}
         """
         delete_url = f"{self.base_url}/console/api/apps/{app_id}/api-keys/{api_key_id}"
-        response = requests.delete(
-            delete_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "delete",
+            delete_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
         )
         if response.status_code != 204:
             raise Exception(f"删除API密钥失败: {response.text}")
@@ -411,8 +514,10 @@ class DifySite:
             dict: 删除操作的响应数据，如果删除成功，通常返回空对象{}
         """
         delete_url = f"{self.base_url}/console/api/apps/{app_id}"
-        response = requests.delete(
-            delete_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "delete",
+            delete_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
         )
         if response.status_code != 204:
             raise Exception(f"删除应用失败: {response.text}")
@@ -449,7 +554,8 @@ class DifySite:
             "icon_type": "emoji",
             "use_icon_as_answer_icon": True,
         }
-        response = requests.put(
+        response = self._request(
+            "put",
             update_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -469,8 +575,8 @@ class DifySite:
                 - binding_count (str): 标签绑定数量
         """
         url = f"{self.base_url}/console/api/tags?type=app"
-        response = requests.get(
-            url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(f"获取标签列表失败: {response.text}")
@@ -504,8 +610,11 @@ class DifySite:
             "name": name,
             "type": "app",
         }
-        response = requests.post(
-            url, headers={"Authorization": f"Bearer {self.access_token}"}, json=payload
+        response = self._request(
+            "post",
+            url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            json=payload,
         )
         if response.status_code != 200:
             raise Exception(f"创建标签失败 {response.status_code} {response.text}")
@@ -525,8 +634,10 @@ class DifySite:
             dict: 删除操作的响应数据，如果删除成功，通常返回空对象{}
         """
         delete_url = f"{self.base_url}/console/api/tags/{tag_id}"
-        response = requests.delete(
-            delete_url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "delete",
+            delete_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
         )
         if response.status_code != 204:
             raise Exception(f"删除标签失败: {response.text}")
@@ -553,7 +664,8 @@ class DifySite:
         payload = {
             "name": name,
         }
-        response = requests.patch(
+        response = self._request(
+            "patch",
             update_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -584,7 +696,8 @@ class DifySite:
             "tag_ids": tag_ids,
             "type": "app",
         }
-        response = requests.post(
+        response = self._request(
+            "post",
             bind_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -615,7 +728,8 @@ class DifySite:
             "tag_ids": tag_ids,
             "type": "app",
         }
-        response = requests.post(
+        response = self._request(
+            "post",
             remove_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -646,8 +760,8 @@ class DifySite:
                 - labels (list): 工具提供者的标签列表，如"productivity"等分类
         """
         url = f"{self.base_url}/console/api/workspaces/current/tool-providers"
-        response = requests.get(
-            url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(f"获取工具提供者列表失败: {response.text}")
@@ -665,7 +779,8 @@ class DifySite:
 
         publish_url = f"{self.base_url}/console/api/apps/{app_id}/workflows/publish"
         payload = {"marked_comment": "", "marked_name": ""}
-        response = requests.post(
+        response = self._request(
+            "post",
             publish_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -700,7 +815,8 @@ class DifySite:
             "privacy_policy": privacy_policy if privacy_policy is not None else "",
             "workflow_app_id": workflow_app_id,
         }
-        response = requests.post(
+        response = self._request(
+            "post",
             create_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -784,7 +900,8 @@ class DifySite:
             "privacy_policy": privacy_policy,
             "workflow_tool_id": workflow_tool_id,
         }
-        response = requests.post(
+        response = self._request(
+            "post",
             publish_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
@@ -835,8 +952,8 @@ class DifySite:
             url = f"{self.base_url}/console/api/workspaces/current/tool-provider/workflow/get?workflow_tool_id={workflow_tool_id}"
         else:
             url = f"{self.base_url}/console/api/workspaces/current/tool-provider/workflow/get?workflow_app_id={workflow_app_id}"
-        response = requests.get(
-            url, headers={"Authorization": f"Bearer {self.access_token}"}
+        response = self._request(
+            "get", url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if response.status_code != 200:
             raise Exception(
@@ -850,7 +967,8 @@ class DifySite:
         """
         delete_url = f"{self.base_url}/console/api/workspaces/current/tool-provider/workflow/delete"
         payload = {"workflow_tool_id": workflow_tool_id}
-        response = requests.post(
+        response = self._request(
+            "post",
             delete_url,
             headers={"Authorization": f"Bearer {self.access_token}"},
             json=payload,
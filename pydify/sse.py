@@ -0,0 +1,338 @@
+"""
+Pydify - SSE流解析
+
+此模块提供增量式的Server-Sent Events解码器，直接处理HTTP响应的字节块，
+用于替代逐行拼接字符串的sseclient实现。
+"""
+
+import re
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+)
+
+# Dify的事件数据总是以"event"字段开头，用正则即可在不解码整个JSON的情况下取得事件类型
+_EVENT_TYPE_PATTERN = re.compile(rb'"event"\s*:\s*"([^"\\]*)"')
+
+
+class SSEEvent:
+    """单个SSE事件
+
+    Attributes:
+        event (str): 事件类型，未指定时为"message"
+        data (bytes): 事件的data字段，多行data以换行符连接，可以直接交给JSON解码器
+        id (str): 事件ID，未指定时为None
+        retry (int): 服务器建议的重连间隔(毫秒)，未指定时为None
+    """
+
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(
+        self,
+        data: bytes,
+        event: str = "message",
+        id: Optional[str] = None,
+        retry: Optional[int] = None,
+    ):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    def to_bytes(self) -> bytes:
+        """
+        重新编码为一个完整的SSE事件帧（以空行结尾），可以直接写入下游的HTTP响应。
+
+        Dify的事件都是单行data帧，此时只做一次字节拼接，不涉及JSON的解码和编码。
+        """
+        if (
+            self.event == "message"
+            and self.id is None
+            and self.retry is None
+            and b"\n" not in self.data
+        ):
+            return b"data: " + self.data + b"\n\n"
+        lines = []
+        if self.event != "message":
+            lines.append(b"event: " + self.event.encode("utf-8"))
+        if self.id is not None:
+            lines.append(b"id: " + self.id.encode("utf-8"))
+        if self.retry is not None:
+            lines.append(b"retry: " + str(self.retry).encode("ascii"))
+        lines.extend(b"data: " + line for line in self.data.split(b"\n"))
+        return b"\n".join(lines) + b"\n\n"
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data[:50]!r})"
+
+
+class SSEDecoder:
+    """增量式SSE解码器
+
+    将任意切分的字节块解码为完整的SSE事件。内部使用一个可复用的bytearray缓冲区，
+    每次喂入数据后只从上次扫描的位置继续查找事件分隔符，已解析的数据一次性从缓冲区移除，
+    避免逐行拼接字符串带来的重复拷贝。
+
+    最常见的单行"data: {...}"事件会走快速路径，data字段只拷贝一次。
+
+    示例:
+        ```python
+        decoder = SSEDecoder()
+        for chunk in response.iter_content(chunk_size=None):
+            for event in decoder.feed(chunk):
+                handle(json.loads(event.data))
+        for event in decoder.flush():
+            handle(json.loads(event.data))
+        ```
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pending_cr = False
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """
+        喂入一段字节数据，返回其中已经完整的事件。
+
+        Args:
+            chunk (bytes): 从响应中读取到的字节块，可以在任意位置被切分
+
+        Returns:
+            List[SSEEvent]: 已完整接收的事件列表，可能为空
+        """
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+            self._pending_cr = False
+
+        # 统一换行符，结尾的\r需要等到下一块数据才能判断是否属于\r\n
+        if b"\r" in chunk:
+            if chunk.endswith(b"\r"):
+                chunk = chunk[:-1]
+                self._pending_cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        buffer = self._buffer
+        # 分隔符可能跨越上一块数据的末尾，因此从缓冲区末尾前一个字节开始扫描
+        scan_from = max(len(buffer) - 1, 0)
+        buffer += chunk
+
+        events = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n\n", scan_from)
+            if end == -1:
+                break
+            event = self._parse_frame(buffer, start, end)
+            if event is not None:
+                events.append(event)
+            start = scan_from = end + 2
+
+        if start:
+            del buffer[:start]
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        在数据流结束时调用，返回缓冲区中剩余的最后一个事件（如果有）。
+
+        Returns:
+            List[SSEEvent]: 剩余的事件列表，可能为空
+        """
+        self._pending_cr = False
+        buffer = self._buffer
+        end = len(buffer)
+        while end and buffer[end - 1] == 0x0A:
+            end -= 1
+        event = self._parse_frame(buffer, 0, end) if end else None
+        buffer.clear()
+        return [event] if event is not None else []
+
+    @staticmethod
+    def _parse_frame(buffer: bytearray, start: int, end: int) -> Optional[SSEEvent]:
+        """解析buffer[start:end]范围内的一个事件，没有data字段的事件按规范不分发"""
+        # 快速路径: 单行data事件，这是Dify流式响应中绝大多数事件的格式
+        if buffer.startswith(b"data:", start) and buffer.find(b"\n", start, end) == -1:
+            data_start = start + 5
+            if data_start < end and buffer[data_start] == 0x20:
+                data_start += 1
+            if data_start >= end:
+                return None
+            return SSEEvent(bytes(buffer[data_start:end]))
+
+        event_type = "message"
+        event_id = None
+        retry = None
+        data_lines = []
+        for line in bytes(buffer[start:end]).split(b"\n"):
+            # 空行和以冒号开头的注释行被忽略
+            if not line or line.startswith(b":"):
+                continue
+
+            field, _, value = line.partition(b":")
+            if value.startswith(b" "):
+                value = value[1:]
+
+            if field == b"data":
+                data_lines.append(value)
+            elif field == b"event":
+                event_type = value.decode("utf-8") or "message"
+            elif field == b"id":
+                event_id = value.decode("utf-8")
+            elif field == b"retry" and value.isdigit():
+                retry = int(value)
+
+        data = data_lines[0] if len(data_lines) == 1 else b"\n".join(data_lines)
+        if not data:
+            return None
+        return SSEEvent(data, event_type, event_id, retry)
+
+
+def iter_sse_events(chunks: Iterable[bytes]) -> Iterator[SSEEvent]:
+    """
+    从字节块迭代器中逐个解码SSE事件。
+
+    Args:
+        chunks (Iterable[bytes]): 字节块迭代器，例如response.iter_content(chunk_size=None)
+
+    Yields:
+        SSEEvent: 解码出的事件
+    """
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        if chunk:
+            yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_sse_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """
+    从异步字节块迭代器中逐个解码SSE事件。
+
+    Args:
+        chunks (AsyncIterable[bytes]): 异步字节块迭代器，例如httpx响应的aiter_bytes()
+
+    Yields:
+        SSEEvent: 解码出的事件
+    """
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        if chunk:
+            for event in decoder.feed(chunk):
+                yield event
+    for event in decoder.flush():
+        yield event
+
+
+def peek_event_type(data: bytes) -> Optional[str]:
+    """
+    在不完整解码JSON的情况下读取事件的event字段。
+
+    Args:
+        data (bytes): SSE事件的data字段
+
+    Returns:
+        Optional[str]: 事件类型，如"text_chunk"；无法识别时返回None
+    """
+    match = _EVENT_TYPE_PATTERN.search(data)
+    if match is None:
+        return None
+    return match.group(1).decode("utf-8")
+
+
+def build_event_filter(
+    events: Optional[Iterable[str]] = None,
+    exclude_events: Optional[Iterable[str]] = None,
+) -> Optional[Callable[[str], bool]]:
+    """
+    根据白名单和黑名单构建事件过滤函数。
+
+    使用白名单时error事件总是会被保留，避免调用方在只关注部分事件时漏掉服务端错误。
+
+    Args:
+        events (Iterable[str], optional): 只保留这些类型的事件
+        exclude_events (Iterable[str], optional): 丢弃这些类型的事件
+
+    Returns:
+        Optional[Callable[[str], bool]]: 接受事件类型、返回是否保留的函数；
+            两个参数都未提供时返回None，表示不过滤
+    """
+    if events is None and exclude_events is None:
+        return None
+
+    include = None
+    if events is not None:
+        include = frozenset(events) | {"error"}
+    exclude = frozenset(exclude_events or ())
+
+    if include is None:
+        return lambda event_type: event_type not in exclude
+    return lambda event_type: event_type in include and event_type not in exclude
+
+
+class LazyEvent(Mapping):
+    """延迟解码的事件对象
+
+    事件类型在创建时已经通过peek_event_type取得，完整的JSON数据只在第一次按键访问时才解码。
+    只读取event字段或直接转发原始数据时，可以完全跳过大体积inputs/outputs的解码开销。
+
+    可以像只读字典一样使用:
+        ```python
+        for event in client.run(inputs, user, lazy=True):
+            if event.event == "workflow_finished":
+                print(event["data"]["outputs"])  # 此时才会解码
+        ```
+
+    Attributes:
+        event (str): 事件类型
+        raw (bytes): 原始的JSON字节
+    """
+
+    __slots__ = ("event", "raw", "_loads", "_decoded")
+
+    def __init__(
+        self,
+        raw: bytes,
+        loads: Callable[[bytes], Any],
+        event: Optional[str] = None,
+    ):
+        self.raw = raw
+        self._loads = loads
+        self._decoded = None
+        self.event = event if event is not None else peek_event_type(raw)
+
+    @property
+    def decoded(self) -> bool:
+        """是否已经解码"""
+        return self._decoded is not None
+
+    def to_dict(self) -> dict:
+        """
+        解码并返回完整的事件字典。
+
+        Raises:
+            ValueError: 当数据不是合法的JSON时
+        """
+        if self._decoded is None:
+            self._decoded = self._loads(self.raw)
+        return self._decoded
+
+    def __getitem__(self, key):
+        if key == "event" and self._decoded is None and self.event is not None:
+            return self.event
+        return self.to_dict()[key]
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"LazyEvent(event={self.event!r}, decoded={self.decoded})"
@@ -0,0 +1,1029 @@
+"""
+Pydify - 流式响应工具
+
+此模块提供流式请求的分段超时控制。一次流式调用被拆分为四个独立的时限:
+
+- connect: 建立TCP/TLS连接
+- first_byte: 从发出请求到收到第一块响应数据
+- idle: 相邻两块数据之间的最长间隔（Dify每10秒发送一次ping事件）
+- total: 整个流式调用的最长持续时间
+
+同步流由一个共享的看门狗线程监控，超时后直接关闭底层socket，阻塞中的读取会立即返回；
+异步流使用事件循环的定时器，不需要额外线程。
+
+此外还提供BufferedStream，在后台线程中读取同步流，让处理较慢的调用方不会拖慢服务端的发送；
+tee_stream/atee_stream，让多个调用方共享同一个流式连接；以及StreamTiming，记录首字延迟和
+相邻内容事件之间的间隔。
+"""
+
+import asyncio
+import collections
+import copy
+import heapq
+import itertools
+import logging
+import socket
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from .sse import peek_event_type
+
+logger = logging.getLogger("pydify")
+
+_INFINITY = float("inf")
+
+
+class StreamTimeouts:
+    """流式请求的分段超时设置
+
+    任一时限设置为None或0表示不限制。
+
+    示例:
+        ```python
+        # 卡住的流在30秒内被回收，整个调用最长10分钟
+        client = WorkflowClient(
+            api_key="your_api_key",
+            stream_timeouts=StreamTimeouts(connect=5, first_byte=30, idle=30, total=600),
+        )
+
+        # 单次调用覆盖部分设置
+        client.run(inputs, user, idle_timeout=15)
+        ```
+    """
+
+    CONNECT = "connect"
+    FIRST_BYTE = "first_byte"
+    IDLE = "idle"
+    TOTAL = "total"
+
+    def __init__(
+        self,
+        connect: Optional[float] = 10.0,
+        first_byte: Optional[float] = 60.0,
+        idle: Optional[float] = 60.0,
+        total: Optional[float] = 3600.0,
+    ):
+        """
+        Args:
+            connect (float, optional): 建立连接的超时时间(秒)。默认为10秒
+            first_byte (float, optional): 从发出请求到收到第一块数据的超时时间(秒)。默认为60秒
+            idle (float, optional): 相邻两块数据之间的最长间隔(秒)。默认为60秒
+            total (float, optional): 整个流式调用的最长持续时间(秒)，包括建立连接时的重试。
+                默认为3600秒
+        """
+        self.connect = connect or None
+        self.first_byte = first_byte or None
+        self.idle = idle or None
+        self.total = total or None
+
+    def replace(self, **changes) -> "StreamTimeouts":
+        """
+        返回修改了部分时限的副本。
+
+        Args:
+            **changes: 需要修改的时限，值为None的参数会被忽略，值为0表示取消该时限
+
+        Returns:
+            StreamTimeouts: 新的超时设置
+        """
+        timeouts = copy.copy(self)
+        for name, value in changes.items():
+            if value is not None:
+                setattr(timeouts, name, value or None)
+        return timeouts
+
+    @property
+    def watched(self) -> bool:
+        """是否有需要在读取数据期间监控的时限"""
+        return bool(self.first_byte or self.idle or self.total)
+
+    def __repr__(self) -> str:
+        return (
+            f"StreamTimeouts(connect={self.connect}, first_byte={self.first_byte}, "
+            f"idle={self.idle}, total={self.total})"
+        )
+
+
+class _Deadlines:
+    """单个流的截止时间
+
+    只在等待服务端数据时计算first_byte/idle时限，调用方处理事件所花的时间不计入空闲时间；
+    total时限从调用开始一直计算到流结束。
+    """
+
+    __slots__ = (
+        "idle",
+        "first_byte_deadline",
+        "total_deadline",
+        "wait_deadline",
+        "received",
+        "expired",
+    )
+
+    def __init__(self, timeouts: StreamTimeouts, started: float):
+        self.idle = timeouts.idle
+        self.first_byte_deadline = (
+            started + timeouts.first_byte if timeouts.first_byte else _INFINITY
+        )
+        self.total_deadline = started + timeouts.total if timeouts.total else _INFINITY
+        self.wait_deadline = _INFINITY
+        self.received = False
+        self.expired = None
+
+    def waiting(self, now: float):
+        """开始等待下一块数据"""
+        if self.received:
+            self.wait_deadline = now + self.idle if self.idle else _INFINITY
+        else:
+            self.wait_deadline = self.first_byte_deadline
+
+    def got_data(self):
+        """收到一块数据，等待结束"""
+        self.received = True
+        self.wait_deadline = _INFINITY
+
+    def next_deadline(self) -> float:
+        return min(self.wait_deadline, self.total_deadline)
+
+    def recheck_at(self, now: float) -> Optional[float]:
+        """
+        看门狗下一次需要检查的时间。
+
+        之后调用waiting()设置的空闲截止时间不会早于now + idle，因此最晚在一个idle间隔后重新检查，
+        就不会错过从first_byte切换到更短的idle时限的情况；没有任何时限需要监控时返回None。
+        """
+        deadline = self.next_deadline()
+        if self.idle:
+            deadline = min(deadline, now + self.idle)
+        return deadline if deadline != _INFINITY else None
+
+    def check(self, now: float) -> Optional[str]:
+        """返回已经超过的时限类型，未超时返回None"""
+        if now >= self.total_deadline:
+            return StreamTimeouts.TOTAL
+        if now >= self.wait_deadline:
+            return StreamTimeouts.IDLE if self.received else StreamTimeouts.FIRST_BYTE
+        return None
+
+
+class _Watchdog:
+    """监控所有同步流的后台线程
+
+    所有流共用一个守护线程和一个按截止时间排序的堆。每个事件只更新截止时间，不操作堆；
+    线程醒来时重新计算被推迟的截止时间，因此每个事件的额外开销只是两次时间读取。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self, guard: "StreamGuard"):
+        check_at = guard.deadlines.recheck_at(time.monotonic())
+        if check_at is None:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (check_at, next(self._counter), guard))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="pydify-stream-watchdog", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, guard = heapq.heappop(self._heap)
+                    if guard.closed:
+                        continue
+                    kind = guard.deadlines.check(now)
+                    if kind is not None:
+                        guard.abort(kind)
+                        continue
+                    # 截止时间在上次检查之后被推迟了，按新的时间重新排队
+                    check_at = guard.deadlines.recheck_at(now)
+                    if check_at is not None:
+                        heapq.heappush(
+                            self._heap, (check_at, next(self._counter), guard)
+                        )
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+
+_watchdog = _Watchdog()
+
+
+def _socket_of(response) -> Optional[socket.socket]:
+    """取得requests流式响应的底层socket，取不到时返回None"""
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "connection", None) or getattr(raw, "_connection", None)
+    return getattr(connection, "sock", None)
+
+
+def _abort_response(response):
+    """从其他线程断开流式响应的连接，阻塞中的读取会以网络错误的形式返回"""
+    sock = _socket_of(response)
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        else:
+            response.close()
+    except OSError:
+        pass
+
+
+class _StreamHandle:
+    """BufferedStream与后台线程中的流式调用共享的句柄，用于在调用方关闭时立即断开连接"""
+
+    __slots__ = ("response", "closed")
+
+    def __init__(self):
+        self.response = None
+        self.closed = False
+
+    def attach(self, response):
+        """由后台线程在建立连接后调用，调用方已经关闭时立即断开"""
+        self.response = response
+        if self.closed:
+            _abort_response(response)
+
+    def abort(self):
+        """由调用方线程调用，标记关闭并断开已经建立的连接"""
+        self.closed = True
+        response = self.response
+        if response is not None:
+            _abort_response(response)
+
+
+class StreamGuard:
+    """同步流的超时监控
+
+    超时后由看门狗线程关闭底层socket，阻塞中的读取会以网络错误的形式返回，
+    guarded_chunks再将其转换为对应的超时异常。
+    """
+
+    def __init__(
+        self,
+        response,
+        timeouts: StreamTimeouts,
+        started: float,
+        error_factory: Callable[[str], BaseException],
+    ):
+        """
+        Args:
+            response: requests的流式响应
+            timeouts (StreamTimeouts): 超时设置
+            started (float): 调用开始的时间(time.monotonic())
+            error_factory (Callable[[str], BaseException]): 根据超时类型构造异常
+        """
+        self.response = response
+        self.deadlines = _Deadlines(timeouts, started)
+        self.error_factory = error_factory
+        self.closed = False
+
+        # 响应头已经收到，后续读取的时限由看门狗控制，避免socket上的first_byte超时提前触发
+        sock = _socket_of(response)
+        if sock is not None:
+            try:
+                sock.settimeout(None)
+            except OSError:
+                pass
+
+    def abort(self, kind: str):
+        """由看门狗线程调用，标记超时并关闭连接"""
+        self.deadlines.expired = kind
+        logger.warning("流式响应%s超时，关闭连接", kind)
+        _abort_response(self.response)
+
+    def close(self):
+        self.closed = True
+
+    def guarded_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        在监控下逐块读取响应数据。
+
+        Raises:
+            BaseException: 超时时由error_factory构造的异常
+        """
+        deadlines = self.deadlines
+        iterator = iter(chunks)
+        clock = time.monotonic
+        deadlines.waiting(clock())
+        _watchdog.watch(self)
+        try:
+            while True:
+                now = clock()
+                kind = deadlines.expired or deadlines.check(now)
+                if kind is not None:
+                    raise self.error_factory(kind)
+                deadlines.waiting(now)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    if deadlines.expired is not None:
+                        raise self.error_factory(deadlines.expired) from e
+                    raise
+                if deadlines.expired is not None:
+                    # 数据在超时之后才到达，连接已经被放弃
+                    raise self.error_factory(deadlines.expired)
+                deadlines.got_data()
+                yield chunk
+        finally:
+            self.close()
+
+
+class AsyncStreamGuard:
+    """异步流的超时监控
+
+    使用事件循环的定时器代替看门狗线程。只有在等待服务端数据时才会取消当前任务，
+    调用方处理事件期间到期的total时限会在下一次读取前抛出。
+    """
+
+    def __init__(
+        self,
+        timeouts: StreamTimeouts,
+        started: float,
+        error_factory: Callable[[str], BaseException],
+    ):
+        self.deadlines = _Deadlines(timeouts, started)
+        self.error_factory = error_factory
+        self._waiting = False
+        self._task = None
+        self._timer = None
+        self._timer_at = _INFINITY
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        deadline = self.deadlines.next_deadline()
+        self._timer_at = deadline
+        if deadline == _INFINITY:
+            self._timer = None
+            return
+        # 截止时间基于time.monotonic()，换算为事件循环的时钟
+        self._timer = loop.call_at(
+            loop.time() + (deadline - time.monotonic()), self._on_timer, loop
+        )
+
+    def _on_timer(self, loop: asyncio.AbstractEventLoop):
+        kind = self.deadlines.check(time.monotonic())
+        if kind is None:
+            self._schedule(loop)
+            return
+        self.deadlines.expired = kind
+        self._timer = None
+        self._timer_at = _INFINITY
+        if self._waiting and self._task is not None:
+            logger.warning("流式响应%s超时，取消读取", kind)
+            self._task.cancel()
+
+    def _start_waiting(self):
+        self._task = asyncio.current_task()
+        self.deadlines.waiting(time.monotonic())
+        # 截止时间推迟时沿用现有定时器，到期后再重新安排；提前时（首个数据块之后换成更短的
+        # idle时限）需要立即重新安排
+        if self._timer is None or self.deadlines.next_deadline() < self._timer_at:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._schedule(asyncio.get_running_loop())
+        self._waiting = True
+
+    def _expired_error(self) -> Optional[BaseException]:
+        """在捕获到CancelledError时调用，如果取消是由超时触发的，撤销取消请求并返回超时异常"""
+        if self.deadlines.expired is None:
+            return None
+        uncancel = getattr(self._task, "uncancel", None)
+        if uncancel is not None:
+            uncancel()
+        return self.error_factory(self.deadlines.expired)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        在first_byte和total时限内等待一个协程，用于建立连接阶段。
+
+        Raises:
+            BaseException: 超时时由error_factory构造的异常
+        """
+        self._start_waiting()
+        try:
+            return await awaitable
+        except asyncio.CancelledError:
+            error = self._expired_error()
+            if error is None:
+                raise
+            raise error from None
+        finally:
+            self._waiting = False
+
+    def close(self):
+        """取消定时器，流结束或出错时调用"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_at = _INFINITY
+
+    async def guarded_chunks(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncIterator[bytes]:
+        """
+        在监控下逐块读取异步响应数据。
+
+        Raises:
+            BaseException: 超时时由error_factory构造的异常
+        """
+        deadlines = self.deadlines
+        iterator = chunks.__aiter__()
+        try:
+            while True:
+                kind = deadlines.expired or deadlines.check(time.monotonic())
+                if kind is not None:
+                    raise self.error_factory(kind)
+                self._start_waiting()
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    error = self._expired_error()
+                    if error is None:
+                        raise
+                    raise error from None
+                finally:
+                    self._waiting = False
+                deadlines.got_data()
+                yield chunk
+        finally:
+            self.close()
+
+
+class StreamTiming:
+    """一次流式调用的时间记录
+
+    所有时间都是相对于调用开始的秒数，尚未发生时为None。
+
+    Attributes:
+        connect (float): 收到响应头的时间，包括建立连接、发送请求和重试
+        first_byte (float): 收到第一块响应数据的时间
+        first_content (float): 收到第一个内容事件（message、agent_message或text_chunk）的时间，
+            即首字延迟(TTFT)
+        duration (float): 整个流式调用的时长，流结束或被关闭后才有值
+        events (int): 收到的事件数，包括之后被过滤掉的事件
+        content_events (int): 收到的内容事件数
+    """
+
+    CONTENT_EVENTS = frozenset(["message", "agent_message", "text_chunk"])
+
+    __slots__ = (
+        "started",
+        "connect",
+        "first_byte",
+        "first_content",
+        "duration",
+        "events",
+        "content_events",
+        "_last_content",
+        "_gaps",
+    )
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.first_byte: Optional[float] = None
+        self.first_content: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.events = 0
+        self.content_events = 0
+        self._last_content: Optional[float] = None
+        self._gaps: List[float] = []
+
+    def _start(self, started: float):
+        self.started = started
+
+    def _headers(self):
+        self.connect = time.monotonic() - self.started
+
+    def _watch(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """记录第一块数据到达的时间，之后原样转发"""
+        for chunk in chunks:
+            if self.first_byte is None:
+                self.first_byte = time.monotonic() - self.started
+            yield chunk
+
+    async def _awatch(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            if self.first_byte is None:
+                self.first_byte = time.monotonic() - self.started
+            yield chunk
+
+    def _event(self, event_type: Optional[str]):
+        self.events += 1
+        if event_type not in self.CONTENT_EVENTS:
+            return
+        now = time.monotonic()
+        self.content_events += 1
+        if self._last_content is None:
+            self.first_content = now - self.started
+        else:
+            self._gaps.append(now - self._last_content)
+        self._last_content = now
+
+    def _finish(self):
+        if self.started is not None and self.duration is None:
+            self.duration = time.monotonic() - self.started
+
+    @property
+    def gaps(self) -> List[float]:
+        """相邻两个内容事件之间的间隔(秒)"""
+        return list(self._gaps)
+
+    def gap_percentile(self, q: float) -> Optional[float]:
+        """
+        内容事件间隔的百分位数（最近秩法）。
+
+        Args:
+            q (float): 百分位，0到100之间
+
+        Returns:
+            Optional[float]: 间隔(秒)，少于两个内容事件时返回None
+        """
+        if not self._gaps:
+            return None
+        gaps = sorted(self._gaps)
+        rank = max(int(-(-q * len(gaps) // 100)), 1)
+        return gaps[min(rank, len(gaps)) - 1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典，便于记录日志或上报。
+
+        Returns:
+            Dict[str, Any]: 包含各项时间、事件数以及间隔的p50/p90/p99和最大值
+        """
+        return {
+            "connect": self.connect,
+            "first_byte": self.first_byte,
+            "first_content": self.first_content,
+            "duration": self.duration,
+            "events": self.events,
+            "content_events": self.content_events,
+            "gap_p50": self.gap_percentile(50),
+            "gap_p90": self.gap_percentile(90),
+            "gap_p99": self.gap_percentile(99),
+            "gap_max": max(self._gaps) if self._gaps else None,
+        }
+
+    def __repr__(self) -> str:
+        return f"StreamTiming({self.to_dict()})"
+
+
+def _event_type(event: Any) -> Optional[str]:
+    """取得事件类型，支持普通字典、LazyEvent和raw模式下的SSE事件帧"""
+    if isinstance(event, bytes):
+        return peek_event_type(event)
+    event_type = getattr(event, "event", None)
+    if event_type is None and isinstance(event, Mapping):
+        event_type = event.get("event")
+    return event_type
+
+
+def _coalesce(previous: Any, event: Any) -> bool:
+    """
+    把增量事件合并到队列中的上一个事件，成功时返回True。
+
+    只合并普通字典形式的同类增量事件：text_chunk合并data.text，message和agent_message合并answer。
+    LazyEvent和其他事件不会被合并。
+    """
+    if type(previous) is not dict or type(event) is not dict:
+        return False
+    event_type = event.get("event")
+    if previous.get("event") != event_type:
+        return False
+    if event_type == "text_chunk":
+        previous_data, data = previous.get("data"), event.get("data")
+        if not isinstance(previous_data, dict) or not isinstance(data, dict):
+            return False
+        if previous_data.get("from_variable_selector") != data.get(
+            "from_variable_selector"
+        ):
+            return False
+        previous_data["text"] = previous_data.get("text", "") + data.get("text", "")
+        return True
+    if event_type in ("message", "agent_message"):
+        if previous.get("message_id") != event.get("message_id"):
+            return False
+        previous["answer"] = previous.get("answer", "") + event.get("answer", "")
+        return True
+    return False
+
+
+class BufferedStream:
+    """在后台线程中读取流式事件的有界缓冲区
+
+    后台线程持续读取并解码SSE流，放入最多maxsize个事件的队列，调用方按自己的速度从队列中取出。
+    队列已满时按backpressure策略处理新事件:
+
+    - block: 后台线程等待调用方取出事件，服务端的发送随之变慢
+    - drop_pings: 丢弃ping事件，其他事件仍然等待
+    - coalesce: 在drop_pings的基础上，把连续的text_chunk/message/agent_message增量事件
+      合并到队列中的最后一个事件，其他事件仍然等待
+
+    调用close()后立即断开底层连接（需要传入handle），后台线程随即停止读取并关闭源生成器，
+    不必等到服务端发送下一个事件。
+
+    示例:
+        ```python
+        for event in client.run(inputs, user, buffer_size=256, backpressure="coalesce"):
+            save_to_db(event)  # 较慢的处理不会阻塞对SSE流的读取
+        ```
+    """
+
+    BLOCK = "block"
+    DROP_PINGS = "drop_pings"
+    COALESCE = "coalesce"
+
+    def __init__(
+        self,
+        events: Iterable[Any],
+        maxsize: int = 256,
+        backpressure: str = BLOCK,
+        handle: Optional[_StreamHandle] = None,
+    ):
+        """
+        Args:
+            events (Iterable[Any]): 源事件流，通常是post_stream返回的生成器
+            maxsize (int, optional): 队列中最多缓存的事件数。默认为256
+            backpressure (str, optional): 队列已满时的处理策略，取值为"block"、"drop_pings"或
+                "coalesce"。默认为"block"
+            handle (_StreamHandle, optional): 与源事件流共享的连接句柄，close()时通过它立即断开连接。
+                默认为None，即后台线程在收到下一个事件时才停止
+
+        Raises:
+            ValueError: 当maxsize小于1或backpressure不是支持的策略时
+        """
+        if maxsize < 1:
+            raise ValueError(f"maxsize必须大于0: {maxsize}")
+        if backpressure not in (self.BLOCK, self.DROP_PINGS, self.COALESCE):
+            raise ValueError(f"不支持的backpressure策略: {backpressure}")
+        self.maxsize = maxsize
+        self.backpressure = backpressure
+        self.dropped = 0
+        self.coalesced = 0
+        self._events = events
+        self._handle = handle
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._read, name="pydify-stream-reader", daemon=True
+        )
+        self._thread.start()
+
+    def _read(self):
+        """后台线程: 读取源事件流直到结束、出错或被关闭"""
+        try:
+            for event in self._events:
+                if not self._put(event):
+                    break
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+        finally:
+            close = getattr(self._events, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning("关闭流式响应失败: %s", e)
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def _put(self, event: Any) -> bool:
+        """放入一个事件，队列已满时按backpressure策略处理；缓冲区已关闭时返回False"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return False
+                if len(self._buffer) < self.maxsize:
+                    self._buffer.append(event)
+                    self._cond.notify_all()
+                    return True
+                if self.backpressure != self.BLOCK:
+                    if _event_type(event) == "ping":
+                        self.dropped += 1
+                        return True
+                    if self.backpressure == self.COALESCE and _coalesce(
+                        self._buffer[-1], event
+                    ):
+                        self.coalesced += 1
+                        return True
+                self._cond.wait()
+
+    def __iter__(self) -> "BufferedStream":
+        return self
+
+    def __next__(self) -> Any:
+        with self._cond:
+            while not self._buffer and not self._done:
+                self._cond.wait()
+            if self._buffer:
+                event = self._buffer.popleft()
+                self._cond.notify_all()
+                return event
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def close(self):
+        """停止读取并丢弃尚未取出的事件，断开底层连接，源生成器由后台线程随即关闭"""
+        with self._cond:
+            self._closed = True
+            self._buffer.clear()
+            self._cond.notify_all()
+        if self._handle is not None:
+            self._handle.abort()
+
+
+class _Tee:
+    """tee_stream的共享状态
+
+    不使用额外线程：缓冲区为空的消费者自己从上游读取下一个事件，并把同一个事件对象放入
+    其他消费者的缓冲区。任一仍在读取的消费者缓冲区已满时，读取方等待它取出事件。
+    """
+
+    def __init__(self, events: Iterable[Any], n: int, maxsize: int):
+        self.maxsize = maxsize
+        self._source = iter(events)
+        self._buffers = [collections.deque() for _ in range(n)]
+        self._open = [True] * n
+        self._cond = threading.Condition()
+        self._pulling = False
+        self._done = False
+        self._error = None
+
+    def _has_room(self, index: int) -> bool:
+        return all(
+            len(buffer) < self.maxsize
+            for i, buffer in enumerate(self._buffers)
+            if i != index and self._open[i]
+        )
+
+    def next(self, index: int) -> Any:
+        with self._cond:
+            while True:
+                buffer = self._buffers[index]
+                if buffer:
+                    event = buffer.popleft()
+                    self._cond.notify_all()
+                    return event
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    raise StopIteration
+                if not self._pulling and self._has_room(index):
+                    self._pulling = True
+                    break
+                self._cond.wait()
+
+        # 在锁外读取上游，读取期间其他消费者仍然可以取出自己缓冲区中的事件
+        try:
+            event = next(self._source)
+        except BaseException as e:
+            with self._cond:
+                self._pulling = False
+                self._done = True
+                if not isinstance(e, StopIteration):
+                    self._error = e
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._pulling = False
+            for i, buffer in enumerate(self._buffers):
+                if i != index and self._open[i]:
+                    buffer.append(event)
+            self._cond.notify_all()
+        return event
+
+    def close(self, index: int) -> bool:
+        """关闭一个消费者，返回是否需要关闭上游"""
+        with self._cond:
+            if not self._open[index]:
+                return False
+            self._open[index] = False
+            self._buffers[index].clear()
+            self._cond.notify_all()
+            if any(self._open) or self._done:
+                return False
+            self._done = True
+            return True
+
+    def close_source(self):
+        close = getattr(self._source, "close", None)
+        if close is not None:
+            close()
+
+
+class TeeIterator:
+    """tee_stream返回的单个消费者迭代器"""
+
+    def __init__(self, tee: _Tee, index: int):
+        self._tee = tee
+        self._index = index
+
+    def __iter__(self) -> "TeeIterator":
+        return self
+
+    def __next__(self) -> Any:
+        return self._tee.next(self._index)
+
+    def close(self):
+        """不再读取此迭代器，所有迭代器都关闭后上游流随之关闭"""
+        if self._tee.close(self._index):
+            self._tee.close_source()
+
+    def __del__(self):
+        # 垃圾回收可能发生在任意线程，此时上游可能正被其他消费者读取，
+        # 这里只标记消费者已关闭，上游生成器在被回收时自行关闭
+        self._tee.close(self._index)
+
+
+def tee_stream(
+    events: Iterable[Any], n: int = 2, maxsize: int = 256
+) -> Tuple[TeeIterator, ...]:
+    """
+    把一个流式响应分发给n个相互独立的迭代器，所有迭代器共享同一个上游连接。
+
+    每个事件对象只解码一次，并原样（不复制）交给每个消费者，因此消费者不应修改事件。
+    每个消费者最多缓存maxsize个尚未读取的事件，读得最快的消费者在其他消费者的缓冲区满时等待，
+    所以各消费者通常在各自的线程中读取；在同一线程中交替读取时，相互之间的差距不能超过maxsize。
+    上游出错时，每个消费者在读完已缓存的事件后都会收到同一个异常。
+
+    示例:
+        ```python
+        user_events, audit_events = tee_stream(client.run(inputs, user), n=2)
+        threading.Thread(target=audit_log, args=(audit_events,)).start()
+        for event in user_events:
+            send_to_user(event)
+        ```
+
+    Args:
+        events (Iterable[Any]): 上游事件流，通常是post_stream返回的生成器
+        n (int, optional): 消费者数量。默认为2
+        maxsize (int, optional): 每个消费者最多缓存的事件数。默认为256
+
+    Returns:
+        Tuple[TeeIterator, ...]: n个迭代器
+    """
+    if n < 1:
+        raise ValueError(f"n必须大于0: {n}")
+    if maxsize < 1:
+        raise ValueError(f"maxsize必须大于0: {maxsize}")
+    tee = _Tee(events, n, maxsize)
+    return tuple(TeeIterator(tee, i) for i in range(n))
+
+
+class _AsyncTee:
+    """atee_stream的共享状态，规则与_Tee相同，等待时不阻塞事件循环"""
+
+    def __init__(self, events: AsyncIterable[Any], n: int, maxsize: int):
+        self.maxsize = maxsize
+        self._source = events.__aiter__()
+        self._buffers = [collections.deque() for _ in range(n)]
+        self._open = [True] * n
+        self._changed = asyncio.Event()
+        self._pulling = False
+        self._done = False
+        self._error = None
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _has_room(self, index: int) -> bool:
+        return all(
+            len(buffer) < self.maxsize
+            for i, buffer in enumerate(self._buffers)
+            if i != index and self._open[i]
+        )
+
+    async def next(self, index: int) -> Any:
+        while True:
+            buffer = self._buffers[index]
+            if buffer:
+                event = buffer.popleft()
+                self._notify()
+                return event
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            if not self._pulling and self._has_room(index):
+                break
+            await self._changed.wait()
+
+        self._pulling = True
+        try:
+            event = await self._source.__anext__()
+        except BaseException as e:
+            self._done = True
+            if isinstance(e, asyncio.CancelledError):
+                # 取消只针对读取上游的任务，其他消费者看到的是流被中断
+                self._error = RuntimeError("读取上游流的任务被取消，流已中断")
+            elif not isinstance(e, StopAsyncIteration):
+                self._error = e
+            raise
+        finally:
+            self._pulling = False
+            self._notify()
+        for i, buffer in enumerate(self._buffers):
+            if i != index and self._open[i]:
+                buffer.append(event)
+        return event
+
+    def close(self, index: int) -> bool:
+        """关闭一个消费者，返回是否需要关闭上游"""
+        if not self._open[index]:
+            return False
+        self._open[index] = False
+        self._buffers[index].clear()
+        self._notify()
+        if any(self._open) or self._done:
+            return False
+        self._done = True
+        return True
+
+    async def aclose_source(self):
+        aclose = getattr(self._source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class AsyncTeeIterator:
+    """atee_stream返回的单个消费者异步迭代器"""
+
+    def __init__(self, tee: _AsyncTee, index: int):
+        self._tee = tee
+        self._index = index
+
+    def __aiter__(self) -> "AsyncTeeIterator":
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self._tee.next(self._index)
+
+    async def aclose(self):
+        """不再读取此迭代器，所有迭代器都关闭后上游流随之关闭"""
+        if self._tee.close(self._index):
+            await self._tee.aclose_source()
+
+    def __del__(self):
+        # 无法在这里等待上游关闭，上游生成器由事件循环在回收时关闭
+        self._tee.close(self._index)
+
+
+def atee_stream(
+    events: AsyncIterable[Any], n: int = 2, maxsize: int = 256
+) -> Tuple[AsyncTeeIterator, ...]:
+    """
+    tee_stream的异步版本，把异步客户端的post_stream分发给n个异步迭代器。
+
+    各消费者通常在各自的任务中读取，例如:
+        ```python
+        user_events, audit_events = atee_stream(client.run(inputs, user), n=2)
+        await asyncio.gather(send_to_user(user_events), audit_log(audit_events))
+        ```
+
+    Args:
+        events (AsyncIterable[Any]): 上游异步事件流
+        n (int, optional): 消费者数量。默认为2
+        maxsize (int, optional): 每个消费者最多缓存的事件数。默认为256
+
+    Returns:
+        Tuple[AsyncTeeIterator, ...]: n个异步迭代器
+    """
+    if n < 1:
+        raise ValueError(f"n必须大于0: {n}")
+    if maxsize < 1:
+        raise ValueError(f"maxsize必须大于0: {maxsize}")
+    tee = _AsyncTee(events, n, maxsize)
+    return tuple(AsyncTeeIterator(tee, i) for i in range(n))
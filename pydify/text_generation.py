@@ -6,8 +6,19 @@ Text Generation文本生成应用无会话支持，适合用于翻译、文章
 """
 
 import os
-from typing import Any, Dict, Generator, List, Optional, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 
+from .batch import BatchResult, BatchStats
 from .common import DifyBaseClient, DifyType
 
 
@@ -137,6 +148,7 @@ class TextGenerationClient(DifyBaseClient):
             inputs (Dict[str, Any], optional): 额外的输入参数。默认为None，若提供，会与query合并
             files (List[Dict[str, Any]], optional): 要包含在消息中的文件列表，每个文件为一个字典。默认为None
             **kwargs: 额外的请求参数，如timeout、max_retries等
+                流式模式下还支持events、exclude_events和lazy，详见post_stream
 
         Returns:
             Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
@@ -171,6 +183,75 @@ class TextGenerationClient(DifyBaseClient):
         else:
             return self.post(endpoint, json_data=payload, **kwargs)  # 传递kwargs
 
+    def completion_batch(
+        self,
+        queries: Iterable[Union[str, Dict[str, Any]]],
+        user: str,
+        concurrency: int = 4,
+        response_mode: str = "blocking",
+        inputs: Dict[str, Any] = None,
+        ordered: bool = True,
+        item_retries: int = 0,
+        on_progress: Callable[[BatchResult, BatchStats], None] = None,
+        max_pending: int = None,
+        **kwargs,
+    ) -> Iterator[BatchResult]:
+        """
+        以有限的并发数批量调用文本生成应用，每条输入执行一次completion。
+
+        并发、重试和错误处理与WorkflowClient.run_batch相同。
+
+        Args:
+            queries (Iterable[Union[str, Dict[str, Any]]]): 每条输入，可以是query字符串，
+                也可以是包含query和其他变量的inputs字典。按需读取，可以是生成器
+            user (str): 用户标识
+            concurrency (int, optional): 同时执行的调用数。默认为4
+            response_mode (str, optional): 'blocking'时每条结果为响应字典；'streaming'时在内部读完
+                整个流，每条结果为StreamResult，文本在StreamResult.text中。默认为'blocking'
+            inputs (Dict[str, Any], optional): 所有输入共用的变量，会与每条输入合并。默认为None
+            ordered (bool, optional): 为True时按输入顺序产出结果，否则按完成顺序产出。默认为True
+            item_retries (int, optional): 单条输入因网络错误、429或5xx失败时重新执行的次数。默认为0
+            on_progress (Callable[[BatchResult, BatchStats], None], optional): 每条输入完成时调用。默认为None
+            max_pending (int, optional): 已读取但尚未产出的输入数上限。默认为concurrency的4倍
+            **kwargs: 传递给completion的其他参数，如files、timeout
+
+        Returns:
+            Iterator[BatchResult]: 每条输入的结果
+
+        Raises:
+            ValueError: 当response_mode无效或concurrency小于1时
+        """
+        if response_mode not in ["streaming", "blocking"]:
+            raise ValueError("response_mode must be 'streaming' or 'blocking'")
+        shared = dict(inputs or {})
+
+        def send(item: Union[str, Dict[str, Any]]):
+            # completion会修改inputs，每条输入使用独立的副本
+            item_inputs = dict(shared)
+            if isinstance(item, dict):
+                item_inputs.update(item)
+                query = item_inputs.pop("query", "")
+            else:
+                query = item
+            return self.completion(
+                query,
+                user,
+                response_mode=response_mode,
+                inputs=item_inputs,
+                **kwargs,
+            )
+
+        return self._run_batch(
+            send,
+            queries,
+            streaming=response_mode == "streaming",
+            concurrency=concurrency,
+            ordered=ordered,
+            item_retries=item_retries,
+            on_progress=on_progress,
+            max_pending=max_pending,
+        )
+
     def stop_task(self, task_id: str, user: str) -> Dict[str, Any]:
         """
         停止正在进行的响应，仅支持流式模式。
@@ -0,0 +1,166 @@
+"""
+Pydify - 调用追踪
+
+此模块提供TracingHooks，为每次API调用创建一个span，接口与OpenTelemetry的Tracer/Span兼容。
+流式调用结束时，span上会记录收到响应头、第一块数据和第一个内容事件的时间（首字延迟）、
+相邻内容事件间隔的百分位数以及总时长。
+
+追踪默认是关闭的：只有向客户端注册了TracingHooks才会创建span。未传入tracer且没有安装
+opentelemetry-api时，TracingHooks使用不做任何事情的tracer。
+
+示例:
+    ```python
+    from opentelemetry import trace
+
+    client = ChatbotClient(
+        api_key="your_api_key",
+        hooks=[TracingHooks(trace.get_tracer("my-service"))],
+    )
+    ```
+"""
+
+from typing import Any, Dict, Optional
+
+from .hooks import ClientHooks, RequestInfo
+from .metrics import _endpoint_label
+
+try:
+    from opentelemetry import trace as _otel_trace
+    from opentelemetry.trace import Status as _Status
+    from opentelemetry.trace import StatusCode as _StatusCode
+except ImportError:
+    _otel_trace = None
+
+
+class _NoopSpan:
+    """不做任何事情的span"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        pass
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def set_status(self, status: Any):
+        pass
+
+    def end(self):
+        pass
+
+
+class _NoopTracer:
+    """不做任何事情的tracer"""
+
+    _span = _NoopSpan()
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        return self._span
+
+
+def _default_tracer() -> Any:
+    if _otel_trace is not None:
+        return _otel_trace.get_tracer("pydify")
+    return _NoopTracer()
+
+
+class TracingHooks(ClientHooks):
+    """为每次API调用创建span的钩子
+
+    span名称为"dify {method} {endpoint}"，端点中的ID会被替换为{id}。记录的属性包括:
+    - http.request.method、url.full、dify.endpoint、dify.stream: 请求信息
+    - http.response.status_code、dify.attempts: 响应状态码与尝试次数，重试会记录为retry事件
+    - dify.stream.connect、dify.stream.first_byte、dify.stream.time_to_first_token、
+      dify.stream.duration: 流式调用的各项时间(秒)
+    - dify.stream.events、dify.stream.content_events: 事件数
+    - dify.stream.gap_p50、dify.stream.gap_p90、dify.stream.gap_p99、dify.stream.gap_max:
+      相邻内容事件间隔(秒)
+    """
+
+    def __init__(self, tracer: Any = None, record_events: bool = False):
+        """
+        Args:
+            tracer (Any, optional): 与OpenTelemetry Tracer兼容的对象，需要提供start_span(name, attributes=...)。
+                默认为None，即安装了opentelemetry-api时使用trace.get_tracer("pydify")，否则不做任何事情
+            record_events (bool, optional): 是否把每个流式事件记录为span事件。事件很多时开销较大。
+                默认为False
+        """
+        self._default = tracer is None
+        self.tracer = tracer if tracer is not None else _default_tracer()
+        self.record_events = record_events
+
+    def __reduce__(self):
+        # 默认的tracer在新进程中重新获取，那里的TracerProvider可能不同
+        tracer = None if self._default else self.tracer
+        return (self.__class__, (tracer, self.record_events))
+
+    def on_request_start(self, info: RequestInfo):
+        info.context["span"] = self.tracer.start_span(
+            f"dify {info.method} {_endpoint_label(info.endpoint)}",
+            attributes={
+                "http.request.method": info.method,
+                "url.full": info.url,
+                "dify.endpoint": info.endpoint,
+                "dify.stream": info.stream,
+            },
+        )
+
+    def on_retry(self, info: RequestInfo, attempt: int, delay: float, reason: Any):
+        span = info.context.get("span")
+        if span is not None:
+            span.add_event(
+                "retry",
+                {"attempt": attempt + 1, "delay": delay, "reason": str(reason)},
+            )
+
+    def on_response(self, info: RequestInfo):
+        span = info.context.get("span")
+        if span is None:
+            return
+        span.set_attribute("http.response.status_code", info.status_code)
+        span.set_attribute("dify.attempts", info.attempts)
+        # 错误状态码之后总会回调on_error，由它结束span；流式调用的span在流结束时结束
+        if not info.stream and info.status_code < 400:
+            info.context.pop("span").end()
+
+    def on_stream_event(self, info: RequestInfo, event_type: Optional[str], size: int):
+        if self.record_events:
+            span = info.context.get("span")
+            if span is not None:
+                span.add_event(event_type or "unknown", {"size": size})
+
+    def on_stream_end(self, info: RequestInfo):
+        span = info.context.pop("span", None)
+        if span is None:
+            return
+        timing = info.timing
+        if timing is not None:
+            values = timing.to_dict()
+            attributes = {
+                "dify.stream.connect": values["connect"],
+                "dify.stream.first_byte": values["first_byte"],
+                "dify.stream.time_to_first_token": values["first_content"],
+                "dify.stream.duration": values["duration"],
+                "dify.stream.events": values["events"],
+                "dify.stream.content_events": values["content_events"],
+                "dify.stream.gap_p50": values["gap_p50"],
+                "dify.stream.gap_p90": values["gap_p90"],
+                "dify.stream.gap_p99": values["gap_p99"],
+                "dify.stream.gap_max": values["gap_max"],
+            }
+            for key, value in attributes.items():
+                if value is not None:
+                    span.set_attribute(key, value)
+        span.end()
+
+    def on_error(self, info: RequestInfo, error: BaseException):
+        span = info.context.get("span")
+        if span is None:
+            return
+        span.record_exception(error)
+        if _otel_trace is not None:
+            span.set_status(_Status(_StatusCode.ERROR, type(error).__name__))
+        if not info.stream:
+            info.context.pop("span").end()
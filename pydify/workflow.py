@@ -6,11 +6,40 @@ Pydify - Dify Workflow应用客户端
 
 import json
 import os
-from typing import Any, BinaryIO, Dict, Generator, List, Optional, Tuple, Union
-
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .batch import BatchResult, BatchStats
 from .common import DifyAPIError, DifyBaseClient, DifyType
 
 
+def _enhance_run_error(e: DifyAPIError) -> DifyAPIError:
+    """为参数相关的错误补充可能的解决方法，其他错误原样返回"""
+    if "input is required" in str(e).lower() or "invalid_param" in str(e).lower():
+        error_msg = f"{str(e)}\n\n可能的解决方法:\n"
+        error_msg += "1. 检查您的API版本和参数格式要求\n"
+        error_msg += "2. 修改workflow.py中的run方法中的payload格式:\n"
+        error_msg += "   - 尝试将'inputs'改为'input'(单数形式)\n"
+        error_msg += "   - 或尝试直接使用扁平结构\n"
+        error_msg += "3. 参考Dify官方API文档查看最新的参数格式\n"
+
+        return DifyAPIError(
+            error_msg, status_code=e.status_code, error_data=e.error_data
+        )
+    return e
+
+
 class WorkflowEvent:
     """事件类型枚举
 
@@ -117,6 +146,10 @@ class WorkflowClient(DifyBaseClient):
 
     type = DifyType.Workflow
 
+    # 断线后通过workflow_run_id查询执行结果
+    _terminal_events = frozenset([WorkflowEvent.WORKFLOW_FINISHED, WorkflowEvent.ERROR])
+    _recovery_ids = ("workflow_run_id",)
+
     def run(
         self,
         inputs: Dict[str, Any],
@@ -196,6 +229,10 @@ class WorkflowClient(DifyBaseClient):
             **kwargs: 额外的请求参数:
                 - timeout (int): 请求超时时间(秒)，默认为30秒
                 - max_retries (int): 网络错误时的最大重试次数，默认为2次
+                - events (Iterable[str]): 流式模式下只产出这些类型的事件
+                - exclude_events (Iterable[str]): 流式模式下丢弃这些类型的事件
+                - lazy (bool): 流式模式下产出延迟解码的LazyEvent对象
+                - recover (bool): 流式模式下连接中断后是否通过get_run_info恢复结果，默认为True
 
         Returns:
             Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
@@ -235,6 +272,23 @@ class WorkflowClient(DifyBaseClient):
                 - 429 too_many_requests: 请求频率超限
                 - 500 internal_server_error: 服务器内部错误
         """
+        payload = self._run_payload(inputs, user, response_mode, files)
+        try:
+            if response_mode == "streaming":
+                return self.post_stream("workflows/run", json_data=payload, **kwargs)
+            else:
+                return self.post("workflows/run", json_data=payload, **kwargs)
+        except DifyAPIError as e:
+            raise _enhance_run_error(e)
+
+    @staticmethod
+    def _run_payload(
+        inputs: Dict[str, Any],
+        user: str,
+        response_mode: str,
+        files: Optional[List[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """校验参数并构建执行工作流的请求体"""
         if response_mode not in ["streaming", "blocking"]:
             raise ValueError("response_mode must be 'streaming' or 'blocking'")
 
@@ -248,33 +302,59 @@ class WorkflowClient(DifyBaseClient):
 
         if files:
             payload["files"] = files
+        return payload
 
-        endpoint = "workflows/run"
+    def run_batch(
+        self,
+        inputs: Iterable[Dict[str, Any]],
+        user: str,
+        concurrency: int = 4,
+        response_mode: str = "blocking",
+        ordered: bool = True,
+        item_retries: int = 0,
+        on_progress: Callable[[BatchResult, BatchStats], None] = None,
+        max_pending: int = None,
+        **kwargs,
+    ) -> Iterator[BatchResult]:
+        """
+        以有限的并发数批量执行工作流，每条输入执行一次run。
 
-        try:
-            if response_mode == "streaming":
-                return self.post_stream(endpoint, json_data=payload, **kwargs)
-            else:
-                return self.post(endpoint, json_data=payload, **kwargs)
-        except DifyAPIError as e:
-            # 捕获并增强特定的API错误，提供更有用的提示
-            if (
-                "input is required" in str(e).lower()
-                or "invalid_param" in str(e).lower()
-            ):
-                error_msg = f"{str(e)}\n\n可能的解决方法:\n"
-                error_msg += "1. 检查您的API版本和参数格式要求\n"
-                error_msg += "2. 修改workflow.py中的run方法中的payload格式:\n"
-                error_msg += "   - 尝试将'inputs'改为'input'(单数形式)\n"
-                error_msg += "   - 或尝试直接使用扁平结构\n"
-                error_msg += "3. 参考Dify官方API文档查看最新的参数格式\n"
-
-                raise DifyAPIError(
-                    error_msg, status_code=e.status_code, error_data=e.error_data
-                )
-            else:
-                # 原样抛出其他错误
-                raise e
+        所有调用共用客户端的连接池，并发数较大时应同时调大pool_maxsize。429和5xx
+        仍然先按客户端的重试策略重试；item_retries在此之外把整条输入重新执行，
+        流式模式下适用于中途断开且无法恢复的执行。单条失败不会中断批次，
+        异常记录在对应结果的error中，执行结束但状态为failed的工作流同样视为失败，且不会重试。
+
+        Args:
+            inputs (Iterable[Dict[str, Any]]): 每条输入的inputs字典，按需读取，可以是生成器
+            user (str): 用户标识
+            concurrency (int, optional): 同时执行的工作流数。默认为4
+            response_mode (str, optional): 'blocking'时每条结果为响应字典；'streaming'时在内部读完
+                整个流，每条结果为StreamResult，适合执行时间超过网关超时的工作流。默认为'blocking'
+            ordered (bool, optional): 为True时按输入顺序产出结果，否则按完成顺序产出。默认为True
+            item_retries (int, optional): 单条输入因网络错误、429或5xx失败时重新执行的次数。默认为0
+            on_progress (Callable[[BatchResult, BatchStats], None], optional): 每条输入完成时调用，
+                参数为该条结果和批次的进度统计。默认为None
+            max_pending (int, optional): 已读取但尚未产出的输入数上限。默认为concurrency的4倍
+            **kwargs: 传递给run的其他参数，如files、timeout、max_retries
+
+        Returns:
+            Iterator[BatchResult]: 每条输入的结果，BatchResult.index为输入的序号
+
+        Raises:
+            ValueError: 当response_mode无效或concurrency小于1时
+        """
+        if response_mode not in ["streaming", "blocking"]:
+            raise ValueError("response_mode must be 'streaming' or 'blocking'")
+        return self._run_batch(
+            lambda item: self.run(item, user, response_mode=response_mode, **kwargs),
+            inputs,
+            streaming=response_mode == "streaming",
+            concurrency=concurrency,
+            ordered=ordered,
+            item_retries=item_retries,
+            on_progress=on_progress,
+            max_pending=max_pending,
+        )
 
     def stop_task(self, task_id: str, user: str, **kwargs) -> Dict[str, Any]:
         """
@@ -313,6 +393,47 @@ class WorkflowClient(DifyBaseClient):
         endpoint = f"workflows/runs/{workflow_id}"
         return self.get(endpoint, **kwargs)
 
+    def _recovery_request(self, state) -> Dict[str, Any]:
+        return self.get_run_info(state.workflow_run_id)
+
+    def _recovery_events(
+        self, state, info: Dict[str, Any]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """执行结束后根据执行信息合成workflow_finished事件"""
+        status = info.get("status")
+        if status in (None, "running"):
+            return None
+
+        # 部分版本的接口以JSON字符串返回outputs
+        outputs = info.get("outputs")
+        if isinstance(outputs, str):
+            try:
+                outputs = self.codec.loads(outputs) if outputs else {}
+            except ValueError:
+                pass
+
+        data = {
+            "id": info.get("id") or state.workflow_run_id,
+            "workflow_id": info.get("workflow_id"),
+            "status": status,
+            "outputs": outputs,
+            "error": info.get("error"),
+            "elapsed_time": info.get("elapsed_time"),
+            "total_tokens": info.get("total_tokens"),
+            "total_steps": info.get("total_steps"),
+            "created_at": info.get("created_at"),
+            "finished_at": info.get("finished_at"),
+        }
+        return [
+            {
+                "event": WorkflowEvent.WORKFLOW_FINISHED,
+                "task_id": state.task_id,
+                "workflow_run_id": state.workflow_run_id,
+                "recovered": True,
+                "data": data,
+            }
+        ]
+
     def get_logs(
         self,
         keyword: str = None,
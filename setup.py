@@ -14,17 +14,22 @@ long_description_content_type = (
 # 定义项目依赖
 install_requires = [
     "requests>=2.25.0",
-    "sseclient-py>=1.8.0",
 ]
 
 # 可选依赖
 extras_require = {
+    "async": [
+        "httpx>=0.23.0",  # 用于异步客户端
+    ],
     "dev": [
         "black",
         "isort",
         "pytest",
         "pytest-cov",
     ],
+    "fast": [
+        "orjson>=3.6.0",  # 更快的JSON编解码
+    ],
     "examples": [
         "Pillow>=8.0.0",  # 用于示例中的图像处理
     ],
@@ -54,4 +59,9 @@ setuptools.setup(
     python_requires=">=3.7",
     install_requires=install_requires,
     extras_require=extras_require,
+    entry_points={
+        "console_scripts": [
+            "pydify=pydify.cli:main",
+        ],
+    },
 )
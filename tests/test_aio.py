@@ -0,0 +1,119 @@
+"""
+测试异步客户端的基本功能
+"""
+
+import asyncio
+import json
+import unittest
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from pydify import AsyncChatbotClient, AsyncWorkflowClient
+from pydify.common import DifyAPIError
+
+from .test_common import STREAM_BODY
+
+
+def make_client(cls, handler):
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return cls("test_key", "http://test-dify.com/v1", http_client=http_client)
+
+
+@unittest.skipIf(httpx is None, "需要安装httpx")
+class TestAsyncClient(unittest.TestCase):
+
+    def test_blocking_run(self):
+        def handler(request):
+            self.assertEqual(request.url.path, "/v1/workflows/run")
+            self.assertEqual(request.headers["Authorization"], "Bearer test_key")
+            payload = json.loads(request.content)
+            self.assertEqual(payload["response_mode"], "blocking")
+            return httpx.Response(200, json={"data": {"status": "succeeded"}})
+
+        async def main():
+            client = make_client(AsyncWorkflowClient, handler)
+            return await client.run({"x": 1}, "user_1", response_mode="blocking")
+
+        result = asyncio.run(main())
+        self.assertEqual(result["data"]["status"], "succeeded")
+
+    def test_blocking_run_enhances_param_error(self):
+        def handler(request):
+            return httpx.Response(
+                400, json={"code": "invalid_param", "message": "input is required"}
+            )
+
+        async def main():
+            client = make_client(AsyncWorkflowClient, handler)
+            await client.run({}, "user_1", response_mode="blocking", max_retries=0)
+
+        with self.assertRaises(DifyAPIError) as context:
+            asyncio.run(main())
+        self.assertIn("可能的解决方法", str(context.exception))
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_streaming_run(self):
+        body = (
+            b'data: {"event": "workflow_started", "task_id": "t1"}\n\n'
+            b"event: ping\n\n"
+            b'data: {"event": "text_chunk", "data": {"text": "hi"}}\n\n'
+            b'data: {"event": "workflow_finished", "data": {}}\n\n'
+        )
+
+        def handler(request):
+            return httpx.Response(200, content=body)
+
+        async def main():
+            client = make_client(AsyncWorkflowClient, handler)
+            return [e async for e in client.run({"x": 1}, "user_1")]
+
+        events = asyncio.run(main())
+        self.assertEqual(
+            [e["event"] for e in events],
+            ["workflow_started", "text_chunk", "workflow_finished"],
+        )
+
+    def test_retry_then_error(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503, json={"message": "busy"})
+
+        async def main():
+            client = make_client(AsyncChatbotClient, handler)
+            await client.get("meta", max_retries=2, retry_delay=0)
+
+        with self.assertRaises(DifyAPIError) as context:
+            asyncio.run(main())
+        self.assertEqual(context.exception.status_code, 503)
+        self.assertEqual(len(calls), 3)
+
+    def test_stream_retries_before_first_event(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(503, json={"message": "busy"})
+            return httpx.Response(200, content=STREAM_BODY)
+
+        async def main():
+            client = make_client(AsyncWorkflowClient, handler)
+            return [
+                e
+                async for e in client.post_stream(
+                    "workflows/run", {"inputs": {}}, retry_delay=0
+                )
+            ]
+
+        events = asyncio.run(main())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
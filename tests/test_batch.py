@@ -0,0 +1,349 @@
+"""
+测试批量执行
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+import requests
+
+from pydify import (
+    AsyncWorkflowClient,
+    BatchResult,
+    DifyAPIError,
+    DifyStreamDecodeError,
+    RetryPolicy,
+    StreamResult,
+    TextGenerationClient,
+    WorkflowClient,
+)
+from pydify.batch import iter_batch
+
+from .test_common import make_stream_response
+
+
+def make_client(cls=WorkflowClient):
+    client = cls(
+        "test_key",
+        "http://test-dify.com/v1",
+        retry_policy=RetryPolicy(base_delay=0, jitter=False),
+    )
+    client.session = MagicMock()
+    return client
+
+
+def make_response(payload):
+    response = MagicMock()
+    response.status_code = 200
+    response.ok = True
+    response.content = json.dumps(payload).encode("utf-8")
+    response.headers = {}
+    return response
+
+
+class TestIterBatch(unittest.TestCase):
+
+    def test_ordered_results_despite_completion_order(self):
+        def call(item):
+            time.sleep(0.02 * (5 - item))
+            return {"value": item}
+
+        results = list(iter_batch(call, range(5), concurrency=5))
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r.output["value"] for r in results], [0, 1, 2, 3, 4])
+        self.assertTrue(all(r.ok and r.attempts == 1 for r in results))
+
+    def test_unordered_results(self):
+        def call(item):
+            time.sleep(0.05 if item == 0 else 0)
+            return item
+
+        results = list(iter_batch(call, range(3), concurrency=3, ordered=False))
+        self.assertEqual(results[-1].index, 0)
+
+    def test_bounded_concurrency_and_lazy_input(self):
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0, "read": 0}
+
+        def items():
+            for i in range(20):
+                state["read"] += 1
+                yield i
+
+        def call(item):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.005)
+            with lock:
+                state["running"] -= 1
+            return item
+
+        batch = iter_batch(call, items(), concurrency=2, max_pending=4)
+        first = next(batch)
+        self.assertEqual(first.index, 0)
+        # 只预先读取有限数量的输入
+        self.assertLessEqual(state["read"], 5)
+        self.assertEqual(len(list(batch)), 19)
+        self.assertLessEqual(state["peak"], 2)
+
+    def test_error_capture_and_item_retries(self):
+        attempts = {}
+
+        def call(item):
+            attempts[item] = attempts.get(item, 0) + 1
+            if item == 1 and attempts[item] < 3:
+                raise DifyAPIError("busy", status_code=503)
+            if item == 2:
+                raise DifyAPIError("bad input", status_code=400)
+            return item
+
+        policy = RetryPolicy(max_retries=2, base_delay=0, jitter=False)
+        results = list(iter_batch(call, range(3), retry_policy=policy))
+
+        self.assertTrue(results[1].ok)
+        self.assertEqual(results[1].attempts, 3)
+        # 4xx不会重试
+        self.assertFalse(results[2].ok)
+        self.assertEqual(results[2].attempts, 1)
+        self.assertEqual(results[2].error.status_code, 400)
+        with self.assertRaises(DifyAPIError):
+            results[2].raise_for_error()
+
+    @patch("pydify.batch.time.sleep")
+    def test_retry_after_is_honoured(self, mock_sleep):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            retry_policy=RetryPolicy(max_retries=0),
+        )
+        client.session = MagicMock()
+        response = make_response({"message": "slow down"})
+        response.status_code = 429
+        response.ok = False
+        response.headers = {"Retry-After": "7"}
+        client.session.request.return_value = response
+        with self.assertRaises(DifyAPIError) as cm:
+            client.get_parameters()
+        self.assertEqual(cm.exception.retry_after, 7.0)
+
+        attempts = []
+
+        def call(item):
+            attempts.append(item)
+            if len(attempts) == 1:
+                raise DifyAPIError("busy", status_code=429, retry_after=7.0)
+            if item == 1:
+                raise DifyAPIError("busy", status_code=429, retry_after=3600.0)
+            return item
+
+        policy = RetryPolicy(max_retries=2, max_delay=1, jitter=False)
+        results = list(iter_batch(call, range(2), concurrency=1, retry_policy=policy))
+
+        # Retry-After不受max_delay限制
+        mock_sleep.assert_called_once_with(7.0)
+        self.assertTrue(results[0].ok)
+        # 要求等待的时间超过max_retry_after时放弃重试
+        self.assertFalse(results[1].ok)
+        self.assertEqual(results[1].attempts, 1)
+
+    def test_progress_callback(self):
+        seen = []
+
+        def on_progress(result, stats):
+            seen.append((result.index, stats.done, stats.failed))
+
+        def call(item):
+            if item == 2:
+                raise ValueError("boom")
+            return item
+
+        list(iter_batch(call, range(4), concurrency=1, on_progress=on_progress))
+        self.assertEqual(seen, [(0, 1, 0), (1, 2, 0), (2, 3, 1), (3, 4, 1)])
+
+    def test_failed_workflow_status_is_error(self):
+        results = list(
+            iter_batch(
+                lambda item: {"data": {"status": "failed", "error": "oops"}}, [1]
+            )
+        )
+        self.assertIsInstance(results[0].error, DifyAPIError)
+        self.assertIn("oops", str(results[0].error))
+        self.assertEqual(results[0].to_dict()["output"]["data"]["status"], "failed")
+
+    def test_close_early(self):
+        batch = iter_batch(lambda item: item, range(1000), concurrency=2)
+        self.assertEqual(next(batch).index, 0)
+        batch.close()
+
+
+class TestClientBatch(unittest.TestCase):
+
+    def test_run_batch_blocking(self):
+        client = make_client()
+
+        def request(method, url, **kwargs):
+            inputs = json.loads(kwargs["data"])["inputs"]
+            return make_response({"data": {"status": "succeeded", "outputs": inputs}})
+
+        client.session.request.side_effect = request
+        results = list(
+            client.run_batch([{"x": i} for i in range(6)], "user_1", concurrency=3)
+        )
+
+        self.assertEqual(
+            [r.output["data"]["outputs"]["x"] for r in results], list(range(6))
+        )
+        payload = json.loads(client.session.request.call_args[1]["data"])
+        self.assertEqual(payload["response_mode"], "blocking")
+        self.assertEqual(payload["user"], "user_1")
+
+    def test_run_batch_streaming(self):
+        client = make_client()
+        client.session.post.side_effect = lambda *args, **kwargs: make_stream_response()
+
+        results = list(
+            client.run_batch(
+                [{}, {}], "user_1", response_mode="streaming", concurrency=2
+            )
+        )
+        for result in results:
+            self.assertIsInstance(result.output, StreamResult)
+            self.assertEqual(result.output.text, "hi")
+            self.assertTrue(result.ok)
+
+    def make_streaming_client(self, *responses):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            retry_policy=RetryPolicy(max_retries=0, base_delay=0, jitter=False),
+        )
+        client.session = MagicMock()
+        client.session.post.side_effect = list(responses)
+        return client
+
+    def make_error_response(self, status_code, body, headers=None):
+        response = make_stream_response(status_code=status_code)
+        response.reason = "Error"
+        response.content = json.dumps(body).encode("utf-8")
+        response.headers = headers or {}
+        response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+        return response
+
+    def test_streaming_client_error_is_not_retried(self):
+        response = self.make_error_response(
+            400, {"code": "invalid_param", "message": "input is required"}
+        )
+        client = self.make_streaming_client(response, make_stream_response())
+
+        (result,) = client.run_batch(
+            [{}], "user_1", response_mode="streaming", item_retries=3
+        )
+
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(client.session.post.call_count, 1)
+        self.assertEqual(result.error.status_code, 400)
+        self.assertEqual(result.error.error_data["code"], "invalid_param")
+        # 服务端返回的错误类型和详情不会被解析错误的兜底消息覆盖
+        self.assertIn("input is required", str(result.error))
+        self.assertNotIn("解析错误", str(result.error))
+
+    @patch("pydify.batch.time.sleep")
+    def test_streaming_retry_after_is_honoured(self, mock_sleep):
+        response = self.make_error_response(
+            429, {"code": "too_many_requests"}, {"Retry-After": "7"}
+        )
+        client = self.make_streaming_client(response, make_stream_response())
+
+        (result,) = client.run_batch(
+            [{}], "user_1", response_mode="streaming", item_retries=3
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+        mock_sleep.assert_called_once_with(7.0)
+
+    def test_streaming_malformed_event_is_not_retried(self):
+        client = self.make_streaming_client(
+            make_stream_response(b"data: {not json\n\n"), make_stream_response()
+        )
+
+        (result,) = client.run_batch(
+            [{}], "user_1", response_mode="streaming", item_retries=3
+        )
+
+        self.assertIsInstance(result.error, DifyStreamDecodeError)
+        self.assertEqual(result.attempts, 1)
+
+    def test_invalid_arguments(self):
+        client = make_client()
+        with self.assertRaises(ValueError):
+            client.run_batch([], "user_1", response_mode="invalid")
+        with self.assertRaises(ValueError):
+            client.run_batch([], "user_1", concurrency=0)
+
+    def test_completion_batch(self):
+        client = make_client(TextGenerationClient)
+        shared = {"lang": "en"}
+        with patch.object(
+            client, "completion", return_value={"answer": "ok"}
+        ) as completion:
+            results = list(
+                client.completion_batch(
+                    ["a", {"query": "b", "tone": "formal"}], "user_1", inputs=shared
+                )
+            )
+        self.assertTrue(all(isinstance(r, BatchResult) and r.ok for r in results))
+        calls = sorted(completion.call_args_list, key=lambda c: c[0][0])
+        self.assertEqual(calls[0][0][0], "a")
+        self.assertEqual(calls[0][1]["inputs"], {"lang": "en"})
+        self.assertEqual(calls[1][0][0], "b")
+        self.assertEqual(calls[1][1]["inputs"], {"lang": "en", "tone": "formal"})
+        self.assertEqual(shared, {"lang": "en"})
+
+
+class TestAsyncBatch(unittest.TestCase):
+
+    def test_async_run_batch(self):
+        active = {"now": 0, "peak": 0}
+
+        async def handler(request):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            inputs = json.loads(request.content)["inputs"]
+            if inputs["x"] == 3:
+                return httpx.Response(400, json={"message": "bad"})
+            return httpx.Response(
+                200, json={"data": {"status": "succeeded", "outputs": inputs}}
+            )
+
+        async def run():
+            client = AsyncWorkflowClient(
+                "test_key",
+                "http://test-dify.com/v1",
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            )
+            return [
+                result
+                async for result in client.run_batch(
+                    ({"x": i} for i in range(8)), "user_1", concurrency=2
+                )
+            ]
+
+        results = asyncio.run(run())
+        self.assertEqual([r.index for r in results], list(range(8)))
+        self.assertFalse(results[3].ok)
+        self.assertEqual(results[3].error.status_code, 400)
+        self.assertEqual(results[5].output["data"]["outputs"], {"x": 5})
+        self.assertLessEqual(active["peak"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+测试提前关闭流式生成器时停止服务端任务
+"""
+
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from pydify import AsyncChatbotClient, TextGenerationClient, WorkflowClient
+
+from .test_common import STREAM_BODY, make_stream_response
+
+CHAT_BODY = (
+    b'data: {"event": "message", "task_id": "t1", "message_id": "m1", '
+    b'"conversation_id": "c1", "answer": "Hel"}\n\n'
+    b'data: {"event": "message", "task_id": "t1", "answer": "lo"}\n\n'
+    b'data: {"event": "message_end", "task_id": "t1"}\n\n'
+)
+
+
+class TestStopOnClose(unittest.TestCase):
+
+    def make_client(self, cls=WorkflowClient, body=STREAM_BODY):
+        client = cls("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response(body)
+        client.stop_task = MagicMock(return_value={"result": "success"})
+        return client
+
+    def test_close_stops_task_and_connection(self):
+        client = self.make_client()
+        stream = client.run({}, "user_1")
+        self.assertEqual(next(stream)["event"], "workflow_started")
+        self.assertEqual(client.active_tasks, {"t1": "user_1"})
+
+        stream.close()
+        client.stop_task.assert_called_once_with("t1", "user_1")
+        client.session.post.return_value.__exit__.assert_called_once()
+        self.assertEqual(client.active_tasks, {})
+
+    def test_finished_stream_is_not_stopped(self):
+        client = self.make_client()
+        events = list(client.run({}, "user_1"))
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+        client.stop_task.assert_not_called()
+
+    def test_stop_on_close_disabled(self):
+        client = self.make_client(TextGenerationClient, CHAT_BODY)
+        stream = client.completion("hi", "user_1", stop_on_close=False)
+        next(stream)
+        stream.close()
+        client.stop_task.assert_not_called()
+
+    def test_stop_failure_does_not_raise(self):
+        client = self.make_client(TextGenerationClient, CHAT_BODY)
+        client.stop_task.side_effect = RuntimeError("boom")
+        stream = client.completion("hi", "user_1")
+        next(stream)
+        stream.close()
+        client.stop_task.assert_called_once_with("t1", "user_1")
+
+    def test_cancel_and_drain_active_tasks(self):
+        client = self.make_client()
+        stream = client.run({}, "user_1")
+        next(stream)
+
+        self.assertEqual(client.cancel_active_tasks(), {"t1": {"result": "success"}})
+        self.assertFalse(client.drain_active_tasks(timeout=0))
+
+        threading.Timer(0.05, lambda: list(stream)).start()
+        self.assertTrue(client.drain_active_tasks(timeout=5))
+        client.stop_task.assert_called_once()
+
+
+@unittest.skipIf(httpx is None, "需要安装httpx")
+class TestAsyncStopOnClose(unittest.TestCase):
+
+    def test_aclose_stops_task(self):
+        stopped = []
+
+        def handler(request):
+            if request.url.path.endswith("/stop"):
+                stopped.append(request.url.path)
+                return httpx.Response(200, json={"result": "success"})
+            return httpx.Response(200, content=CHAT_BODY)
+
+        async def main():
+            client = AsyncChatbotClient(
+                "test_key",
+                "http://test-dify.com/v1",
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            )
+            stream = client.send_message("hi", "user_1")
+            first = await stream.__anext__()
+            await stream.aclose()
+            return first, await client.drain_active_tasks(timeout=1)
+
+        first, drained = asyncio.run(main())
+        self.assertEqual(first["message_id"], "m1")
+        self.assertTrue(drained)
+        self.assertEqual(stopped, ["/v1/chat-messages/t1/stop"])
+
+
+if __name__ == "__main__":
+    unittest.main()
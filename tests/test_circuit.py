@@ -0,0 +1,112 @@
+"""
+测试熔断器
+"""
+
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+from pydify import (
+    CircuitBreaker,
+    CircuitState,
+    DifyAPIError,
+    DifyCircuitOpenError,
+    WorkflowClient,
+    get_circuit_breaker,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_on_failure_rate(self):
+        breaker = CircuitBreaker(minimum_calls=4, failure_rate_threshold=0.5)
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertGreater(breaker.retry_after, 0)
+
+    def test_opens_on_consecutive_timeouts(self):
+        breaker = CircuitBreaker(consecutive_timeouts=2, minimum_calls=100)
+        breaker.record_failure(timeout=True)
+        breaker.record_success()
+        breaker.record_failure(timeout=True)
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+        breaker.record_failure(timeout=True)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+    def test_half_open_probe(self):
+        changes = []
+        breaker = CircuitBreaker(
+            minimum_calls=1,
+            recovery_timeout=0,
+            on_state_change=lambda b, old, new: changes.append((old, new)),
+        )
+        breaker.record_failure()
+
+        # 冷却结束后只放行一个探测请求
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        self.assertEqual(
+            changes,
+            [
+                ("closed", "open"),
+                ("open", "half_open"),
+                ("half_open", "open"),
+                ("open", "half_open"),
+                ("half_open", "closed"),
+            ],
+        )
+
+    def test_shared_by_base_url(self):
+        breaker = get_circuit_breaker("http://breaker-test.com/v1/")
+        self.assertIs(get_circuit_breaker("http://breaker-test.com/v1"), breaker)
+        self.assertEqual(breaker.name, "http://breaker-test.com/v1")
+
+
+class TestClientCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(minimum_calls=2, recovery_timeout=60)
+        self.client = WorkflowClient(
+            "test_key", "http://test-dify.com/v1", circuit_breaker=self.breaker
+        )
+        self.client.session = MagicMock()
+
+    def test_fails_fast_when_open(self):
+        self.client.session.request.side_effect = requests.ConnectionError("down")
+
+        with self.assertRaises(DifyAPIError):
+            self.client.get("info", max_retries=1, retry_delay=0)
+        self.assertEqual(self.breaker.state, CircuitState.OPEN)
+        self.assertEqual(self.client.session.request.call_count, 2)
+
+        with self.assertRaises(DifyCircuitOpenError) as context:
+            self.client.get("info")
+        self.assertGreater(context.exception.retry_after, 0)
+        self.assertEqual(self.client.session.request.call_count, 2)
+
+    def test_client_errors_do_not_open(self):
+        response = MagicMock(status_code=404, ok=False, content=b"{}")
+        response.json.return_value = {}
+        self.client.session.request.return_value = response
+
+        for _ in range(3):
+            with self.assertRaises(DifyAPIError):
+                self.client.get("missing")
+        self.assertEqual(self.breaker.state, CircuitState.CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+测试命令行工具
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from unittest.mock import MagicMock, patch
+
+from pydify import RetryPolicy, WorkflowClient
+from pydify.cli import main
+
+from .test_batch import make_response
+
+
+class TestRunCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmp, "inputs.jsonl")
+        self.output = os.path.join(self.tmp, "results.jsonl")
+        self.checkpoint = self.output + ".checkpoint"
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_input(self, lines):
+        with open(self.input, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def make_client(self, type, base_url, api_key, **kwargs):
+        self.assertEqual(type, "workflow")
+        self.assertEqual(api_key, "app-key")
+        client = WorkflowClient(
+            api_key, "http://test-dify.com/v1", retry_policy=RetryPolicy(max_retries=0)
+        )
+        client.session = MagicMock()
+
+        def request(method, url, **kwargs):
+            inputs = json.loads(kwargs["data"])["inputs"]
+            self.calls.append(inputs["n"])
+            if inputs.get("fail"):
+                return make_response({"data": {"status": "failed", "error": "boom"}})
+            return make_response({"data": {"status": "succeeded", "outputs": inputs}})
+
+        client.session.request.side_effect = request
+        return client
+
+    def run_cli(self, *extra):
+        argv = ["run", self.input, "-o", self.output, "--api-key", "app-key"]
+        with patch("pydify.cli.create_client", side_effect=self.make_client):
+            with redirect_stderr(io.StringIO()) as stderr:
+                code = main(argv + list(extra))
+        self.stderr = stderr.getvalue()
+        return code
+
+    def read_output(self):
+        with open(self.output, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_run_writes_results_and_checkpoint(self):
+        self.write_input(
+            ['{"n": 1}', '{"n": 2, "fail": true}', "", "not json", '{"n": 4}']
+        )
+
+        self.assertEqual(self.run_cli("-c", "2"), 1)
+        records = {record["line"]: record for record in self.read_output()}
+        self.assertEqual(set(records), {1, 2, 4, 5})
+        self.assertEqual(records[1]["output"]["data"]["outputs"], {"n": 1})
+        self.assertEqual(records[1]["input"], {"n": 1})
+        self.assertIn("boom", records[2]["error"])
+        self.assertIn("无法解析输入", records[4]["error"])
+        self.assertEqual(
+            records[5]["offset"], len('{"n": 1}\n{"n": 2, "fail": true}\n\nnot json\n')
+        )
+        with open(self.checkpoint) as f:
+            self.assertEqual(len(f.read().splitlines()), 4)
+        self.assertIn("失败 2 (50.0%)", self.stderr)
+
+    def test_resume_skips_completed_lines(self):
+        self.write_input(['{"n": 1}', '{"n": 2}', '{"n": 3}'])
+        self.assertEqual(self.run_cli(), 0)
+        self.assertEqual(sorted(self.calls), [1, 2, 3])
+
+        # 模拟最后一条结果写入输出后、记录检查点前被终止，并且输出末尾留下半行
+        with open(self.checkpoint) as f:
+            lines = f.read().splitlines()
+        last_offset = self.read_output()[-1]["offset"]
+        with open(self.checkpoint, "w") as f:
+            f.write(
+                "".join(
+                    f"{line}\n" for line in lines if int(line.split()[0]) != last_offset
+                )
+            )
+            f.write("12")
+        with open(self.output, "a") as f:
+            f.write('{"partial": ')
+
+        self.calls = []
+        self.assertEqual(self.run_cli(), 0)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(self.read_output()), 3)
+        self.assertIn("已跳过 3", self.stderr)
+
+    def test_retry_failed(self):
+        self.write_input(['{"n": 1, "fail": true}', '{"n": 2}'])
+        self.assertEqual(self.run_cli(), 1)
+
+        self.calls = []
+        self.assertEqual(self.run_cli(), 0)
+        self.assertEqual(self.calls, [])
+
+        self.assertEqual(self.run_cli("--retry-failed"), 1)
+        self.assertEqual(self.calls, [1])
+        # 重新执行的结果追加在旧结果之后，同一offset以最后一条记录为准
+        self.assertEqual([record["line"] for record in self.read_output()], [1, 2, 1])
+
+        self.calls = []
+        self.run_cli("--restart")
+        self.assertEqual(sorted(self.calls), [1, 2])
+        self.assertEqual(len(self.read_output()), 2)
+
+    def test_shard(self):
+        self.write_input(['{"n": %d}' % n for n in range(1, 8)])
+        self.assertEqual(self.run_cli("--shard", "1/3"), 0)
+        self.assertEqual(sorted(self.calls), [2, 5])
+
+    def test_invalid_arguments(self):
+        self.write_input(['{"n": 1}'])
+        with redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(
+                    [
+                        "run",
+                        self.input,
+                        "-o",
+                        self.output,
+                        "--api-key",
+                        "k",
+                        "--shard",
+                        "3/3",
+                    ]
+                )
+            with patch.dict(os.environ, {"DIFY_API_KEY": ""}):
+                with self.assertRaises(SystemExit):
+                    main(["run", self.input, "-o", self.output])
+
+
+if __name__ == "__main__":
+    unittest.main()
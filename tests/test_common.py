@@ -0,0 +1,151 @@
+"""
+测试DifyBaseClient的通用功能
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from pydify import WorkflowClient, create_client, get_codec, get_shared_session
+from pydify.sse import LazyEvent
+
+STREAM_BODY = (
+    b'data: {"event": "workflow_started", "task_id": "t1", "workflow_run_id": "r1"}\n\n'
+    b'data: {"event": "ping"}\n\n'
+    b'data: {"event": "node_finished", "data": {"outputs": {"text": "big"}}}\n\n'
+    b'data: {"event": "text_chunk", "data": {"text": "hi"}}\n\n'
+    b'data: {"event": "workflow_finished", "data": {"status": "succeeded"}}\n\n'
+)
+
+
+def make_stream_response(body=STREAM_BODY, status_code=200):
+    """构造一个可用于with语句的流式响应模拟对象"""
+    response = MagicMock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.headers = {}
+    response.iter_content.return_value = iter([body[:37], body[37:]])
+    response.__enter__.return_value = response
+    return response
+
+
+class TestSessionPooling(unittest.TestCase):
+
+    def test_client_owns_pooled_session(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1", pool_maxsize=32)
+
+        adapter = client.session.get_adapter("http://test-dify.com/v1/")
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertTrue(client._owns_session)
+
+    def test_shared_session(self):
+        session = get_shared_session()
+        self.assertIs(session, get_shared_session())
+
+        client = create_client(
+            "chatbot", "http://test-dify.com/v1", "k", session=session
+        )
+        self.assertIs(client.session, session)
+
+        # 外部传入的会话不应被客户端关闭
+        with patch.object(session, "close") as mock_close:
+            client.close()
+            mock_close.assert_not_called()
+
+    def test_requests_go_through_session(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+
+        mock_response = MagicMock()
+        mock_response.ok = True
+        mock_response.content = b'{"result": "success"}'
+
+        with patch.object(
+            client.session, "request", return_value=mock_response
+        ) as mock_request:
+            result = client.stop_task("task_1", "user_1")
+
+        mock_request.assert_called_once()
+        self.assertEqual(mock_request.call_args[0][0], "POST")
+        self.assertEqual(result, {"result": "success"})
+
+
+class TestJSONCodec(unittest.TestCase):
+
+    def test_builtin_codecs_roundtrip(self):
+        for name in ("json", "auto"):
+            codec = get_codec(name)
+            data = codec.dumps({"query": "你好", "n": 1})
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(codec.loads(data), {"query": "你好", "n": 1})
+
+    def test_invalid_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec("yaml")
+
+    def test_post_serializes_with_client_codec(self):
+        client = WorkflowClient(
+            "test_key", "http://test-dify.com/v1", json_codec="json"
+        )
+
+        mock_response = MagicMock()
+        mock_response.ok = True
+        mock_response.content = b""
+
+        with patch.object(
+            client.session, "request", return_value=mock_response
+        ) as mock_request:
+            result = client.post("workflows/run", json_data={"inputs": {"q": "你好"}})
+
+        self.assertEqual(result, {})
+        body = mock_request.call_args[1]["data"]
+        self.assertEqual(body, '{"inputs":{"q":"你好"}}'.encode("utf-8"))
+        self.assertNotIn("json", mock_request.call_args[1])
+
+
+class TestStreamFiltering(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WorkflowClient("test_key", "http://test-dify.com/v1")
+
+    def run_stream(self, **kwargs):
+        with patch.object(
+            self.client.session, "post", return_value=make_stream_response()
+        ):
+            return list(self.client.run({"q": "x"}, "user_1", **kwargs))
+
+    def test_no_filter(self):
+        events = self.run_stream()
+        self.assertEqual(len(events), 5)
+
+    def test_include_events(self):
+        events = self.run_stream(events=["text_chunk", "workflow_finished"])
+        self.assertEqual(
+            [e["event"] for e in events], ["text_chunk", "workflow_finished"]
+        )
+
+    def test_exclude_events(self):
+        events = self.run_stream(exclude_events=["ping", "node_finished"])
+        self.assertEqual(
+            [e["event"] for e in events],
+            ["workflow_started", "text_chunk", "workflow_finished"],
+        )
+
+    def test_lazy_events(self):
+        events = self.run_stream(lazy=True, exclude_events=["ping"])
+        self.assertTrue(all(isinstance(e, LazyEvent) for e in events))
+        self.assertEqual(events[1].event, "node_finished")
+        self.assertEqual(events[1]["event"], "node_finished")
+        self.assertFalse(events[1].decoded)
+        self.assertEqual(events[1]["data"]["outputs"]["text"], "big")
+        self.assertTrue(events[1].decoded)
+
+    def test_raw_frames(self):
+        events = self.run_stream(raw=True, exclude_events=["ping"])
+        ping = b'data: {"event": "ping"}\n\n'
+        self.assertTrue(all(isinstance(e, bytes) for e in events))
+        self.assertEqual(b"".join(events), STREAM_BODY.replace(ping, b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+测试按事件类型分发流式事件
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from pydify import EventDispatcher, dispatch_stream
+
+
+def message(i):
+    return {"event": "message", "answer": str(i)}
+
+
+def node(i):
+    return {"event": "node_finished", "data": {"index": i}}
+
+
+class TestEventDispatcher(unittest.TestCase):
+
+    def test_inline_dispatch(self):
+        seen = []
+        count = dispatch_stream(
+            iter([message(1), {"event": "ping"}, message(2)]),
+            {"handle_message": lambda e: seen.append(e["answer"])},
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(seen, ["1", "2"])
+
+    def test_default_handler(self):
+        seen = []
+        EventDispatcher({}, default=lambda e: seen.append(e["event"])).run(
+            [{"event": "ping"}, message(1)]
+        )
+        self.assertEqual(seen, ["ping", "message"])
+
+    def test_background_keeps_order_per_type(self):
+        nodes, messages = [], []
+        threads = set()
+
+        def slow_node(event):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.01)
+            nodes.append(event["data"]["index"])
+
+        source = []
+        for i in range(10):
+            source += [node(i), message(i)]
+
+        dispatcher = EventDispatcher(
+            {
+                "node_finished": slow_node,
+                "message": lambda e: messages.append(e["answer"]),
+            },
+            background=["node_finished"],
+            max_workers=4,
+        )
+        try:
+            started = time.monotonic()
+            self.assertEqual(dispatcher.run(iter(source)), 20)
+        finally:
+            dispatcher.close()
+        self.assertEqual(nodes, list(range(10)))
+        self.assertEqual(len(messages), 10)
+        self.assertNotIn(threading.current_thread().name, threads)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_background_error_closes_stream(self):
+        closed = []
+
+        def events():
+            try:
+                for i in range(1000):
+                    yield node(i)
+            finally:
+                closed.append(True)
+
+        def fail(event):
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            dispatch_stream(
+                events(), {"node_finished": fail}, background=True, max_pending=1
+            )
+        self.assertEqual(closed, [True])
+
+    def test_async_dispatch(self):
+        nodes, messages = [], []
+
+        async def slow_node(event):
+            await asyncio.sleep(0.001)
+            nodes.append(event["data"]["index"])
+
+        async def events():
+            for i in range(5):
+                yield node(i)
+                yield message(i)
+
+        dispatcher = EventDispatcher(
+            {
+                "node_finished": slow_node,
+                "message": lambda e: messages.append(e["answer"]),
+            },
+            background=True,
+        )
+        count = asyncio.run(dispatcher.arun(events()))
+        self.assertEqual(count, 10)
+        self.assertEqual(nodes, list(range(5)))
+        self.assertEqual(messages, ["0", "1", "2", "3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
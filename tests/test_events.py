@@ -0,0 +1,143 @@
+"""
+测试类型化事件
+"""
+
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from pydify import WorkflowClient, parse_event
+from pydify.events import (
+    AgentMessage,
+    MessageEnd,
+    NodeFinished,
+    Ping,
+    TextChunk,
+    UnknownEvent,
+    WorkflowFinished,
+    WorkflowStarted,
+)
+from pydify.sse import LazyEvent
+
+from .test_common import make_stream_response
+
+NODE_FINISHED = {
+    "event": "node_finished",
+    "task_id": "t1",
+    "workflow_run_id": "r1",
+    "data": {
+        "node_id": "llm",
+        "title": "LLM",
+        "status": "succeeded",
+        "elapsed_time": 1.5,
+        "execution_metadata": {"total_tokens": 42},
+        "inputs": {"query": "hi"},
+        "outputs": {"text": "big"},
+    },
+}
+
+
+class TestParseEvent(unittest.TestCase):
+
+    def test_fields(self):
+        event = parse_event(NODE_FINISHED)
+        self.assertIsInstance(event, NodeFinished)
+        self.assertEqual(event.task_id, "t1")
+        self.assertEqual(event.title, "LLM")
+        self.assertEqual(event.elapsed_time, 1.5)
+        self.assertEqual(event.total_tokens, 42)
+        self.assertEqual(event.outputs, {"text": "big"})
+        self.assertIsNone(event.error)
+        self.assertFalse(hasattr(event, "__dict__"))
+
+    def test_lazy_heavy_fields(self):
+        raw = json.dumps(NODE_FINISHED).encode()
+        loads = MagicMock(side_effect=json.loads)
+        event = parse_event(LazyEvent(raw, loads), loads, lazy=True)
+        # 构造时不解码
+        self.assertIsInstance(event, NodeFinished)
+        self.assertEqual(loads.call_count, 0)
+
+        self.assertEqual(event.title, "LLM")
+        self.assertEqual(event.total_tokens, 42)
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(event._raw, raw)
+
+        self.assertEqual(event.inputs, {"query": "hi"})
+        self.assertEqual(event.outputs, {"text": "big"})
+        # 体积较大的字段只在第一次访问时重新解码一次，之后不再保留原始字节
+        self.assertEqual(loads.call_count, 2)
+        self.assertIsNone(event._raw)
+
+    def test_lazy_heavy_field_first(self):
+        raw = json.dumps(NODE_FINISHED).encode()
+        loads = MagicMock(side_effect=json.loads)
+        event = parse_event(LazyEvent(raw, loads), loads, lazy=True)
+
+        self.assertEqual(event.outputs, {"text": "big"})
+        self.assertEqual(event.title, "LLM")
+        self.assertEqual(event.to_dict()["data"]["inputs"], {"query": "hi"})
+        self.assertEqual(loads.call_count, 1)
+
+    def test_lazy_already_decoded(self):
+        raw = json.dumps(NODE_FINISHED).encode()
+        loads = MagicMock(side_effect=json.loads)
+        chunk = LazyEvent(raw, loads)
+        chunk["data"]
+        event = parse_event(chunk, loads, lazy=True)
+
+        self.assertEqual(event.title, "LLM")
+        self.assertEqual(loads.call_count, 1)
+
+    def test_to_dict_round_trip(self):
+        event = parse_event(NODE_FINISHED)
+        self.assertEqual(parse_event(event.to_dict()).to_dict(), event.to_dict())
+        self.assertEqual(event.to_dict()["data"]["outputs"], {"text": "big"})
+
+    def test_chat_events(self):
+        event = parse_event(
+            {"event": "agent_message", "message_id": "m1", "answer": "Hi"}
+        )
+        self.assertIsInstance(event, AgentMessage)
+        self.assertEqual(event.answer, "Hi")
+
+        event = parse_event(
+            {"event": "message_end", "metadata": {"usage": {"total_tokens": 3}}}
+        )
+        self.assertIsInstance(event, MessageEnd)
+        self.assertEqual(event.usage, {"total_tokens": 3})
+
+    def test_unknown_event(self):
+        chunk = {"event": "iteration_started", "data": {"id": "i1"}}
+        event = parse_event(chunk)
+        self.assertIsInstance(event, UnknownEvent)
+        self.assertEqual(event.event, "iteration_started")
+        self.assertIs(event.to_dict(), chunk)
+
+
+class TestTypedStream(unittest.TestCase):
+
+    def test_client_typed_run(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response()
+
+        events = list(client.run({}, "user_1", typed=True, lazy=True))
+        self.assertEqual(
+            [type(event) for event in events],
+            [WorkflowStarted, Ping, NodeFinished, TextChunk, WorkflowFinished],
+        )
+        self.assertEqual(events[0].workflow_run_id, "r1")
+        self.assertEqual(events[2].outputs, {"text": "big"})
+        self.assertEqual(events[3].text, "hi")
+        self.assertEqual(events[4].status, "succeeded")
+        self.assertNotIn("typed", client.session.post.call_args.kwargs)
+
+    def test_typed_with_raw(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        with self.assertRaises(ValueError):
+            next(client.run({}, "user_1", typed=True, raw=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
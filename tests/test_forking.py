@@ -0,0 +1,184 @@
+"""
+测试客户端的序列化与fork后的重置
+"""
+
+import multiprocessing
+import os
+import pickle
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+import requests
+
+from pydify import (
+    AsyncWorkflowClient,
+    CircuitBreaker,
+    MetricsCollector,
+    Profiler,
+    RateLimiter,
+    RetryBudget,
+    RetryPolicy,
+    WorkflowClient,
+    forking,
+)
+from pydify.site import DifySite
+
+
+def _check_in_child(client, queue):
+    # fork后自行创建的会话应被丢弃，首次访问时重新创建
+    dropped = client._session is None
+    adapter = client.session.get_adapter(client.base_url)
+    queue.put((dropped, adapter._pool_maxsize))
+
+
+class TestPickleClient(unittest.TestCase):
+
+    def make_client(self, **kwargs):
+        return WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            pool_maxsize=32,
+            json_codec="json",
+            retry_policy=RetryPolicy(max_retries=5, budget=RetryBudget(ratio=0.5)),
+            rate_limiter=RateLimiter(requests_per_second=3, max_concurrent_streams=2),
+            circuit_breaker=CircuitBreaker("dify", minimum_calls=7),
+            hooks=[MetricsCollector(namespace="test")],
+            profile=Profiler(window=10),
+            **kwargs,
+        )
+
+    def test_round_trip_keeps_configuration(self):
+        client = self.make_client()
+        client.rate_limiter.reserve()
+        clone = pickle.loads(pickle.dumps(client))
+
+        self.assertIsInstance(clone, WorkflowClient)
+        self.assertEqual(clone.api_key, "test_key")
+        self.assertEqual(clone.base_url, "http://test-dify.com/v1/")
+        self.assertEqual(clone.json_codec, "json")
+        self.assertEqual(clone.retry_policy.max_retries, 5)
+        self.assertEqual(clone.retry_policy.budget.ratio, 0.5)
+        self.assertEqual(clone.rate_limiter.requests_per_second, 3)
+        self.assertEqual(clone.rate_limiter.max_concurrent_streams, 2)
+        self.assertEqual(clone.circuit_breaker.minimum_calls, 7)
+        self.assertEqual(clone.hooks[0].namespace, "test")
+        self.assertEqual(clone.profiler.window, 10)
+        # 限流器的令牌在新进程中重新计算
+        self.assertEqual(clone.rate_limiter.reserve(), 0.0)
+
+    def test_lambda_state_change_callback_is_dropped(self):
+        breaker = CircuitBreaker("dify", on_state_change=lambda *args: None)
+        client = self.make_client()
+        client.circuit_breaker = breaker
+        clone = pickle.loads(pickle.dumps(client))
+
+        # 回调不参与序列化，需要在新进程中重新设置
+        self.assertIsNone(clone.circuit_breaker.on_state_change)
+        self.assertEqual(clone.circuit_breaker.name, "dify")
+        self.assertIsNotNone(breaker.on_state_change)
+
+    def test_session_is_rebuilt(self):
+        client = self.make_client()
+        clone = pickle.loads(pickle.dumps(client))
+
+        self.assertIsNone(clone._session)
+        self.assertIsNot(clone.session, client.session)
+        self.assertEqual(clone.session.get_adapter(clone.base_url)._pool_maxsize, 32)
+        self.assertIs(clone.session, clone.session)
+        self.assertEqual(clone._streams, set())
+
+    def test_external_session(self):
+        session = requests.Session()
+        session.headers["X-Test"] = "1"
+        client = WorkflowClient("test_key", "http://test-dify.com/v1", session=session)
+        clone = pickle.loads(pickle.dumps(client))
+
+        self.assertFalse(clone._owns_session)
+        self.assertIsNot(clone.session, session)
+        self.assertEqual(clone.session.headers["X-Test"], "1")
+
+        # fork后外部传入的会话由调用方负责
+        client._after_fork()
+        self.assertIs(client.session, session)
+
+    def test_after_fork_resets_owned_session(self):
+        client = self.make_client()
+        session = client.session
+        client._streams.add(object())
+        self.assertIn(client, forking._instances)
+        client._after_fork()
+
+        self.assertIsNone(client._session)
+        self.assertEqual(client._streams, set())
+        self.assertIsNot(client.session, session)
+        session.close()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "需要fork")
+    def test_fork(self):
+        client = self.make_client()
+        client.session
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        process = context.Process(target=_check_in_child, args=(client, queue))
+        process.start()
+        result = queue.get(timeout=10)
+        process.join(10)
+
+        self.assertEqual(result, (True, 32))
+        self.assertIsNotNone(client._session)
+
+
+class TestPickleAsyncClient(unittest.TestCase):
+
+    def test_round_trip(self):
+        client = AsyncWorkflowClient(
+            "test_key", "http://test-dify.com/v1", max_connections=7
+        )
+        clone = pickle.loads(pickle.dumps(client))
+        self.assertIsNone(clone._http_client)
+        self.assertIsInstance(clone.http_client, httpx.AsyncClient)
+        self.assertEqual(clone._pool_options["max_connections"], 7)
+
+    def test_external_http_client_is_rejected(self):
+        client = AsyncWorkflowClient(
+            "test_key", "http://test-dify.com/v1", http_client=httpx.AsyncClient()
+        )
+        with self.assertRaises(TypeError):
+            pickle.dumps(client)
+
+
+class TestPickleSite(unittest.TestCase):
+
+    @patch("requests.post")
+    @patch("requests.get")
+    def test_login_after_unpickle(self, mock_get, mock_post):
+        login_response = MagicMock()
+        login_response.status_code = 200
+        login_response.json.return_value = {
+            "data": {"access_token": "token_1", "refresh_token": "refresh_1"}
+        }
+        mock_post.return_value = login_response
+        apps_response = MagicMock()
+        apps_response.status_code = 200
+        apps_response.json.return_value = {"data": []}
+        mock_get.return_value = apps_response
+
+        site = DifySite("http://test-dify.com", "test@example.com", "password")
+        self.assertEqual(site.access_token, "token_1")
+        data = pickle.dumps(site)
+        self.assertNotIn(b"token_1", data)
+
+        clone = pickle.loads(data)
+        self.assertEqual(mock_post.call_count, 1)
+        clone.fetch_apps()
+        # 首次调用API时重新登录
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(
+            mock_get.call_args[1]["headers"]["Authorization"], "Bearer token_1"
+        )
+        self.assertEqual(clone.email, "test@example.com")
+
+
+if __name__ == "__main__":
+    unittest.main()
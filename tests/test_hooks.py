@@ -0,0 +1,236 @@
+"""
+测试调用钩子与指标收集
+"""
+
+import unittest
+import urllib.request
+from unittest.mock import MagicMock
+
+import requests
+
+from pydify import (
+    ClientHooks,
+    DifyAPIError,
+    MetricsCollector,
+    RetryPolicy,
+    TracingHooks,
+    WorkflowClient,
+)
+
+from .test_common import make_stream_response
+
+
+class Recorder(ClientHooks):
+    def __init__(self):
+        self.calls = []
+
+    def on_request_start(self, info):
+        self.calls.append("start")
+
+    def on_retry(self, info, attempt, delay, reason):
+        self.calls.append(("retry", reason))
+
+    def on_response(self, info):
+        self.calls.append(("response", info.status_code))
+
+    def on_stream_event(self, info, event_type, size):
+        self.calls.append(("event", event_type))
+
+    def on_stream_end(self, info):
+        self.calls.append(("end", info.events))
+
+    def on_error(self, info, error):
+        self.calls.append(("error", type(error).__name__))
+
+
+def make_response(status_code=200, content=b'{"result": "success"}'):
+    response = MagicMock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.content = content
+    response.headers = {}
+    response.request.headers = {"Content-Length": "12"}
+    response.json.return_value = {}
+    return response
+
+
+class TestClientHooks(unittest.TestCase):
+
+    def make_client(self, *hooks):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            hooks=hooks,
+            retry_policy=RetryPolicy(base_delay=0, jitter=False),
+        )
+        client.session = MagicMock()
+        return client
+
+    def test_request_with_retry(self):
+        recorder = Recorder()
+        client = self.make_client(recorder)
+        client.session.request.side_effect = [make_response(503), make_response()]
+
+        client.get("parameters")
+        self.assertEqual(recorder.calls, ["start", ("retry", 503), ("response", 200)])
+
+    def test_network_error(self):
+        recorder = Recorder()
+        client = self.make_client(recorder)
+        client.session.request.side_effect = requests.ConnectionError("down")
+
+        with self.assertRaises(DifyAPIError):
+            client.get("parameters", max_retries=0)
+        self.assertEqual(recorder.calls, ["start", ("error", "DifyAPIError")])
+
+    def test_stream_events(self):
+        recorder = Recorder()
+        client = self.make_client(recorder)
+        client.session.post.return_value = make_stream_response()
+
+        list(client.run({}, "user_1", exclude_events=["ping"]))
+        self.assertEqual(recorder.calls[:2], ["start", ("response", 200)])
+        self.assertIn(("event", "ping"), recorder.calls)
+        self.assertEqual(recorder.calls[-1], ("end", 5))
+
+    def test_hook_failure_is_ignored(self):
+        class Broken(ClientHooks):
+            def on_response(self, info):
+                raise RuntimeError("boom")
+
+        client = self.make_client(Broken())
+        client.session.request.return_value = make_response()
+        self.assertEqual(client.get("parameters"), {"result": "success"})
+
+
+class TestMetricsCollector(unittest.TestCase):
+
+    def test_prometheus_output(self):
+        metrics = MetricsCollector()
+        client = WorkflowClient("test_key", "http://test-dify.com/v1", hooks=[metrics])
+        client.session = MagicMock()
+        client.session.request.return_value = make_response()
+        client.session.post.return_value = make_stream_response()
+
+        client.get("workflows/run/3fa85f64-5717-4562-b3fc-2c963f66afa6")
+        list(client.run({}, "user_1"))
+        text = metrics.render()
+
+        self.assertIn(
+            'pydify_requests_total{method="GET",endpoint="workflows/run/{id}",status="200"} 1',
+            text,
+        )
+        self.assertIn(
+            'pydify_request_bytes_total{method="GET",endpoint="workflows/run/{id}"} 12',
+            text,
+        )
+        self.assertIn(
+            'pydify_stream_events_bucket{endpoint="workflows/run",le="5"} 1', text
+        )
+        self.assertIn(
+            'pydify_stream_events_total{endpoint="workflows/run",event="ping"} 1', text
+        )
+        self.assertIn("# TYPE pydify_request_duration_seconds histogram", text)
+
+    def test_http_server(self):
+        metrics = MetricsCollector()
+        metrics.on_error(
+            MagicMock(method="GET", endpoint="info", status_code=None), ValueError()
+        )
+        server = metrics.start_http_server()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/metrics"
+            body = urllib.request.urlopen(url, timeout=5).read().decode()
+        finally:
+            metrics.stop_http_server()
+        self.assertIn(
+            'pydify_errors_total{method="GET",endpoint="info",error="ValueError"} 1',
+            body,
+        )
+
+
+class FakeSpan:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.events = []
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, attributes=None):
+        self.events.append(name)
+
+    def record_exception(self, exception):
+        self.exceptions.append(exception)
+
+    def set_status(self, status):
+        pass
+
+    def end(self):
+        self.ended = True
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = FakeSpan(name, attributes or {})
+        self.spans.append(span)
+        return span
+
+
+class TestTracingHooks(unittest.TestCase):
+
+    def make_client(self, tracer):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            hooks=[TracingHooks(tracer)],
+            retry_policy=RetryPolicy(base_delay=0, jitter=False),
+        )
+        client.session = MagicMock()
+        return client
+
+    def test_stream_span(self):
+        tracer = FakeTracer()
+        client = self.make_client(tracer)
+        client.session.post.return_value = make_stream_response()
+
+        list(client.run({}, "user_1"))
+        span = tracer.spans[0]
+        self.assertEqual(span.name, "dify POST workflows/run")
+        self.assertTrue(span.ended)
+        self.assertEqual(span.attributes["http.response.status_code"], 200)
+        self.assertEqual(span.attributes["dify.stream.events"], 5)
+        self.assertEqual(span.attributes["dify.stream.content_events"], 1)
+        self.assertIn("dify.stream.time_to_first_token", span.attributes)
+        self.assertIn("dify.stream.duration", span.attributes)
+
+    def test_request_retry_and_error(self):
+        tracer = FakeTracer()
+        client = self.make_client(tracer)
+        client.session.request.side_effect = [make_response(503), make_response(404)]
+
+        with self.assertRaises(DifyAPIError):
+            client.get("parameters")
+        span = tracer.spans[0]
+        self.assertEqual(span.events, ["retry"])
+        self.assertEqual(span.attributes["dify.attempts"], 2)
+        self.assertEqual(len(span.exceptions), 1)
+        self.assertTrue(span.ended)
+
+    def test_noop_without_tracer(self):
+        client = WorkflowClient(
+            "test_key", "http://test-dify.com/v1", hooks=[TracingHooks()]
+        )
+        client.session = MagicMock()
+        client.session.request.return_value = make_response()
+        self.assertEqual(client.get("parameters"), {"result": "success"})
+
+
+if __name__ == "__main__":
+    unittest.main()
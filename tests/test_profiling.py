@@ -0,0 +1,261 @@
+"""
+测试请求分阶段计时
+"""
+
+import asyncio
+import http.server
+import io
+import json
+import os
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from pydify import Profiler, RequestProfile, RetryPolicy, WorkflowClient, create_session
+from pydify.aio import AsyncWorkflowClient
+from pydify.common import DifyAPIError
+from pydify.profiling import PROFILE_ENV, profiling_enabled
+from pydify.site import DifySite
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply({"path": self.path})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"data": {"access_token": "a", "refresh_token": "r"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+
+    def make_profile(self, total, reused=True, error=False):
+        profile = RequestProfile()
+        profile.total = total
+        profile.reused = reused
+        profile.error = error
+        if not reused:
+            profile.dns = 0.001
+            profile.connect = 0.002
+        if not error:
+            profile.wait = total / 2
+            profile.download = total / 4
+        return profile
+
+    def test_summary_per_endpoint(self):
+        profiler = Profiler()
+        profiler.record("POST", "workflows/run", self.make_profile(0.1, reused=False))
+        for _ in range(3):
+            profiler.record("POST", "/workflows/run", self.make_profile(0.2))
+        profiler.record(
+            "GET", "workflows/run/1234?x=1", self.make_profile(0.4, error=True)
+        )
+
+        summary = profiler.summary()
+        self.assertEqual(set(summary), {"POST workflows/run", "GET workflows/run/{id}"})
+        entry = summary["POST workflows/run"]
+        self.assertEqual(entry["count"], 4)
+        self.assertEqual(entry["errors"], 0)
+        self.assertEqual(entry["reused"], 0.75)
+        # DNS和连接只统计新建连接的请求
+        self.assertEqual(entry["dns"]["count"], 1)
+        self.assertIsNone(entry["tls"])
+        self.assertEqual(entry["total"]["p50"], 0.2)
+        self.assertEqual(entry["total"]["max"], 0.2)
+        self.assertAlmostEqual(entry["total"]["mean"], 0.175)
+
+        failed = summary["GET workflows/run/{id}"]
+        self.assertEqual(failed["errors"], 1)
+        self.assertIsNone(failed["wait"])
+        self.assertEqual(failed["total"]["count"], 1)
+
+    def test_rolling_window(self):
+        profiler = Profiler(window=2)
+        for total in (1.0, 2.0, 3.0):
+            profiler.record("GET", "info", self.make_profile(total))
+        self.assertEqual([p.total for p in profiler.profiles("GET info")], [2.0, 3.0])
+
+    def test_format_table_and_dump(self):
+        profiler = Profiler()
+        self.assertEqual(profiler.format_table(), "(没有剖析记录)")
+        profiler.record("POST", "chat-messages", self.make_profile(0.25, reused=False))
+        table = profiler.format_table()
+        lines = table.splitlines()
+        self.assertIn("DNS(p50)", lines[0])
+        self.assertTrue(lines[2].startswith("POST chat-messages"))
+        self.assertIn("250.0", lines[2])
+        self.assertIn("0%", lines[2])
+
+        output = io.StringIO()
+        profiler.dump(output, percentile="max")
+        self.assertIn("总计(max)", output.getvalue())
+
+        profiler.reset()
+        self.assertEqual(profiler.summary(), {})
+
+    def test_profiling_enabled(self):
+        self.assertTrue(profiling_enabled(True))
+        self.assertFalse(profiling_enabled(False))
+        with patch.dict(os.environ, {PROFILE_ENV: "1"}):
+            self.assertTrue(profiling_enabled())
+            self.assertIsNotNone(WorkflowClient("test_key").profiler)
+            self.assertIsNone(WorkflowClient("test_key", profile=False).profiler)
+        with patch.dict(os.environ, {PROFILE_ENV: ""}):
+            self.assertFalse(profiling_enabled())
+            self.assertIsNone(WorkflowClient("test_key").profiler)
+
+
+class TestClientProfiling(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_sync_client_records_phases(self):
+        client = WorkflowClient("test_key", self.base_url + "/v1", profile=True)
+        try:
+            client.get("parameters")
+            client.get("parameters")
+        finally:
+            client.close()
+
+        first, second = client.profiler.profiles("GET parameters")
+        self.assertFalse(first.reused)
+        self.assertIsNotNone(first.dns)
+        self.assertIsNotNone(first.connect)
+        self.assertIsNone(first.tls)
+        self.assertTrue(second.reused)
+        self.assertIsNone(second.connect)
+        for profile in (first, second):
+            self.assertIsNotNone(profile.wait)
+            self.assertIsNotNone(profile.download)
+            self.assertGreaterEqual(profile.total, profile.wait)
+
+    def test_shared_profiler_and_external_session(self):
+        profiler = Profiler()
+        session = create_session()
+        client = WorkflowClient(
+            "test_key", self.base_url + "/v1", session=session, profile=profiler
+        )
+        self.assertIs(client.profiler, profiler)
+        client.get("info")
+        session.close()
+
+        (profile,) = profiler.profiles("GET info")
+        # 普通的HTTPAdapter无法拆分连接阶段
+        self.assertIsNone(profile.reused)
+        self.assertIsNone(profile.connect)
+        self.assertIsNotNone(profile.wait)
+
+    def test_network_error_is_recorded(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        client = WorkflowClient(
+            "test_key",
+            f"http://127.0.0.1:{port}/v1",
+            profile=True,
+            retry_policy=RetryPolicy(max_retries=0),
+        )
+        with self.assertRaises(DifyAPIError):
+            client.get("info")
+        (profile,) = client.profiler.profiles("GET info")
+        self.assertTrue(profile.error)
+        self.assertIsNotNone(profile.total)
+        self.assertEqual(client.profiler.summary()["GET info"]["errors"], 1)
+
+    def test_async_client_records_phases(self):
+        async def run():
+            client = AsyncWorkflowClient(
+                "test_key", self.base_url + "/v1", profile=True
+            )
+            try:
+                await client.get("parameters")
+                await client.get("parameters")
+            finally:
+                await client.close()
+            return client.profiler.profiles("GET parameters")
+
+        first, second = asyncio.run(run())
+        self.assertFalse(first.reused)
+        self.assertIsNotNone(first.connect)
+        self.assertIsNone(first.dns)
+        self.assertTrue(second.reused)
+        for profile in (first, second):
+            self.assertIsNotNone(profile.wait)
+            self.assertIsNotNone(profile.download)
+
+    def test_async_stream_has_no_download_phase(self):
+        async def handler(request):
+            self.assertIn("trace", request.extensions)
+            return httpx.Response(
+                200,
+                headers={"Content-Type": "text/event-stream"},
+                content=b'data: {"event": "workflow_finished", "data": {}}\n\n',
+            )
+
+        async def run():
+            client = AsyncWorkflowClient(
+                "test_key",
+                "http://test-dify.com/v1",
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                profile=True,
+            )
+            async for _ in client.post_stream("workflows/run", json_data={}):
+                pass
+            return client.profiler.profiles("POST workflows/run")
+
+        (profile,) = asyncio.run(run())
+        self.assertIsNone(profile.download)
+        self.assertIsNotNone(profile.total)
+
+    def test_site_profiling(self):
+        site = DifySite(self.base_url, "a@b.com", "password", profile=True)
+        try:
+            self.assertEqual(site.access_token, "a")
+            (profile,) = site.profiler.profiles("POST console/api/login")
+            self.assertFalse(profile.reused)
+            self.assertIsNotNone(profile.download)
+        finally:
+            site.session.close()
+
+    def test_site_without_profiling_uses_requests(self):
+        with patch.dict(os.environ, {PROFILE_ENV: ""}), patch("requests.post") as post:
+            post.return_value.status_code = 200
+            post.return_value.json.return_value = {
+                "data": {"access_token": "a", "refresh_token": "r"}
+            }
+            site = DifySite(self.base_url, "a@b.com", "password")
+            self.assertEqual(site.access_token, "a")
+        self.assertIsNone(site.profiler)
+        self.assertIsNone(site.session)
+        post.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+测试客户端限流器
+"""
+
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from pydify import RateLimiter, WorkflowClient, get_rate_limiter
+
+from .test_common import make_stream_response
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_burst_then_paced(self):
+        limiter = RateLimiter(requests_per_second=10, burst=2)
+
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+        # 令牌耗尽后按预约顺序排队，每个请求间隔0.1秒
+        self.assertAlmostEqual(limiter.reserve(), 0.1, delta=0.02)
+        self.assertAlmostEqual(limiter.reserve(), 0.2, delta=0.02)
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        for _ in range(100):
+            self.assertEqual(limiter.reserve(), 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(requests_per_second=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(max_concurrent_streams=-1)
+
+    def test_shared_by_api_key(self):
+        limiter = get_rate_limiter("shared_key", requests_per_second=5)
+        self.assertIs(get_rate_limiter("shared_key"), limiter)
+        self.assertIsNot(get_rate_limiter("other_key"), limiter)
+
+    def test_concurrent_streams(self):
+        limiter = RateLimiter(max_concurrent_streams=1)
+        entered = threading.Event()
+
+        def worker():
+            with limiter.stream_slot():
+                entered.set()
+
+        with limiter.stream_slot():
+            thread = threading.Thread(target=worker)
+            thread.start()
+            self.assertFalse(entered.wait(0.05))
+        thread.join(1)
+        self.assertTrue(entered.is_set())
+
+
+class TestClientRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(requests_per_second=1000, max_concurrent_streams=1)
+        self.client = WorkflowClient(
+            "test_key", "http://test-dify.com/v1", rate_limiter=self.limiter
+        )
+        self.client.session = MagicMock()
+
+    def test_request_takes_token(self):
+        response = MagicMock(status_code=200, ok=True, content=b"{}")
+        self.client.session.request.return_value = response
+        self.limiter.acquire = MagicMock()
+
+        self.client.get("info")
+        self.limiter.acquire.assert_called_once()
+
+    def test_stream_holds_slot_until_closed(self):
+        self.client.session.post.return_value = make_stream_response()
+
+        stream = self.client.post_stream("workflows/run", {"inputs": {}})
+        next(stream)
+        self.assertFalse(self.limiter._streams.acquire(blocking=False))
+
+        stream.close()
+        self.assertTrue(self.limiter._streams.acquire(blocking=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+测试流式连接中断后的结果恢复
+"""
+
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from pydify import AsyncWorkflowClient, ChatbotClient, WorkflowClient
+from pydify.common import DifyAPIError
+
+from .test_common import make_stream_response
+from .test_stream import slow_stream
+
+WORKFLOW_HEAD = (
+    b'data: {"event": "workflow_started", "task_id": "t1", "workflow_run_id": "r1"}\n\n'
+    b'data: {"event": "text_chunk", "workflow_run_id": "r1", "data": {"text": "hi"}}\n\n'
+)
+
+CHAT_HEAD = (
+    b'data: {"event": "message", "task_id": "t1", "message_id": "m1", '
+    b'"conversation_id": "c1", "answer": "Hel"}\n\n'
+)
+
+
+def broken_stream(body):
+    """先产出body，然后模拟连接被重置"""
+
+    def chunks(chunk_size=None):
+        yield body
+        raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+    response = make_stream_response()
+    response.iter_content.side_effect = chunks
+    return response
+
+
+class TestWorkflowRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        self.client.session = MagicMock()
+        self.client.session.post.return_value = broken_stream(WORKFLOW_HEAD)
+        self.client.get_run_info = MagicMock(
+            side_effect=[
+                {"id": "r1", "status": "running"},
+                {"id": "r1", "status": "succeeded", "outputs": '{"answer": "done"}'},
+            ]
+        )
+
+    def test_polls_run_info_and_emits_finished(self):
+        events = list(self.client.run({}, "user_1", recover_interval=0))
+
+        self.assertEqual(
+            [e["event"] for e in events],
+            ["workflow_started", "text_chunk", "workflow_finished"],
+        )
+        finished = events[-1]
+        self.assertTrue(finished["recovered"])
+        self.assertEqual(finished["task_id"], "t1")
+        self.assertEqual(finished["data"]["status"], "succeeded")
+        self.assertEqual(finished["data"]["outputs"], {"answer": "done"})
+        self.client.get_run_info.assert_called_with("r1")
+
+    def test_recovered_event_respects_filter(self):
+        events = list(
+            self.client.run(
+                {}, "user_1", recover_interval=0, events=["workflow_finished"]
+            )
+        )
+        self.assertEqual([e["event"] for e in events], ["workflow_finished"])
+
+    def test_recover_disabled(self):
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            list(self.client.run({}, "user_1", recover=False))
+        self.client.get_run_info.assert_not_called()
+
+    def test_no_recovery_without_run_id(self):
+        self.client.session.post.return_value = broken_stream(b"")
+
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            list(self.client.run({}, "user_1"))
+
+    def test_recovery_timeout(self):
+        self.client.get_run_info = MagicMock(return_value={"status": "running"})
+
+        with self.assertRaises(DifyAPIError):
+            list(self.client.run({}, "user_1", recover_timeout=0, recover_interval=0))
+
+    def test_idle_timeout_is_recovered(self):
+        self.client.session.post.return_value = slow_stream(WORKFLOW_HEAD, 0.5)
+
+        events = list(
+            self.client.run({}, "user_1", idle_timeout=0.1, recover_interval=0)
+        )
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+        self.assertTrue(events[-1]["recovered"])
+        self.client.get_run_info.assert_called_with("r1")
+
+    def test_complete_stream_is_not_recovered(self):
+        self.client.session.post.return_value = make_stream_response()
+
+        events = list(self.client.run({}, "user_1"))
+        self.assertEqual(len(events), 5)
+        self.client.get_run_info.assert_not_called()
+
+
+class TestChatRecovery(unittest.TestCase):
+
+    def test_stream_closed_before_message_end(self):
+        client = ChatbotClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response(CHAT_HEAD)
+        client.get_messages = MagicMock(
+            return_value={
+                "data": [
+                    {"id": "m0", "answer": "old"},
+                    {"id": "m1", "answer": "Hello world", "retriever_resources": []},
+                ]
+            }
+        )
+
+        events = list(client.send_message("hi", "user_1", recover_interval=0))
+
+        self.assertEqual(
+            [e["event"] for e in events], ["message", "message_replace", "message_end"]
+        )
+        self.assertEqual(events[1]["answer"], "Hello world")
+        client.get_messages.assert_called_once_with("c1", "user_1", limit=5)
+
+
+@unittest.skipIf(httpx is None, "需要安装httpx")
+class TestAsyncRecovery(unittest.TestCase):
+
+    def test_workflow_recovery(self):
+        class BrokenStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield WORKFLOW_HEAD
+                raise httpx.ReadError("connection reset")
+
+        def handler(request):
+            if request.url.path.endswith("/workflows/run"):
+                return httpx.Response(200, stream=BrokenStream())
+            return httpx.Response(200, json={"id": "r1", "status": "failed"})
+
+        async def main():
+            http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            client = AsyncWorkflowClient(
+                "test_key", "http://test-dify.com/v1", http_client=http_client
+            )
+            return [e async for e in client.run({}, "user_1", recover_interval=0)]
+
+        events = asyncio.run(main())
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+        self.assertEqual(events[-1]["data"]["status"], "failed")
+
+    def test_idle_timeout_is_recovered(self):
+        class StalledStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield WORKFLOW_HEAD
+                await asyncio.sleep(0.5)
+
+        def handler(request):
+            if request.url.path.endswith("/workflows/run"):
+                return httpx.Response(200, stream=StalledStream())
+            return httpx.Response(200, json={"id": "r1", "status": "succeeded"})
+
+        async def main():
+            http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            client = AsyncWorkflowClient(
+                "test_key", "http://test-dify.com/v1", http_client=http_client
+            )
+            stream = client.run({}, "user_1", idle_timeout=0.1, recover_interval=0)
+            return [e async for e in stream]
+
+        events = asyncio.run(main())
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+        self.assertTrue(events[-1]["recovered"])
+
+
+if __name__ == "__main__":
+    unittest.main()
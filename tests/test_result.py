@@ -0,0 +1,94 @@
+"""
+测试流式结果累加
+"""
+
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from pydify import StreamResult, WorkflowClient
+
+from .test_common import make_stream_response
+
+CHAT_EVENTS = [
+    {
+        "event": "message",
+        "task_id": "t1",
+        "message_id": "m1",
+        "conversation_id": "c1",
+        "answer": "Hel",
+    },
+    {"event": "ping"},
+    {"event": "message", "task_id": "t1", "answer": "lo"},
+    {
+        "event": "message_end",
+        "task_id": "t1",
+        "metadata": {"usage": {"total_tokens": 7, "latency": 0.5}},
+    },
+]
+
+
+class TestStreamResult(unittest.TestCase):
+
+    def test_chat_result(self):
+        result = StreamResult.collect(iter(CHAT_EVENTS))
+        self.assertEqual(result.text, "Hello")
+        self.assertEqual(result.message_id, "m1")
+        self.assertEqual(result.conversation_id, "c1")
+        self.assertEqual(result.total_tokens, 7)
+        self.assertEqual(result.usage["latency"], 0.5)
+        self.assertTrue(result.succeeded)
+        self.assertEqual(result.event_count, 4)
+
+    def test_message_replace(self):
+        events = CHAT_EVENTS[:1] + [
+            {"event": "message_replace", "answer": "Hello world", "recovered": True}
+        ]
+        result = StreamResult.collect(events)
+        self.assertEqual(result.text, "Hello world")
+        self.assertTrue(result.recovered)
+
+    def test_error_event(self):
+        result = StreamResult.collect(
+            CHAT_EVENTS[:1] + [{"event": "error", "message": "boom"}]
+        )
+        self.assertEqual(result.status, "failed")
+        self.assertEqual(result.error, "boom")
+
+    def test_workflow_wrap_passes_events_through(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response()
+
+        result = StreamResult()
+        events = list(result.wrap(client.run({}, "user_1", lazy=True)))
+        self.assertEqual(len(events), result.event_count)
+        self.assertEqual(result.workflow_run_id, "r1")
+        self.assertEqual(result.text, "hi")
+        self.assertEqual(result.status, "succeeded")
+        self.assertEqual(result.nodes[None]["outputs"], {"text": "big"})
+
+    def test_typed_events(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response()
+
+        result = StreamResult.collect(client.run({}, "user_1", typed=True))
+        self.assertEqual(result.text, "hi")
+        self.assertEqual(result.status, "succeeded")
+
+    def test_raw_frames_rejected(self):
+        with self.assertRaises(TypeError):
+            StreamResult().add(b"data: {}\n\n")
+
+    def test_acollect(self):
+        async def events():
+            for event in CHAT_EVENTS:
+                yield event
+
+        result = asyncio.run(StreamResult.acollect(events()))
+        self.assertEqual(result.text, "Hello")
+
+
+if __name__ == "__main__":
+    unittest.main()
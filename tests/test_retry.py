@@ -0,0 +1,214 @@
+"""
+测试重试策略
+"""
+
+import email.utils
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from pydify import RetryBudget, RetryPolicy, WorkflowClient
+from pydify.common import DifyAPIError
+
+from .test_common import make_stream_response
+
+
+def make_response(status_code, headers=None, content=b"{}"):
+    response = MagicMock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.headers = headers or {}
+    response.content = content
+    return response
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_full_jitter_is_bounded(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for attempt in range(6):
+            delay = policy.get_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5, 2**attempt))
+
+    def test_exponential_without_jitter(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=3, jitter=False)
+        self.assertEqual([policy.get_delay(i) for i in range(4)], [0.5, 1, 2, 3])
+
+    def test_retry_after(self):
+        self.assertEqual(RetryPolicy.parse_retry_after("7"), 7.0)
+        self.assertIsNone(RetryPolicy.parse_retry_after("soon"))
+        future = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(RetryPolicy.parse_retry_after(future), 60, delta=2)
+
+        # Retry-After不受max_delay限制
+        policy = RetryPolicy(max_delay=10)
+        self.assertEqual(policy.get_delay(0, retry_after=120), 120)
+        ignore = policy.replace(respect_retry_after=False, jitter=False)
+        self.assertEqual(ignore.get_delay(0, retry_after=120), 1)
+
+    def test_gives_up_when_retry_after_too_long(self):
+        policy = RetryPolicy(max_retries=3, base_delay=0, max_retry_after=60)
+        send = MagicMock(return_value=make_response(429, {"Retry-After": "120"}))
+
+        started = time.monotonic()
+        self.assertEqual(policy.execute(send).status_code, 429)
+        send.assert_called_once()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(policy.replace(max_retry_after=120).accepts_retry_after(120))
+
+    def test_budget_exhaustion(self):
+        budget = RetryBudget(ratio=0, min_retries_per_second=0.1, ttl=10)
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+        policy = RetryPolicy(max_retries=5, budget=budget)
+        self.assertFalse(policy.allow_retry(0))
+
+    def test_execute_retries_status_then_succeeds(self):
+        policy = RetryPolicy(max_retries=3, base_delay=0)
+        responses = [make_response(503), make_response(429), make_response(200)]
+        send = MagicMock(side_effect=responses)
+
+        self.assertIs(policy.execute(send), responses[2])
+        self.assertEqual(send.call_count, 3)
+        responses[0].close.assert_called_once()
+
+    def test_execute_returns_last_response_when_exhausted(self):
+        policy = RetryPolicy(max_retries=1, base_delay=0)
+        send = MagicMock(return_value=make_response(502))
+
+        self.assertEqual(policy.execute(send).status_code, 502)
+        self.assertEqual(send.call_count, 2)
+
+    def test_non_retryable_status_is_not_retried(self):
+        policy = RetryPolicy(max_retries=3, base_delay=0)
+        send = MagicMock(return_value=make_response(400))
+
+        policy.execute(send)
+        send.assert_called_once()
+
+    def test_network_errors_are_reraised(self):
+        policy = RetryPolicy(max_retries=2, base_delay=0)
+        send = MagicMock(side_effect=requests.ConnectionError("down"))
+
+        with self.assertRaises(requests.ConnectionError):
+            policy.execute(send)
+        self.assertEqual(send.call_count, 3)
+
+    def test_unrewindable_body_is_not_retried(self):
+        policy = RetryPolicy(max_retries=2, base_delay=0)
+        send = MagicMock(return_value=make_response(503))
+
+        policy.execute(send, rewind=lambda: False)
+        send.assert_called_once()
+
+    def test_no_retry_past_deadline(self):
+        policy = RetryPolicy(max_retries=5, base_delay=10, jitter=False)
+        send = MagicMock(return_value=make_response(503))
+
+        started = time.monotonic()
+        policy.execute(send, deadline=started + 1)
+        send.assert_called_once()
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class TestClientRetry(unittest.TestCase):
+
+    def test_client_uses_retry_policy(self):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            retry_policy=RetryPolicy(max_retries=2, base_delay=0),
+        )
+        client.session = MagicMock()
+        client.session.request.side_effect = [
+            make_response(503, {"Retry-After": "0"}),
+            make_response(200, content=b'{"ok": true}'),
+        ]
+
+        self.assertEqual(client.get("info"), {"ok": True})
+        self.assertEqual(client.session.request.call_count, 2)
+
+    def test_client_raises_after_retries(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.request.return_value = make_response(
+            500, content=b'{"message": "boom"}'
+        )
+
+        with self.assertRaises(DifyAPIError) as context:
+            client.get("info", max_retries=1, retry_delay=0)
+        self.assertEqual(context.exception.status_code, 500)
+        self.assertEqual(client.session.request.call_count, 2)
+
+    def test_deadline_bounds_attempt_timeouts(self):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            retry_policy=RetryPolicy(max_retries=5, base_delay=0.2, jitter=False),
+        )
+        client.session = MagicMock()
+        client.session.request.return_value = make_response(503)
+
+        started = time.monotonic()
+        with self.assertRaises(DifyAPIError):
+            client.get("info", timeout=30, deadline=0.5)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        timeouts = [c.kwargs["timeout"] for c in client.session.request.call_args_list]
+        self.assertEqual(len(timeouts), 2)
+        self.assertLessEqual(timeouts[0], 0.5)
+        self.assertLess(timeouts[1], timeouts[0])
+
+
+class TestStreamRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            retry_policy=RetryPolicy(max_retries=2, base_delay=0),
+        )
+        self.client.session = MagicMock()
+
+    def test_retries_gateway_error_before_first_event(self):
+        self.client.session.post.side_effect = [
+            make_stream_response(status_code=502),
+            make_stream_response(),
+        ]
+
+        events = list(self.client.post_stream("workflows/run", {"inputs": {}}))
+        self.assertEqual(events[0]["event"], "workflow_started")
+        self.assertEqual(self.client.session.post.call_count, 2)
+
+    def test_retries_connection_error(self):
+        self.client.session.post.side_effect = [
+            requests.ConnectionError("reset"),
+            make_stream_response(),
+        ]
+
+        events = list(self.client.post_stream("workflows/run", {"inputs": {}}))
+        self.assertEqual(len(events), 5)
+
+    def test_connection_error_after_retries(self):
+        self.client.session.post.side_effect = requests.ConnectionError("reset")
+
+        with self.assertRaises(DifyAPIError):
+            list(self.client.post_stream("workflows/run", {"inputs": {}}))
+        self.assertEqual(self.client.session.post.call_count, 3)
+
+    def test_no_retry_after_response_started(self):
+        response = make_stream_response()
+        response.iter_content.side_effect = requests.ConnectionError("reset")
+        self.client.session.post.return_value = response
+
+        with self.assertRaises(requests.ConnectionError):
+            list(self.client.post_stream("workflows/run", {"inputs": {}}))
+        self.client.session.post.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
 
+from pydify import RetryPolicy
 from pydify.site import DifyAppMode, DifySite
 
 
@@ -23,13 +24,14 @@ class TestDifySite(unittest.TestCase):
         }
         mock_post.return_value = mock_response
 
-        # 初始化DifySite（会自动登录）
+        # 初始化DifySite时不发送请求，首次读取令牌时才登录
         site = DifySite("http://test-dify.com", "test@example.com", "password")
+        mock_post.assert_not_called()
 
         # 验证登录请求
-        mock_post.assert_called_once()
         self.assertEqual(site.access_token, "test_access_token")
         self.assertEqual(site.refresh_token, "test_refresh_token")
+        mock_post.assert_called_once()
 
     @patch("requests.post")
     def test_login_failed(self, mock_post):
@@ -40,8 +42,9 @@ class TestDifySite(unittest.TestCase):
         mock_post.return_value = mock_response
 
         # 验证登录失败时抛出异常
+        site = DifySite("http://test-dify.com", "test@example.com", "wrong_password")
         with self.assertRaises(Exception) as context:
-            DifySite("http://test-dify.com", "test@example.com", "wrong_password")
+            site.access_token
 
         self.assertIn("登录失败", str(context.exception))
 
@@ -116,6 +119,63 @@ class TestDifySite(unittest.TestCase):
         self.assertEqual(result["id"], "new_app_id")
         self.assertEqual(result["name"], "New Test App")
 
+    @patch("requests.post")
+    def test_login_retries_rate_limit(self, mock_post):
+        # 第一次登录被限流，按Retry-After等待后重试成功
+        limited_response = MagicMock()
+        limited_response.status_code = 429
+        limited_response.headers = {"Retry-After": "0"}
+
+        login_response = MagicMock()
+        login_response.status_code = 200
+        login_response.json.return_value = {
+            "data": {
+                "access_token": "test_access_token",
+                "refresh_token": "test_refresh_token",
+            }
+        }
+        mock_post.side_effect = [limited_response, login_response]
+
+        site = DifySite("http://test-dify.com", "test@example.com", "password")
+
+        self.assertEqual(site.access_token, "test_access_token")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch("requests.post")
+    def test_create_app_is_not_retried_on_server_error(self, mock_post):
+        # 服务端可能已经创建了应用，5xx后重试会产生重复的应用
+        login_response = MagicMock()
+        login_response.status_code = 200
+        login_response.json.return_value = {
+            "data": {
+                "access_token": "test_access_token",
+                "refresh_token": "test_refresh_token",
+            }
+        }
+        error_response = MagicMock()
+        error_response.status_code = 502
+        error_response.headers = {}
+        created_response = MagicMock()
+        created_response.status_code = 201
+        created_response.json.return_value = {"id": "new_app_id"}
+
+        policy = RetryPolicy(base_delay=0)
+        mock_post.side_effect = [login_response, error_response]
+        site = DifySite(
+            "http://test-dify.com", "test@example.com", "password", retry_policy=policy
+        )
+        with self.assertRaises(Exception):
+            site.create_app("New Test App", "Test description", DifyAppMode.CHAT)
+        self.assertEqual(mock_post.call_count, 2)
+
+        # 调用方明确允许时才重试
+        mock_post.reset_mock()
+        mock_post.side_effect = [error_response, created_response]
+        site.retry_non_idempotent = True
+        result = site.create_app("New Test App", "Test description", DifyAppMode.CHAT)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(result["id"], "new_app_id")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,61 @@
+"""
+测试SSE增量解码器
+"""
+
+import json
+import unittest
+
+from pydify.sse import SSEDecoder, iter_sse_events
+
+STREAM = (
+    b'data: {"event": "workflow_started", "task_id": "t1"}\n\n'
+    b": keep-alive comment\n\n"
+    b"event: ping\n\n"
+    b'data: {"event": "text_chunk",\n'
+    b'data:  "data": {"text": "\xe4\xbd\xa0\xe5\xa5\xbd"}}\n\n'
+    b"id: 42\r\nevent: custom\r\nretry: 3000\r\ndata: {}\r\n\r\n"
+    b'data: {"event": "workflow_finished"}'
+)
+
+
+class TestSSEDecoder(unittest.TestCase):
+
+    def assert_events(self, events):
+        self.assertEqual(len(events), 4)
+        self.assertEqual(json.loads(events[0].data)["task_id"], "t1")
+        self.assertEqual(json.loads(events[1].data)["data"]["text"], "你好")
+        self.assertEqual(events[2].event, "custom")
+        self.assertEqual(events[2].id, "42")
+        self.assertEqual(events[2].retry, 3000)
+        self.assertEqual(events[2].data, b"{}")
+        self.assertEqual(events[3].event, "message")
+        self.assertEqual(json.loads(events[3].data)["event"], "workflow_finished")
+
+    def test_whole_stream(self):
+        self.assert_events(list(iter_sse_events([STREAM])))
+
+    def test_arbitrary_chunk_boundaries(self):
+        for size in (1, 2, 3, 7, 64):
+            chunks = [STREAM[i : i + size] for i in range(0, len(STREAM), size)]
+            self.assert_events(list(iter_sse_events(chunks)))
+
+    def test_buffer_is_drained(self):
+        decoder = SSEDecoder()
+        events = decoder.feed(b'data: {"a": 1}\n\ndata: {"b"')
+        self.assertEqual([e.data for e in events], [b'{"a": 1}'])
+        self.assertEqual(bytes(decoder._buffer), b'data: {"b"')
+        self.assertEqual(decoder.feed(b": 2}\n\n")[0].data, b'{"b": 2}')
+        self.assertEqual(len(decoder._buffer), 0)
+
+    def test_to_bytes_round_trip(self):
+        events = list(iter_sse_events([STREAM]))
+        self.assertEqual(events[0].to_bytes(), STREAM.split(b"\n\n")[0] + b"\n\n")
+        again = list(iter_sse_events([b"".join(e.to_bytes() for e in events)]))
+        self.assertEqual(
+            [(e.event, e.id, e.retry, e.data) for e in again],
+            [(e.event, e.id, e.retry, e.data) for e in events],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,379 @@
+"""
+测试流式请求的分段超时、后台读取与分发
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from pydify import (
+    AsyncWorkflowClient,
+    BufferedStream,
+    DifyConnectTimeoutError,
+    DifyFirstByteTimeoutError,
+    DifyIdleTimeoutError,
+    DifyTotalTimeoutError,
+    StreamTimeouts,
+    StreamTiming,
+    WorkflowClient,
+    atee_stream,
+    tee_stream,
+)
+
+from .test_common import make_stream_response
+
+EVENT = b'data: {"event": "text_chunk", "data": {"text": "hi"}}\n\n'
+
+
+def slow_stream(*steps):
+    """按steps逐步产出数据，数字表示等待的秒数，bytes表示产出的数据块"""
+
+    def chunks(chunk_size=None):
+        for step in steps:
+            if isinstance(step, bytes):
+                yield step
+            else:
+                time.sleep(step)
+
+    response = make_stream_response()
+    response.iter_content.side_effect = chunks
+    return response
+
+
+class TestStreamTimeouts(unittest.TestCase):
+
+    def make_client(self, response, **timeouts):
+        client = WorkflowClient(
+            "test_key",
+            "http://test-dify.com/v1",
+            stream_timeouts=StreamTimeouts(**timeouts),
+        )
+        client.session = MagicMock()
+        client.session.post.return_value = response
+        return client
+
+    def test_replace_overrides_and_disables(self):
+        timeouts = StreamTimeouts(connect=5, idle=30).replace(idle=0, total=60)
+        self.assertEqual(timeouts.connect, 5)
+        self.assertIsNone(timeouts.idle)
+        self.assertEqual(timeouts.total, 60)
+
+    def test_idle_timeout(self):
+        client = self.make_client(slow_stream(EVENT, 0.5, EVENT), idle=0.1)
+        events = []
+        with self.assertRaises(DifyIdleTimeoutError) as context:
+            for event in client.run({}, "user_1", recover=False):
+                events.append(event)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(context.exception.kind, StreamTimeouts.IDLE)
+        self.assertEqual(context.exception.timeout, 0.1)
+
+    def test_consumer_time_not_counted_as_idle(self):
+        client = self.make_client(slow_stream(EVENT, EVENT), idle=0.1)
+        events = []
+        for event in client.run({}, "user_1", recover=False):
+            events.append(event)
+            time.sleep(0.2)
+        self.assertEqual(len(events), 2)
+
+    def test_first_byte_timeout(self):
+        client = self.make_client(slow_stream(0.5, EVENT), first_byte=0.1)
+        with self.assertRaises(DifyFirstByteTimeoutError):
+            list(client.run({}, "user_1", recover=False))
+
+    def test_total_timeout_per_call(self):
+        client = self.make_client(
+            slow_stream(EVENT, 0.1, EVENT, 0.1, EVENT, 0.1, EVENT)
+        )
+        with self.assertRaises(DifyTotalTimeoutError):
+            list(client.run({}, "user_1", recover=False, total_timeout=0.15))
+
+    def test_connect_timeout(self):
+        client = self.make_client(None, connect=1)
+        client.session.post.side_effect = requests.ConnectTimeout("timed out")
+        with self.assertRaises(DifyConnectTimeoutError):
+            list(client.run({}, "user_1", max_retries=0))
+        self.assertEqual(client.session.post.call_args.kwargs["timeout"][0], 1)
+
+
+class TestStreamTiming(unittest.TestCase):
+
+    def test_client_records_timing(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = slow_stream(
+            0.05, EVENT, 0.02, EVENT, 0.02, EVENT
+        )
+
+        timing = StreamTiming()
+        events = list(client.run({}, "user_1", timing=timing, recover=False))
+        self.assertEqual(len(events), 3)
+        self.assertNotIn("timing", client.session.post.call_args.kwargs)
+        self.assertGreaterEqual(timing.first_byte, 0.05)
+        self.assertGreaterEqual(timing.first_content, timing.first_byte)
+        self.assertEqual(timing.content_events, 3)
+        self.assertEqual(len(timing.gaps), 2)
+        self.assertGreaterEqual(timing.gap_percentile(50), 0.015)
+        self.assertGreaterEqual(timing.duration, timing.first_content)
+
+    def test_gap_percentile(self):
+        timing = StreamTiming()
+        self.assertIsNone(timing.gap_percentile(50))
+        timing._gaps = [0.4, 0.1, 0.3, 0.2]
+        self.assertEqual(timing.gap_percentile(50), 0.2)
+        self.assertEqual(timing.gap_percentile(99), 0.4)
+        self.assertEqual(timing.to_dict()["gap_max"], 0.4)
+
+
+def text_chunk(text):
+    return {"event": "text_chunk", "data": {"text": text}}
+
+
+class TestBufferedStream(unittest.TestCase):
+
+    def wait_full(self, stream):
+        deadline = time.monotonic() + 5
+        while len(stream._buffer) < stream.maxsize and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_preserves_order_and_errors(self):
+        def events():
+            yield {"event": "a"}
+            yield {"event": "b"}
+            raise ValueError("boom")
+
+        stream = BufferedStream(events(), maxsize=1)
+        self.assertEqual(next(stream)["event"], "a")
+        self.assertEqual(next(stream)["event"], "b")
+        with self.assertRaises(ValueError):
+            next(stream)
+
+    def test_drop_pings_when_full(self):
+        source = [
+            text_chunk("a"),
+            {"event": "ping"},
+            {"event": "ping"},
+            text_chunk("b"),
+        ]
+        stream = BufferedStream(iter(source), maxsize=1, backpressure="drop_pings")
+        self.wait_full(stream)
+        time.sleep(0.05)
+        self.assertEqual([e["event"] for e in stream], ["text_chunk", "text_chunk"])
+        self.assertEqual(stream.dropped, 2)
+
+    def test_coalesce_deltas_when_full(self):
+        source = [text_chunk("a"), text_chunk("b"), text_chunk("c"), {"event": "end"}]
+        stream = BufferedStream(iter(source), maxsize=1, backpressure="coalesce")
+        self.wait_full(stream)
+        time.sleep(0.05)
+        events = list(stream)
+        self.assertEqual(events[0]["data"]["text"], "abc")
+        self.assertEqual(events[-1]["event"], "end")
+        self.assertEqual(stream.coalesced, 2)
+
+    def test_close_closes_source(self):
+        closed = []
+
+        def events():
+            try:
+                while True:
+                    yield text_chunk("x")
+            finally:
+                closed.append(True)
+
+        stream = BufferedStream(events(), maxsize=2)
+        next(stream)
+        stream.close()
+        stream._thread.join(5)
+        self.assertEqual(closed, [True])
+
+    def test_close_aborts_stalled_connection(self):
+        # 上游在第一个事件之后停滞，只有连接被断开时读取才会返回
+        aborted = threading.Event()
+
+        def chunks(chunk_size=None):
+            yield b'data: {"event": "workflow_started", "task_id": "t1"}\n\n'
+            aborted.wait(10)
+            raise requests.exceptions.ChunkedEncodingError("connection aborted")
+
+        response = make_stream_response()
+        response.iter_content.side_effect = chunks
+        response.raw.connection.sock.shutdown.side_effect = lambda how: aborted.set()
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = response
+        client.stop_task = MagicMock()
+        client.get_run_info = MagicMock()
+
+        stream = client.run({}, "user_1", buffer_size=4)
+        self.assertEqual(next(stream)["event"], "workflow_started")
+        started = time.monotonic()
+        stream.close()
+
+        self.assertTrue(aborted.is_set())
+        deadline = time.monotonic() + 5
+        while not client.stop_task.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertLess(time.monotonic() - started, 1)
+        client.stop_task.assert_called_once_with("t1", "user_1")
+        client.get_run_info.assert_not_called()
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            BufferedStream(iter([]), backpressure="drop_all")
+
+    def test_client_buffered_run(self):
+        client = WorkflowClient("test_key", "http://test-dify.com/v1")
+        client.session = MagicMock()
+        client.session.post.return_value = make_stream_response()
+
+        events = list(client.run({}, "user_1", buffer_size=2))
+        self.assertEqual(events[-1]["event"], "workflow_finished")
+        self.assertNotIn("buffer_size", client.session.post.call_args.kwargs)
+
+
+class TestTeeStream(unittest.TestCase):
+
+    def test_consumers_share_events(self):
+        source = [text_chunk(str(i)) for i in range(10)]
+        first, second, third = tee_stream(iter(source), n=3, maxsize=2)
+        results = [[], [], []]
+
+        def consume(iterator, result):
+            for event in iterator:
+                result.append(event)
+
+        threads = [
+            threading.Thread(target=consume, args=(it, r))
+            for it, r in zip((second, third), results[1:])
+        ]
+        for thread in threads:
+            thread.start()
+        consume(first, results[0])
+        for thread in threads:
+            thread.join(5)
+
+        for result in results:
+            self.assertEqual(len(result), 10)
+            # 同一个事件对象被共享，没有复制
+            self.assertTrue(all(a is b for a, b in zip(result, source)))
+
+    def test_upstream_error_reaches_every_consumer(self):
+        def events():
+            yield {"event": "a"}
+            raise ValueError("boom")
+
+        first, second = tee_stream(events())
+        self.assertEqual(next(first)["event"], "a")
+        with self.assertRaises(ValueError):
+            next(first)
+        self.assertEqual(next(second)["event"], "a")
+        with self.assertRaises(ValueError):
+            next(second)
+
+    def test_closing_all_consumers_closes_upstream(self):
+        closed = []
+
+        def events():
+            try:
+                while True:
+                    yield {"event": "ping"}
+            finally:
+                closed.append(True)
+
+        first, second = tee_stream(events(), maxsize=1)
+        next(first)
+        second.close()
+        next(first)  # 已关闭的消费者不再限制其他消费者
+        next(first)
+        self.assertEqual(closed, [])
+        first.close()
+        self.assertEqual(closed, [True])
+
+    def test_del_does_not_close_upstream(self):
+        reading = threading.Event()
+        release = threading.Event()
+        closed = []
+
+        def events():
+            try:
+                reading.set()
+                release.wait(5)
+                yield {"event": "a"}
+            finally:
+                closed.append(True)
+
+        first, second = tee_stream(events())
+        results = []
+        thread = threading.Thread(target=lambda: results.append(next(first)))
+        thread.start()
+        self.assertTrue(reading.wait(5))
+        second.close()
+        # 模拟在其他线程中被垃圾回收：上游正在被读取，不能在这里关闭它
+        first.__del__()
+        release.set()
+        thread.join(5)
+
+        self.assertEqual(results, [{"event": "a"}])
+        self.assertEqual(closed, [])
+
+
+@unittest.skipIf(httpx is None, "需要安装httpx")
+class TestAsyncStream(unittest.TestCase):
+
+    def test_idle_timeout(self):
+        class SlowStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield EVENT
+                await asyncio.sleep(0.5)
+                yield EVENT
+
+        def handler(request):
+            return httpx.Response(200, stream=SlowStream())
+
+        async def main():
+            client = AsyncWorkflowClient(
+                "test_key",
+                "http://test-dify.com/v1",
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            )
+            events = []
+            with self.assertRaises(DifyIdleTimeoutError):
+                async for event in client.run(
+                    {}, "user_1", recover=False, idle_timeout=0.1
+                ):
+                    events.append(event)
+            return events
+
+        events = asyncio.run(main())
+        self.assertEqual(len(events), 1)
+
+    def test_atee_stream(self):
+        async def source():
+            for i in range(5):
+                await asyncio.sleep(0)
+                yield text_chunk(str(i))
+
+        async def collect(iterator):
+            return [event["data"]["text"] async for event in iterator]
+
+        async def main():
+            first, second = atee_stream(source(), maxsize=1)
+            return await asyncio.gather(collect(first), collect(second))
+
+        first, second = asyncio.run(main())
+        self.assertEqual(first, ["0", "1", "2", "3", "4"])
+        self.assertEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()